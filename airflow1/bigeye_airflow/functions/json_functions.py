@@ -0,0 +1,56 @@
+import codecs
+import itertools
+import json
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+
+def _skip_whitespace(s: str, pos: int) -> int:
+    while pos < len(s) and s[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def iter_json_array(chunks):
+    """
+    Incrementally decodes a JSON array of objects from a stream of UTF-8 byte chunks, yielding each element as soon as
+    it is complete.  Only the unparsed tail of the body is held in memory, so callers that keep a few elements never
+    materialize the whole response.
+    :param chunks: the response body, e.g. requests.Response.iter_content(DEFAULT_CHUNK_SIZE).
+    :return: iterator of the array's elements.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    opened = False
+
+    for piece in itertools.chain(codecs.iterdecode((c for c in chunks if c), 'utf-8'), [None]):
+        if piece is not None:
+            buf = buf[pos:] + piece
+            pos = 0
+        while True:
+            pos = _skip_whitespace(buf, pos)
+            if pos == len(buf):
+                break
+            if not opened:
+                if buf[pos] != '[':
+                    raise ValueError('Expected a JSON array, found {!r}.'.format(buf[pos]))
+                opened = True
+                pos += 1
+            elif buf[pos] == ']':
+                return
+            elif buf[pos] == ',':
+                pos += 1
+            else:
+                try:
+                    element, pos = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if piece is None:
+                        raise
+                    # The element continues in the next chunk.
+                    break
+                yield element
+
+    raise ValueError('Unterminated JSON array.')
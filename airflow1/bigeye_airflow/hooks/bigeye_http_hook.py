@@ -0,0 +1,41 @@
+import time
+
+from airflow.hooks.http_hook import HttpHook
+
+from bigeye_airflow.hooks.connection_cache import connection_cache
+from bigeye_airflow.hooks.request_stats import endpoint_name, response_size
+from bigeye_airflow.hooks.tracing import set_attributes, span
+
+
+class BigeyeHttpHook(HttpHook):
+    """
+    HttpHook used by the Bigeye operators.  Connection lookups go through the process level connection_cache so the
+    metadata DB, or secrets backend, is queried once per TTL instead of once per API call.  Given a RequestStats, every
+    call to run is timed and counted in it.  Each call is also a tracing span.
+    """
+
+    def __init__(self, method='POST', http_conn_id='http_default', request_stats=None, **kwargs):
+        super(BigeyeHttpHook, self).__init__(method=method, http_conn_id=http_conn_id, **kwargs)
+        self.request_stats = request_stats
+
+    @classmethod
+    def get_connection(cls, conn_id):
+        return connection_cache.get(conn_id, super(BigeyeHttpHook, cls).get_connection)
+
+    def run(self, endpoint, data=None, headers=None, extra_options=None, **request_kwargs):
+        response = None
+        start = time.monotonic()
+        bytes_out = len(data) if isinstance(data, (str, bytes)) else 0
+        with span('bigeye.http {}'.format(self.method), http_method=self.method, url=endpoint,
+                  endpoint=endpoint_name(endpoint), bytes_out=bytes_out) as s:
+            try:
+                response = super(BigeyeHttpHook, self).run(endpoint, data=data, headers=headers,
+                                                           extra_options=extra_options, **request_kwargs)
+                return response
+            finally:
+                status_code = response.status_code if response is not None else None
+                bytes_in = response_size(response)
+                set_attributes(s, status_code=status_code, bytes_in=bytes_in)
+                if self.request_stats is not None:
+                    self.request_stats.record(self.method, endpoint, status_code, time.monotonic() - start,
+                                              bytes_out=bytes_out, bytes_in=bytes_in)
@@ -0,0 +1,201 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from airflow.configuration import conf
+
+from bigeye_airflow.functions.json_functions import DEFAULT_CHUNK_SIZE, iter_json_array
+
+DEFAULT_TTL_SECONDS = 3600.0
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DB_FILE_NAME = 'bigeye_catalog_cache.sqlite'
+
+
+CatalogCacheEntry = namedtuple('CatalogCacheEntry', ['body', 'etag', 'last_modified', 'fresh'])
+
+
+class CatalogCache:
+    """
+    On-disk cache of catalog responses keyed by connection, warehouse and schema.  Entries younger than ttl_seconds are
+    served without a request; older entries are revalidated with If-None-Match/If-Modified-Since so an unchanged
+    catalog costs a 304 rather than a full download.  Least recently used entries are evicted once the bodies exceed
+    max_bytes.  Backed by SQLite in WAL mode so worker processes on one host can share a directory.
+    """
+
+    def __init__(self, directory: str, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        :param directory: directory holding the cache database.  Created if missing.
+        :param ttl_seconds: seconds an entry is served without revalidation.
+        :param max_bytes: total size of the cached bodies above which the least recently used entries are evicted.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, DB_FILE_NAME)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        db = self._connect()
+        try:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('CREATE TABLE IF NOT EXISTS catalog ('
+                       'key TEXT PRIMARY KEY, body BLOB NOT NULL, etag TEXT, last_modified TEXT, '
+                       'fetched_at REAL NOT NULL, accessed_at REAL NOT NULL, size INTEGER NOT NULL)')
+        finally:
+            db.close()
+
+    @staticmethod
+    def key(connection_id: str, warehouse_id: int, schema_name: str, kind: str = 'dataset_tables') -> str:
+        return '{}/{}/{}/{}'.format(connection_id, warehouse_id, schema_name, kind)
+
+    def _connect(self):
+        # A connection per call keeps the cache usable from any thread; busy waits cover other processes' writes.
+        return sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+
+    def get(self, key: str):
+        now = time.time()
+        db = self._connect()
+        try:
+            row = db.execute('SELECT body, etag, last_modified, fetched_at FROM catalog WHERE key = ?',
+                             (key,)).fetchone()
+            if row is None:
+                return None
+            db.execute('UPDATE catalog SET accessed_at = ? WHERE key = ?', (now, key))
+        finally:
+            db.close()
+        return CatalogCacheEntry(body=row[0], etag=row[1], last_modified=row[2],
+                                 fresh=now - row[3] < self.ttl_seconds)
+
+    def put(self, key: str, body: bytes, etag: str = None, last_modified: str = None):
+        now = time.time()
+        db = self._connect()
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            db.execute('INSERT OR REPLACE INTO catalog VALUES (?, ?, ?, ?, ?, ?, ?)',
+                       (key, body, etag, last_modified, now, now, len(body)))
+            self._evict(db)
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        finally:
+            db.close()
+
+    def touch(self, key: str):
+        """Marks an entry fresh again, e.g. after the server answered 304 Not Modified."""
+        now = time.time()
+        db = self._connect()
+        try:
+            db.execute('UPDATE catalog SET fetched_at = ?, accessed_at = ? WHERE key = ?', (now, now, key))
+        finally:
+            db.close()
+
+    def invalidate(self, key: str = None):
+        """
+        :param key: entry to drop.  Drops every entry if None.
+        """
+        db = self._connect()
+        try:
+            if key is None:
+                db.execute('DELETE FROM catalog')
+            else:
+                db.execute('DELETE FROM catalog WHERE key = ?', (key,))
+        finally:
+            db.close()
+
+    def _evict(self, db):
+        total = 0
+        evict = []
+        for key, size in db.execute('SELECT key, size FROM catalog ORDER BY accessed_at DESC'):
+            total += size
+            if total > self.max_bytes:
+                evict.append((key,))
+        if evict:
+            logging.info('Evicting %s entries from the Bigeye catalog cache.', len(evict))
+            db.executemany('DELETE FROM catalog WHERE key = ?', evict)
+
+    def fetch_json(self, key: str, request):
+        """
+        Serves key from the cache while fresh; otherwise calls request with the revalidation headers and either
+        refreshes the entry on 304 Not Modified or stores the new body.
+        :param key: cache key, see CatalogCache.key.
+        :param request: callable taking extra request headers and returning the response.
+        :return: the decoded JSON body.
+        """
+        entry = self.get(key)
+        if entry is not None and entry.fresh:
+            return json.loads(entry.body)
+
+        response = request(self.conditional_headers(entry))
+        if response.status_code == 304 and entry is not None:
+            self.touch(key)
+            return json.loads(entry.body)
+
+        self.put(key, response.content, etag=response.headers.get('ETag'),
+                 last_modified=response.headers.get('Last-Modified'))
+        return response.json()
+
+    @staticmethod
+    def conditional_headers(entry) -> dict:
+        """
+        :return: the revalidation headers for a stale entry.
+        """
+        h = {}
+        if entry is not None:
+            if entry.etag:
+                h['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                h['If-Modified-Since'] = entry.last_modified
+        return h
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_catalog_cache():
+    """
+    :return: the cache configured by [bigeye] catalog_cache_dir, catalog_cache_ttl_seconds and
+    catalog_cache_max_bytes, or None when catalog_cache_dir is unset.
+    """
+    directory = conf.get('bigeye', 'catalog_cache_dir', fallback=None)
+    if not directory:
+        return None
+    with _caches_lock:
+        if directory not in _caches:
+            _caches[directory] = CatalogCache(
+                directory,
+                ttl_seconds=conf.getfloat('bigeye', 'catalog_cache_ttl_seconds', fallback=DEFAULT_TTL_SECONDS),
+                max_bytes=conf.getint('bigeye', 'catalog_cache_max_bytes', fallback=DEFAULT_MAX_BYTES))
+        return _caches[directory]
+
+
+def get_schema_tables(hook, connection_id: str, warehouse_id: int, schema_name: str, table_names=None) -> list:
+    """
+    Calls the dataset/tables/{warehouse_id}/{schema_name} endpoint, through the catalog cache when one is configured.
+    Without a cache the response is parsed as a stream, one table at a time, so tables outside table_names are never
+    held in memory together.
+    :param hook: GET hook for the connection.
+    :param connection_id: name of the connection, part of the cache key.
+    :param warehouse_id: int id of Bigeye warehouse
+    :param schema_name: name of the schema for which to query tables.
+    :param table_names: lower case names of the tables to keep.  Keeps every table if None.
+    :return: the dataset/tables list.
+    """
+    endpoint = "dataset/tables/{warehouse_id}/{schema_name}".format(warehouse_id=warehouse_id,
+                                                                     schema_name=schema_name)
+    cache = get_catalog_cache()
+    if cache is None:
+        response = hook.run(endpoint, headers={"Accept": "application/json"}, extra_options={'stream': True})
+        try:
+            tables = iter_json_array(response.iter_content(DEFAULT_CHUNK_SIZE))
+            return [t for t in tables if table_names is None or t['datasetName'].lower() in table_names]
+        finally:
+            response.close()
+
+    # The cache stores whole bodies, so this path parses the full response.
+    tables = cache.fetch_json(CatalogCache.key(connection_id, warehouse_id, schema_name),
+                              lambda conditional_headers: hook.run(endpoint, headers=dict(conditional_headers,
+                                                                                          Accept="application/json")))
+    return [t for t in tables if table_names is None or t['datasetName'].lower() in table_names]
@@ -0,0 +1,208 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from airflow.configuration import conf
+
+PROFILERS = ('cprofile', 'sampling')
+DEFAULT_SAMPLE_INTERVAL = 0.005
+SUMMARY_LINES = 20
+TRACEMALLOC_FRAMES = 10
+
+_UNSAFE = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class _DeterministicProfiler:
+    """
+    cProfile over the calling thread and every thread started while it runs, so the runs done on the operators'
+    thread pools are included.  Before Python 3.12 a profile only sees the thread that enabled it, so each new thread
+    enables its own and they are merged when stopped.
+    """
+    suffix = 'pstats'
+
+    def __init__(self):
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._per_thread = sys.version_info < (3, 12)
+
+    def _start_in_thread(self, frame, event, arg):
+        # Called on the first event of a new thread; the thread's own profile then replaces this function.
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def start(self):
+        if self._per_thread:
+            threading.setprofile(self._start_in_thread)
+        profile = cProfile.Profile()
+        self._profiles.append(profile)
+        profile.enable()
+
+    def stop(self):
+        self._profiles[0].disable()
+        if self._per_thread:
+            threading.setprofile(None)
+        stats = pstats.Stats(self._profiles[0])
+        with self._lock:
+            for p in self._profiles[1:]:
+                stats.add(p)
+        return stats
+
+    @staticmethod
+    def write(stats, path):
+        stats.dump_stats(path)
+
+    @staticmethod
+    def summary(stats):
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats('cumulative').print_stats(SUMMARY_LINES)
+        return out.getvalue()
+
+
+class _SamplingProfiler:
+    """
+    Samples the stacks of every thread but its own at a fixed interval.  Wall-clock, so time spent waiting on the
+    network shows up next to time spent decoding JSON, at a small and constant overhead.
+    """
+    suffix = 'collapsed'
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='bigeye-profiler', daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename),
+                                                     code.co_firstlineno))
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    @staticmethod
+    def write(stacks, path):
+        # Collapsed stacks, as read by flamegraph.pl and speedscope.
+        with open(path, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write('{} {}\n'.format(stack, count))
+
+    @staticmethod
+    def summary(stacks):
+        total = sum(stacks.values())
+        if not total:
+            return 'No samples.'
+        own = Counter()
+        for stack, count in stacks.items():
+            own[stack.rsplit(';', 1)[-1]] += count
+        lines = ['{} samples across threads.  Functions by own samples:'.format(total)]
+        lines.extend('  {:6.1%} {:>7} {}'.format(count / total, count, function)
+                     for function, count in own.most_common(SUMMARY_LINES))
+        return '\n'.join(lines)
+
+
+def profile_artifact_prefix(name, output_dir=None):
+    """
+    :param name: identifies the profiled task, e.g. <dag_id>.<task_id>.
+    :param output_dir: directory of the artifacts.  Defaults to [bigeye] profile_dir, else bigeye_profiles in the
+    temp directory.
+    :return: path, without suffix, of the artifacts of one profiled run.
+    """
+    output_dir = output_dir or conf.get('bigeye', 'profile_dir', fallback=None) or \
+        os.path.join(tempfile.gettempdir(), 'bigeye_profiles')
+    os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, '{}.{}.{}'.format(_UNSAFE.sub('_', name), time.strftime('%Y%m%dT%H%M%S'),
+                                                      os.getpid()))
+
+
+def _memory_summary(snapshot, peak):
+    lines = ['Peak traced memory {:.1f}MB.  Largest allocations still held, by line:'.format(peak / (1024 * 1024))]
+    lines.extend('  {:10.1f}KB {:>8} blocks {}'.format(s.size / 1024, s.count, s.traceback)
+                 for s in snapshot.statistics('lineno')[:SUMMARY_LINES // 2])
+    return '\n'.join(lines)
+
+
+@contextmanager
+def profiled(name, profiler=None, output_dir=None):
+    """
+    Profiles the block with profiler, or else [bigeye] profiler, and traces its allocations with tracemalloc.  The
+    profile, cProfile's pstats or the sampling profiler's collapsed stacks, and the tracemalloc snapshot are written
+    next to each other and summarized in the log.  Does nothing when neither names a profiler.  Both profilers and
+    tracemalloc slow the block down; use them to diagnose a slow task, not on every run.
+    :param name: identifies the profiled task in the artifact names, e.g. <dag_id>.<task_id>.
+    :param profiler: cprofile, for a deterministic profile, or sampling.
+    :param output_dir: directory of the artifacts.  Defaults to [bigeye] profile_dir, else bigeye_profiles in the
+    temp directory.
+    """
+    profiler = profiler or conf.get('bigeye', 'profiler', fallback=None)
+    if not profiler:
+        yield
+        return
+    if profiler not in PROFILERS:
+        logging.warning("Unknown profiler %s.  Use one of %s.", profiler, ', '.join(PROFILERS))
+        yield
+        return
+
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    elif hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+        tracemalloc.reset_peak()
+    p = _DeterministicProfiler() if profiler == 'cprofile' else _SamplingProfiler()
+    start = time.monotonic()
+    p.start()
+    try:
+        yield
+    finally:
+        result = p.stop()
+        seconds = time.monotonic() - start
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if started_tracemalloc:
+            tracemalloc.stop()
+        _write_artifacts(name, output_dir, p, result, snapshot, peak, seconds)
+
+
+def _write_artifacts(name, output_dir, p, result, snapshot, peak, seconds):
+    # Profiling must never fail the task.
+    try:
+        prefix = profile_artifact_prefix(name, output_dir)
+        profile_path = '{}.{}'.format(prefix, p.suffix)
+        memory_path = '{}.tracemalloc'.format(prefix)
+        p.write(result, profile_path)
+        snapshot.dump(memory_path)
+    except Exception as e:
+        logging.warning("Could not write the profile of %s: %s", name, e)
+        profile_path = memory_path = None
+
+    try:
+        logging.info("Profiled %s for %.2fs.  Profile: %s  Allocations: %s\n%s\n%s", name, seconds, profile_path,
+                     memory_path, p.summary(result), _memory_summary(snapshot, peak))
+    except Exception as e:
+        logging.warning("Could not summarize the profile of %s: %s", name, e)
@@ -0,0 +1,152 @@
+import heapq
+import inspect
+import itertools
+import logging
+import re
+import threading
+from collections import namedtuple
+from datetime import timedelta
+
+try:
+    from airflow.stats import Stats
+except ImportError:  # Airflow < 1.10.10
+    from airflow.settings import Stats
+
+STAT_PREFIX = 'bigeye.request'
+DEFAULT_SLOW_REQUEST_COUNT = 10
+
+_ID_SEGMENT = re.compile(r'^(\d+|[0-9a-f]{8}-[0-9a-f-]{27})$', re.IGNORECASE)
+_UNSAFE = re.compile(r'[^A-Za-z0-9_-]')
+
+RequestRecord = namedtuple('RequestRecord', ['seconds', 'method', 'url', 'status', 'retries'])
+
+
+def endpoint_name(url: str) -> str:
+    """
+    :param url: request path, e.g. api/v1/metrics/123?x=1.
+    :return: the path as a stat name component with ids collapsed, e.g. api_v1_metrics_id.
+    """
+    path = url.split('?', 1)[0].strip('/')
+    segments = ['id' if _ID_SEGMENT.match(s) else _UNSAFE.sub('_', s) for s in path.split('/') if s]
+    return '_'.join(segments) or 'root'
+
+
+def response_size(response) -> int:
+    if response is None:
+        return 0
+    length = response.headers.get('Content-Length')
+    if length is not None:
+        try:
+            return int(length)
+        except (TypeError, ValueError):
+            return 0
+    # Don't read a streamed body just to measure it.
+    if getattr(response, '_content_consumed', False) is not True:
+        return 0
+    content = getattr(response, 'content', None)
+    return len(content) if isinstance(content, (bytes, str)) else 0
+
+
+def _stats_support_tags() -> bool:
+    try:
+        return 'tags' in inspect.signature(Stats.incr).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+class RequestStats:
+    """
+    Emits a timer, a status counter and byte counters for every Bigeye request through Airflow's Stats, and keeps the
+    slowest requests of the task for log_summary.  Metrics are tagged with the endpoint, method, connection and
+    operator where the Stats backend takes tags, as on later Airflow versions; otherwise the endpoint is part of the
+    stat name.
+    """
+
+    def __init__(self, connection_id, operator=None, slow_request_count=DEFAULT_SLOW_REQUEST_COUNT):
+        """
+        :param connection_id: connection the requests are sent through.
+        :param operator: task id of the operator sending them.
+        :param slow_request_count: number of slowest requests listed by log_summary.
+        """
+        self.connection_id = connection_id
+        self.operator = operator
+        self.slow_request_count = slow_request_count
+        self.tags_supported = _stats_support_tags()
+        self.count = 0
+        self.seconds = 0.0
+        self.retries = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self._slowest = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _tags(self, endpoint, method):
+        tags = {'endpoint': endpoint, 'method': method, 'conn_id': self.connection_id}
+        if self.operator:
+            tags['operator'] = self.operator
+        return tags
+
+    def record(self, method, url, status, seconds, bytes_out=0, bytes_in=0, retries=0):
+        """
+        :param method: request method.
+        :param url: request path.
+        :param status: final status code, or None when no response was received.
+        :param seconds: wall time of the request including its retries.
+        :param bytes_out: size of the request body.
+        :param bytes_in: size of the response body.
+        :param retries: number of times the request was repeated.
+        """
+        endpoint = endpoint_name(url)
+        status_name = str(status) if status is not None else 'error'
+        try:
+            if self.tags_supported:
+                tags = self._tags(endpoint, method)
+                Stats.timing('{}.duration'.format(STAT_PREFIX), timedelta(seconds=seconds), tags=tags)
+                Stats.incr('{}.status'.format(STAT_PREFIX), tags=dict(tags, status=status_name))
+                Stats.incr('{}.bytes_out'.format(STAT_PREFIX), bytes_out, tags=tags)
+                Stats.incr('{}.bytes_in'.format(STAT_PREFIX), bytes_in, tags=tags)
+                if retries:
+                    Stats.incr('{}.retries'.format(STAT_PREFIX), retries, tags=tags)
+            else:
+                prefix = '{}.{}.{}'.format(STAT_PREFIX, endpoint, method.lower())
+                Stats.timing('{}.duration'.format(prefix), timedelta(seconds=seconds))
+                Stats.incr('{}.status.{}'.format(prefix, status_name))
+                Stats.incr('{}.bytes_out'.format(prefix), bytes_out)
+                Stats.incr('{}.bytes_in'.format(prefix), bytes_in)
+                if retries:
+                    Stats.incr('{}.retries'.format(prefix), retries)
+        except Exception as e:
+            # Metrics must never fail a request.
+            logging.debug("Could not emit request stats: %s", e)
+
+        record = RequestRecord(seconds=seconds, method=method, url=url, status=status, retries=retries)
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            self.retries += retries
+            self.bytes_out += bytes_out
+            self.bytes_in += bytes_in
+            if self.slow_request_count > 0:
+                entry = (seconds, next(self._seq), record)
+                if len(self._slowest) < self.slow_request_count:
+                    heapq.heappush(self._slowest, entry)
+                else:
+                    heapq.heappushpop(self._slowest, entry)
+
+    @property
+    def slowest(self):
+        """
+        :return: the slowest RequestRecords, slowest first.
+        """
+        with self._lock:
+            return [r for _, _, r in sorted(self._slowest, reverse=True)]
+
+    def log_summary(self):
+        if not self.count:
+            return
+        lines = '\n'.join('  {:8.3f}s {} {} -> {}{}'.format(r.seconds, r.method, r.url, r.status or 'error',
+                                                           ' ({} retries)'.format(r.retries) if r.retries else '')
+                          for r in self.slowest)
+        logging.info("Bigeye requests: %s in %.2fs, %s retries, %s bytes sent, %s bytes received.  Slowest:\n%s",
+                     self.count, self.seconds, self.retries, self.bytes_out, self.bytes_in, lines)
@@ -0,0 +1,102 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+from airflow.configuration import conf
+
+try:
+    from opentelemetry import context as otel_context, trace
+except ImportError:  # Tracing is optional and needs Python 3.7+: pip install bigeye-airflow[tracing]
+    otel_context = None
+    trace = None
+
+TRACER_NAME = 'bigeye_airflow'
+ATTRIBUTE_PREFIX = 'bigeye.'
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def configure_tracing():
+    """
+    Installs a tracer provider exporting to [bigeye] tracing_exporter, console or otlp, unless the process already has
+    one, e.g. from opentelemetry-instrument.  The otlp exporter reads the standard OTEL_EXPORTER_OTLP_* variables.
+    """
+    global _configured
+    with _configure_lock:
+        if _configured or trace is None:
+            return
+        _configured = True
+        exporter_name = conf.get('bigeye', 'tracing_exporter', fallback=None)
+        if not exporter_name:
+            return
+        if not isinstance(trace.get_tracer_provider(), trace.ProxyTracerProvider):
+            logging.info("A tracer provider is already installed.  Ignoring [bigeye] tracing_exporter.")
+            return
+        try:
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+            if exporter_name == 'console':
+                exporter = ConsoleSpanExporter()
+            elif exporter_name == 'otlp':
+                from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+                exporter = OTLPSpanExporter()
+            else:
+                logging.warning("Unknown [bigeye] tracing_exporter %s.  Use console or otlp.", exporter_name)
+                return
+        except ImportError as e:
+            logging.warning("Cannot export traces to %s: %s", exporter_name, e)
+            return
+        provider = TracerProvider(resource=Resource.create({'service.name': 'bigeye-airflow'}))
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        trace.set_tracer_provider(provider)
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Runs the block in a span, a child of the current one, with the given attributes prefixed with bigeye.  Exceptions
+    are recorded on the span and re-raised.  A no-op when OpenTelemetry isn't installed.
+    :param name: span name.
+    :param attributes: span attributes.  None values are skipped.
+    """
+    if trace is None:
+        yield NOOP_SPAN
+        return
+    configure_tracing()
+    with trace.get_tracer(TRACER_NAME).start_as_current_span(name) as s:
+        set_attributes(s, **attributes)
+        yield s
+
+
+def set_attributes(s, **attributes):
+    for k, v in attributes.items():
+        if v is not None:
+            s.set_attribute(ATTRIBUTE_PREFIX + k, v)
+
+
+def propagate(fn):
+    """
+    :return: fn bound to the caller's trace context, so spans it starts on a pool thread nest under the caller's.
+    """
+    if otel_context is None:
+        return fn
+    ctx = otel_context.get_current()
+
+    def run(*args, **kwargs):
+        token = otel_context.attach(ctx)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            otel_context.detach(token)
+
+    return run
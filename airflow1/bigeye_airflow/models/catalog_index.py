@@ -0,0 +1,37 @@
+class CatalogIndex:
+    """
+    Case-insensitive index of the dataset/tables catalog built up over one operator execution.  Each schema is
+    downloaded once, on first use, with fetch_schema_tables and every later lookup is served from memory.
+    """
+
+    def __init__(self, fetch_schema_tables):
+        """
+        :param fetch_schema_tables: callable taking a schema name and returning the dataset/tables list for it.
+        """
+        self._fetch_schema_tables = fetch_schema_tables
+        self._schemas = {}
+        self._fields = {}
+
+    def get_schema(self, schema_name: str) -> dict:
+        """
+        :param schema_name: name of the schema.
+        :return: { <table_name.lower>: <table_entry> }
+        """
+        key = schema_name.lower()
+        if key not in self._schemas:
+            self._schemas[key] = {t['datasetName'].lower(): t for t in self._fetch_schema_tables(schema_name)}
+        return self._schemas[key]
+
+    def get_table(self, schema_name: str, table_name: str):
+        return self.get_schema(schema_name).get(table_name.lower())
+
+    def get_field(self, table: dict, field_name: str):
+        """
+        :param table: a table entry returned by get_table.
+        :param field_name: case-insensitive name of the field.
+        :return: the field entry or None.
+        """
+        table_key = table['id']
+        if table_key not in self._fields:
+            self._fields[table_key] = {f['fieldName'].lower(): f for f in table['fields']}
+        return self._fields[table_key].get(field_name.lower())
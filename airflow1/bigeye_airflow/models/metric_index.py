@@ -0,0 +1,76 @@
+import hashlib
+import json
+
+FRESHNESS_METRIC_NAME = 'HOURS_SINCE_MAX'
+# The settings CreateMetricOperator writes onto an existing metric, and the ones of those whose order carries no
+# meaning.
+UPDATABLE_FIELDS = ['thresholds', 'notificationChannels', 'scheduleFrequency', 'lookbackType', 'lookback',
+                    'grainSeconds']
+UNORDERED_FIELDS = ['thresholds', 'notificationChannels']
+
+
+def metric_identity(metric_name: str, column_name: str, group_by: list, filters: list) -> tuple:
+    """
+    Canonical identity of a metric.  Every freshness metric shares one name, the column is compared case-insensitively
+    and group bys and filters must match exactly.
+    :return: a hashable tuple.
+    """
+    if FRESHNESS_METRIC_NAME in metric_name:
+        metric_name = FRESHNESS_METRIC_NAME
+    return metric_name, (column_name or '').lower(), tuple(group_by or []), tuple(filters or [])
+
+
+def get_metric_dict_identity(metric: dict):
+    """
+    :param metric: a metric entry from the api/v1/metrics endpoint.
+    :return: the metric's identity or None when it has no predefined metric name.
+    """
+    metric_name = ((metric.get('metricType') or {}).get('predefinedMetric') or {}).get('metricName')
+    if metric_name is None:
+        return None
+    parameters = metric.get('parameters') or [{}]
+    return metric_identity(metric_name, parameters[0].get('columnName'),
+                           metric.get('groupBys', []), metric.get('filters', []))
+
+
+def get_metric_fingerprint(metric: dict) -> str:
+    """
+    Digest of the updatable settings of a metric, so a desired metric can be compared with the existing one.  Empty
+    settings are left out and unordered lists are sorted so equal settings always produce equal fingerprints.
+    :param metric: a metric entry from, or for, the api/v1/metrics endpoint.
+    :return: hex digest.
+    """
+    state = {}
+    for f in UPDATABLE_FIELDS:
+        v = metric.get(f)
+        if f in UNORDERED_FIELDS and v:
+            v = sorted(v, key=lambda i: json.dumps(i, sort_keys=True))
+        if v:
+            state[f] = v
+    return hashlib.sha1(json.dumps(state, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class MetricIndex:
+    """
+    Hash index of one table's metrics keyed by identity, replacing a linear scan per configuration.  When several
+    metrics share an identity the first one listed wins, as it did with the scan.
+    """
+
+    def __init__(self, metrics: list):
+        self._ix = {}
+        for m in metrics:
+            key = get_metric_dict_identity(m)
+            if key is not None:
+                self._ix.setdefault(key, m)
+
+    def get(self, metric_name: str, column_name: str, group_by: list, filters: list):
+        return self._ix.get(metric_identity(metric_name, column_name, group_by, filters))
+
+    def put(self, metric: dict):
+        """Adds or replaces a metric, e.g. after it was upserted."""
+        key = get_metric_dict_identity(metric)
+        if key is not None:
+            self._ix[key] = metric
+
+    def __len__(self):
+        return len(self._ix)
@@ -1,12 +1,19 @@
 import datetime
 import json
 import logging
+from contextlib import contextmanager
 from typing import List
 
-from airflow.hooks.http_hook import HttpHook
 from airflow.models import BaseOperator
 from airflow.utils.decorators import apply_defaults
-from functools import reduce
+from bigeye_airflow.hooks.bigeye_http_hook import BigeyeHttpHook
+from bigeye_airflow.hooks.catalog_cache import get_schema_tables
+from bigeye_airflow.hooks.connection_cache import connection_cache
+from bigeye_airflow.hooks.profiling import profiled
+from bigeye_airflow.hooks.request_stats import RequestStats
+from bigeye_airflow.hooks.tracing import set_attributes, span
+from bigeye_airflow.models.catalog_index import CatalogIndex
+from bigeye_airflow.models.metric_index import MetricIndex, get_metric_fingerprint
 
 
 def get_case_sensitive_field_name(table: dict, inbound_field_name: str) -> str:
@@ -45,102 +52,183 @@ class CreateMetricOperator(BaseOperator):
                                           update_schedule=None, metric_name=None,
                                           extras=...)),
                  run_after_upsert: bool = False,
+                 backfill_batch_size: int = 100,
+                 profiler: str = None,
+                 profile_dir: str = None,
                  *args,
                  **kwargs):
+        """
+        param backfill_batch_size: maximum metric ids per backfill request.  At least 1.
+        param profiler: profiles execute with cprofile or sampling and logs a summary.  Defaults to [bigeye] profiler.
+        param profile_dir: directory of the profile artifacts.  Defaults to [bigeye] profile_dir.
+        """
         super(CreateMetricOperator, self).__init__(*args, **kwargs)
+        if backfill_batch_size < 1:
+            raise ValueError("backfill_batch_size must be at least 1, got {}.".format(backfill_batch_size))
         self.connection_id = connection_id
         self.warehouse_id = warehouse_id
         self.configuration = configuration
         self.run_after_upsert = run_after_upsert
+        self.backfill_batch_size = backfill_batch_size
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        self._catalog = None
+        self._metric_indexes = {}
+        self._request_stats = None
 
     def execute(self, context):
-
+        self._request_stats = RequestStats(self.connection_id, operator=self.task_id)
+        try:
+            with profiled('{}.{}'.format(self.dag_id, self.task_id), self.profiler, self.profile_dir), \
+                    span('bigeye.create_metrics', task_id=self.task_id, warehouse_id=self.warehouse_id,
+                         metric_count=len(self.configuration)):
+                return self._execute(context)
+        finally:
+            self._request_stats.log_summary()
+            connection_cache.log_stats()
+
+    def _execute(self, context):
+
+        # Each schema's table listing is downloaded once and shared by every configuration.
+        self._catalog = CatalogIndex(self._get_schema_tables)
+        # As is each table's list of existing metrics.
+        self._metric_indexes = {}
         num_failing_metric_runs = 0
         created_metrics_ids: List[int] = []
-
-        for c in self.configuration:
-            table_name = c["table_name"]
-            schema_name = c["schema_name"]
-            column_name = c["column_name"]
-            default_check_frequency_hours = c.get("default_check_frequency_hours", 2)
-            update_schedule = c.get("update_schedule", None)
-            delay_at_update = c.get("delay_at_update", "0 minutes")
-            timezone = c.get("timezone", "UTC")
-            notifications = c.get("notifications", [])
-            metric_name = c.get("metric_name")
-            should_backfill = c.get("should_backfill", False)
-            lookback_type = enforce_lookback_type_defaults(metric_name=metric_name,
-                                                           lookback_type=c.get("lookback_type", None))
-            lookback_days = c.get("lookback_days", 2)
-            window_size_seconds = self._get_seconds_from_window_size(c.get("window_size", "1 day"))
-            thresholds = c.get("thresholds", [])
-            filters = c.get("filters", [])
-
-            if metric_name is None:
-                raise Exception("Metric name must be present in configuration", c)
-
-            # Getting Table
-            table = self._get_table_for_name(schema_name, table_name)
-            if table is None or table.get("id") is None:
-                raise Exception("Could not find table: ", schema_name, table_name)
-
-            # this uglyness goes away by using a dataclass in airflow2.
-            if 'group_by' in c:
-                if isinstance(c['group_by'], list):
-                    group_by = [get_case_sensitive_field_name(table, c) for c in c['group_by']]
-                elif c['group_by'] is None:
-                    group_by = []
+        upsert_counts = {"created": 0, "updated": 0, "unchanged": 0}
+        seen_backfill_metric_ids = set()
+
+        with self._coalesced_backfills() as backfill_metric_ids:
+            for c in self.configuration:
+                table_name = c["table_name"]
+                schema_name = c["schema_name"]
+                column_name = c["column_name"]
+                default_check_frequency_hours = c.get("default_check_frequency_hours", 2)
+                update_schedule = c.get("update_schedule", None)
+                delay_at_update = c.get("delay_at_update", "0 minutes")
+                timezone = c.get("timezone", "UTC")
+                notifications = c.get("notifications", [])
+                metric_name = c.get("metric_name")
+                should_backfill = c.get("should_backfill", False)
+                lookback_type = enforce_lookback_type_defaults(metric_name=metric_name,
+                                                               lookback_type=c.get("lookback_type", None))
+                lookback_days = c.get("lookback_days", 2)
+                window_size_seconds = self._get_seconds_from_window_size(c.get("window_size", "1 day"))
+                thresholds = c.get("thresholds", [])
+                filters = c.get("filters", [])
+
+                if metric_name is None:
+                    raise Exception("Metric name must be present in configuration", c)
+
+                # Getting Table
+                table = self._get_table_for_name(schema_name, table_name)
+                if table is None or table.get("id") is None:
+                    raise Exception("Could not find table: ", schema_name, table_name)
+
+                # this uglyness goes away by using a dataclass in airflow2.
+                if 'group_by' in c:
+                    if isinstance(c['group_by'], list):
+                        group_by = [self._get_case_sensitive_field_name(table, c) for c in c['group_by']]
+                    elif c['group_by'] is None:
+                        group_by = []
+                    else:
+                        raise Exception(f'Configuration group_by element must be a list or None.\n'
+                                        f'Value: {c["group_by"]}.\n'
+                                        f'Type: {type(c["group_by"])}')
                 else:
-                    raise Exception(f'Configuration group_by element must be a list or None.\n'
-                                    f'Value: {c["group_by"]}.\n'
-                                    f'Type: {type(c["group_by"])}')
-            else:
-                group_by = []
-
-            # Getting Existing Metric
-            existing_metric = self._get_existing_metric(table, column_name, metric_name, group_by, filters)
-            metric = self._get_metric_object(existing_metric, table, notifications, column_name,
-                                             update_schedule, delay_at_update, timezone, default_check_frequency_hours,
-                                             metric_name, lookback_type, lookback_days, window_size_seconds, thresholds,
-                                             filters, group_by)
-            logging.info("Sending metric to create: %s", metric)
-            if metric.get("id") is None and not self._is_freshness_metric(metric_name):
-                should_backfill = True
-            bigeye_post_hook = self.get_hook('POST')
-            result = bigeye_post_hook.run("api/v1/metrics",
-                                          headers={"Content-Type": "application/json", "Accept": "application/json"},
-                                          data=json.dumps(metric))
-
-            metric_id = result.json().get("id")
-
-            logging.info("Create metric status: %s", result.status_code)
-            logging.info("Create result: %s", result.json())
-            logging.info(f"Created Metric ID: {metric_id}")
-
-            created_metrics_ids.append(metric_id)
-
-            if should_backfill and metric_id is not None and self._table_has_metric_time(table):
-                bigeye_post_hook.run("api/v1/metrics/backfill",
-                                     headers={"Content-Type": "application/json", "Accept": "application/json"},
-                                     data=json.dumps({"metricIds": [result.json()["id"]]}))
-
-            if self.run_after_upsert and metric_id is not None:
-                hook = self.get_hook('GET')
-                logging.info(f"Running metric: {metric}")
-                metric_result = hook.run(
-                    f"statistics/runOne/{metric_id}",
-                    headers={"Content-Type": "application/json", "Accept": "application/json"}).json()
-
-                for mr in metric_result:
-                    if not mr['statusOk']:
-                        logging.error("Metric is not OK: %s", metric_id)
-                        logging.error("Metric result: %s", mr)
-                        num_failing_metric_runs += 1
+                    group_by = []
 
+                # Getting Existing Metric
+                existing_metric = self._get_existing_metric(table, column_name, metric_name, group_by, filters)
+                # _get_metric_object updates existing_metric in place, so fingerprint it first.
+                existing_fingerprint = get_metric_fingerprint(existing_metric) if existing_metric else None
+                metric = self._get_metric_object(existing_metric, table, notifications, column_name,
+                                                 update_schedule, delay_at_update, timezone,
+                                                 default_check_frequency_hours, metric_name, lookback_type,
+                                                 lookback_days, window_size_seconds, thresholds, filters, group_by)
+                if metric.get("id") is None and not self._is_freshness_metric(metric_name):
+                    should_backfill = True
+                bigeye_post_hook = self.get_hook('POST')
+
+                if existing_fingerprint is not None and existing_fingerprint == get_metric_fingerprint(metric):
+                    metric_id = metric["id"]
+                    logging.info(f"Metric {metric_id} is unchanged.  Skipping upsert.")
+                    upsert_counts["unchanged"] += 1
+                else:
+                    logging.info("Sending metric to create: %s", metric)
+                    payload = json.dumps(metric)
+                    with span('bigeye.upsert_metric', schema=schema_name, table=table_name, column=column_name,
+                              metric_name=metric_name, metric_id=metric.get("id"), payload_size=len(payload)):
+                        result = bigeye_post_hook.run("api/v1/metrics",
+                                                      headers={"Content-Type": "application/json",
+                                                               "Accept": "application/json"},
+                                                      data=payload)
+
+                    metric_id = result.json().get("id")
+                    if metric_id is not None:
+                        self._get_metric_index(table).put(result.json())
+                    upsert_counts["updated" if metric.get("id") is not None else "created"] += 1
+
+                    logging.info("Create metric status: %s", result.status_code)
+                    logging.info("Create result: %s", result.json())
+                    logging.info(f"Created Metric ID: {metric_id}")
+
+                created_metrics_ids.append(metric_id)
+
+                if should_backfill and metric_id is not None and self._table_has_metric_time(table) \
+                        and metric_id not in seen_backfill_metric_ids:
+                    seen_backfill_metric_ids.add(metric_id)
+                    backfill_metric_ids.append(metric_id)
+
+                if self.run_after_upsert and metric_id is not None:
+                    hook = self.get_hook('GET')
+                    logging.info(f"Running metric: {metric}")
+                    metric_result = hook.run(
+                        f"statistics/runOne/{metric_id}",
+                        headers={"Content-Type": "application/json", "Accept": "application/json"}).json()
+
+                    for mr in metric_result:
+                        if not mr['statusOk']:
+                            logging.error("Metric is not OK: %s", metric_id)
+                            logging.error("Metric result: %s", mr)
+                            num_failing_metric_runs += 1
+
+        logging.info("Metrics created: {created}, updated: {updated}, unchanged: {unchanged}."
+                     .format(**upsert_counts))
         return created_metrics_ids
 
 
 
+    @contextmanager
+    def _coalesced_backfills(self):
+        """
+        Yields a list to collect the metric ids to backfill in and backfills them when the block exits, after any
+        runs of run_after_upsert.  When the block raised, the metrics created before it are still backfilled, as a
+        retry would find them unchanged and skip them, but a failed backfill is only logged so the block's exception
+        is the one raised.
+        """
+        metric_ids: List[int] = []
+        try:
+            yield metric_ids
+        except BaseException:
+            try:
+                self._backfill_metrics(metric_ids)
+            except Exception as e:
+                logging.error("Exception backfilling metrics: %s", e)
+            raise
+        self._backfill_metrics(metric_ids)
+
+    def _backfill_metrics(self, metric_ids):
+        """Backfills the metrics collected during execute in requests of at most backfill_batch_size ids."""
+        bigeye_post_hook = self.get_hook('POST')
+        with span('bigeye.backfill', metric_count=len(metric_ids)):
+            for i in range(0, len(metric_ids), self.backfill_batch_size):
+                batch = metric_ids[i:i + self.backfill_batch_size]
+                logging.info(f"Backfilling {len(batch)} metrics.")
+                bigeye_post_hook.run("api/v1/metrics/backfill",
+                                     headers={"Content-Type": "application/json", "Accept": "application/json"},
+                                     data=json.dumps({"metricIds": batch}))
+
     def _table_has_metric_time(self, table):
         for field in table["fields"]:
             if field["metricTimeField"]:
@@ -155,8 +243,8 @@ class CreateMetricOperator(BaseOperator):
         else:
             raise Exception("Can only set window size of '1 hour' or '1 day'")
 
-    def get_hook(self, method) -> HttpHook:
-        return HttpHook(http_conn_id=self.connection_id, method=method)
+    def get_hook(self, method) -> BigeyeHttpHook:
+        return BigeyeHttpHook(http_conn_id=self.connection_id, method=method, request_stats=self._request_stats)
 
     def _get_metric_object(self, existing_metric, table, notifications, column_name, update_schedule, delay_at_update,
                            timezone, default_check_frequency_hours, metric_name, lookback_type, lookback_days,
@@ -246,43 +334,42 @@ class CreateMetricOperator(BaseOperator):
         ]
 
     def _get_existing_metric(self, table, column_name, metric_name, group_by, filters):
-        hook = self.get_hook('GET')
-        result = hook.run("api/v1/metrics?warehouseIds={warehouse_id}&tableIds={table_id}"
-                          .format(warehouse_id=self.warehouse_id,
-                                  table_id=table.get("id")),
-                          headers={"Accept": "application/json"})
-        metrics = result.json()
-        for m in metrics:
-            if self._is_same_type_metric(m, metric_name, group_by, filters) \
-                    and self._is_same_column_metric(m, column_name):
-                return m
-        return None
-
-    def _is_same_column_metric(self, m, column_name):
-        return m["parameters"][0].get("columnName").lower() == column_name.lower()
-
-    def _is_same_type_metric(self, metric, metric_name, group_by, filters):
-        keys = ["metricType", "predefinedMetric", "metricName"]
-        result = reduce(lambda val, key: val.get(key) if val else None, keys, metric)
-        if result is None:
-            return False
-        both_metrics_freshness = self._is_freshness_metric(result) and self._is_freshness_metric(metric_name)
-        same_group_by = metric.get('groupBys', []) == group_by
-        same_filters = metric.get('filters', []) == filters
-        return result is not None and (result == metric_name or both_metrics_freshness) \
-               and same_group_by and same_filters
+        return self._get_metric_index(table).get(metric_name, column_name, group_by, filters)
+
+    def _get_metric_index(self, table) -> MetricIndex:
+        table_id = table.get("id")
+        if table_id not in self._metric_indexes:
+            hook = self.get_hook('GET')
+            with span('bigeye.metric_search', warehouse_id=self.warehouse_id, table_id=table_id) as s:
+                result = hook.run("api/v1/metrics?warehouseIds={warehouse_id}&tableIds={table_id}"
+                                  .format(warehouse_id=self.warehouse_id,
+                                          table_id=table_id),
+                                  headers={"Accept": "application/json"})
+                self._metric_indexes[table_id] = MetricIndex(result.json())
+                set_attributes(s, metric_count=len(self._metric_indexes[table_id]))
+        return self._metric_indexes[table_id]
+
+    def _get_schema_tables(self, schema_name):
+        # Only keep the tables the configuration references.
+        table_names = {c["table_name"].lower() for c in self.configuration
+                       if c["schema_name"].lower() == schema_name.lower()}
+        return get_schema_tables(self.get_hook('GET'), self.connection_id, self.warehouse_id, schema_name,
+                                 table_names=table_names)
 
     def _get_table_for_name(self, schema_name, table_name):
-        hook = self.get_hook('GET')
-        result = hook.run("dataset/tables/{warehouse_id}/{schema_name}"
-                          .format(warehouse_id=self.warehouse_id,
-                                  schema_name=schema_name),
-                          headers={"Accept": "application/json"})
-        tables = result.json()
-        for t in tables:
-            if t['datasetName'].lower() == table_name.lower():
-                return t
-        return None
+        if self._catalog is None:
+            self._catalog = CatalogIndex(self._get_schema_tables)
+        with span('bigeye.table_resolution', warehouse_id=self.warehouse_id, schema=schema_name, table=table_name):
+            return self._catalog.get_table(schema_name, table_name)
+
+    def _get_field(self, table, field_name):
+        if self._catalog is None:
+            self._catalog = CatalogIndex(self._get_schema_tables)
+        return self._catalog.get_field(table, field_name)
+
+    def _get_case_sensitive_field_name(self, table, inbound_field_name):
+        f = self._get_field(table, inbound_field_name)
+        return f['fieldName'] if f else None
 
     def _get_notification_channels(self, notifications):
         channels = []
@@ -294,12 +381,12 @@ class CreateMetricOperator(BaseOperator):
         return channels
 
     def _get_freshness_metric_name_for_field(self, table, column_name):
-        for f in table.get("fields"):
-            if f.get("fieldName").lower() == column_name.lower():
-                if f.get("type") == "TIMESTAMP_LIKE":
-                    return "HOURS_SINCE_MAX_TIMESTAMP"
-                elif f.get("type") == "DATE_LIKE":
-                    return "HOURS_SINCE_MAX_DATE"
+        f = self._get_field(table, column_name)
+        if f is not None:
+            if f.get("type") == "TIMESTAMP_LIKE":
+                return "HOURS_SINCE_MAX_TIMESTAMP"
+            elif f.get("type") == "DATE_LIKE":
+                return "HOURS_SINCE_MAX_DATE"
 
     def _get_time_interval_for_delay_string(self, delay_at_update, metric_name, update_schedule):
         split_input = delay_at_update.split(" ", 1)
@@ -1,9 +1,17 @@
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
-from airflow.hooks.http_hook import HttpHook
 from airflow.models import BaseOperator
 from airflow.utils.decorators import apply_defaults
 
+from bigeye_airflow.hooks.bigeye_http_hook import BigeyeHttpHook
+from bigeye_airflow.hooks.catalog_cache import get_schema_tables
+from bigeye_airflow.hooks.connection_cache import connection_cache
+from bigeye_airflow.hooks.profiling import profiled
+from bigeye_airflow.hooks.request_stats import RequestStats
+from bigeye_airflow.hooks.tracing import propagate, set_attributes, span
+
 
 class RunMetricsOperator(BaseOperator):
 
@@ -13,16 +21,43 @@ class RunMetricsOperator(BaseOperator):
                  schema_name,
                  table_name,
                  metric_ids=None,
+                 batch_size=None,
+                 max_concurrency=1,
+                 profiler=None,
+                 profile_dir=None,
                  *args,
                  **kwargs):
+        """
+        param batch_size: number of metrics sent per api/v1/metrics/run/batch request.  Metrics are run one at a
+        time with statistics/runOne if None.
+        param max_concurrency: number of run requests, single or batched, in flight at once.
+        param profiler: profiles execute with cprofile or sampling and logs a summary.  Defaults to [bigeye] profiler.
+        param profile_dir: directory of the profile artifacts.  Defaults to [bigeye] profile_dir.
+        """
         super(RunMetricsOperator, self).__init__(*args, **kwargs)
         self.connection_id = connection_id
         self.warehouse_id = warehouse_id
         self.schema_name = schema_name
         self.table_name = table_name
         self.metric_ids = metric_ids
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        self._request_stats = None
 
     def execute(self, context):
+        self._request_stats = RequestStats(self.connection_id, operator=self.task_id)
+        try:
+            with profiled('{}.{}'.format(self.dag_id, self.task_id), self.profiler, self.profile_dir), \
+                    span('bigeye.run_metrics', task_id=self.task_id, warehouse_id=self.warehouse_id,
+                         schema=self.schema_name, table=self.table_name):
+                return self._execute(context)
+        finally:
+            self._request_stats.log_summary()
+            connection_cache.log_stats()
+
+    def _execute(self, context):
         metric_ids_to_run = []
         hook = self.get_hook('GET')
         if self.metric_ids is None:
@@ -30,37 +65,65 @@ class RunMetricsOperator(BaseOperator):
             if table is None or table.get("id") is None:
                 raise Exception("Could not find table: ", self.schema_name, self.table_name)
             table_id = table.get("id")
-            result = hook.run("api/v1/metrics?warehouseIds={warehouse_id}&tableIds={table_id}"
-                              .format(warehouse_id=self.warehouse_id,
-                                      table_id=table_id),
-                              headers={"Accept": "application/json"})
-            metrics = result.json()
+            with span('bigeye.metric_search', warehouse_id=self.warehouse_id, table_id=table_id) as s:
+                result = hook.run("api/v1/metrics?warehouseIds={warehouse_id}&tableIds={table_id}"
+                                  .format(warehouse_id=self.warehouse_id,
+                                          table_id=table_id),
+                                  headers={"Accept": "application/json"})
+                metrics = result.json()
+                set_attributes(s, metric_count=len(metrics))
             metric_ids_to_run = [m['id'] for m in metrics]
         else:
             metric_ids_to_run = self.metric_ids
-        num_failing_metrics = 0
-        for m in metric_ids_to_run:
-            logging.debug("Running metric: %s", m)
-            metric_result = hook.run("statistics/runOne/{id}".format(id=m)).json()
-            for mr in metric_result:
-                if not mr['statusOk']:
-                    logging.error("Metric is not OK: %s", m)
-                    logging.error("Metric result: %s", mr)
-                    num_failing_metrics += 1
+        with span('bigeye.batch_run', metric_count=len(metric_ids_to_run), batch_size=self.batch_size):
+            if self.batch_size:
+                batches = [metric_ids_to_run[i:i + self.batch_size]
+                           for i in range(0, len(metric_ids_to_run), self.batch_size)]
+                num_failing_metrics = sum(self._map_concurrently(self._run_metric_batch, batches))
+            else:
+                num_failing_metrics = sum(self._map_concurrently(self._run_metric, metric_ids_to_run))
         if num_failing_metrics > 0:
             error_message = "There are {num_failing} failing metrics; see logs for more details"
             raise ValueError(error_message.format(num_failing=num_failing_metrics))
 
-    def get_hook(self, method) -> HttpHook:
-        return HttpHook(http_conn_id=self.connection_id, method=method)
+    def _map_concurrently(self, fn, items) -> list:
+        if self.max_concurrency <= 1 or len(items) <= 1:
+            return [fn(i) for i in items]
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            return list(executor.map(propagate(fn), items))
+
+    def _run_metric(self, metric_id) -> int:
+        logging.debug("Running metric: %s", metric_id)
+        metric_result = self.get_hook('GET').run("statistics/runOne/{id}".format(id=metric_id)).json()
+        num_failing_metrics = 0
+        for mr in metric_result:
+            if not mr['statusOk']:
+                logging.error("Metric is not OK: %s", metric_id)
+                logging.error("Metric result: %s", mr)
+                num_failing_metrics += 1
+        return num_failing_metrics
+
+    def _run_metric_batch(self, metric_ids) -> int:
+        logging.debug("Running metric batch: %s", metric_ids)
+        result = self.get_hook('POST').run("api/v1/metrics/run/batch",
+                                           headers={"Content-Type": "application/json",
+                                                    "Accept": "application/json"},
+                                           data=json.dumps({"metricIds": metric_ids})).json()
+        num_failing_metrics = 0
+        for mi in result.get("metricInfos", []):
+            if mi.get("status") != "METRIC_RUN_STATUS_OK":
+                logging.error("Metric is not OK: %s", mi.get("metricConfiguration", {}).get("id"))
+                logging.error("Metric result: %s", mi)
+                num_failing_metrics += 1
+        return num_failing_metrics
+
+    def get_hook(self, method) -> BigeyeHttpHook:
+        return BigeyeHttpHook(http_conn_id=self.connection_id, method=method, request_stats=self._request_stats)
 
     def _get_table_for_name(self, schema_name, table_name):
-        hook = self.get_hook('GET')
-        result = hook.run("dataset/tables/{warehouse_id}/{schema_name}"
-                          .format(warehouse_id=self.warehouse_id,
-                                  schema_name=schema_name),
-                          headers={"Accept": "application/json"})
-        tables = result.json()
+        with span('bigeye.table_resolution', warehouse_id=self.warehouse_id, schema=schema_name, table=table_name):
+            tables = get_schema_tables(self.get_hook('GET'), self.connection_id, self.warehouse_id, schema_name,
+                                       table_names={table_name.lower()})
         for t in tables:
             if t['datasetName'].lower() == table_name.lower():
                 return t
@@ -0,0 +1,65 @@
+import glob
+import os
+import pstats
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from airflow1.bigeye_airflow.hooks.profiling import profiled
+from airflow1.bigeye_airflow.operators import run_metrics_operator
+
+
+def _busy_on_a_pool_thread(seconds=0.2):
+    def spin():
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            sum(range(100))
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(spin).result()
+
+
+class TestProfiling(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _artifacts(self, pattern):
+        return glob.glob(os.path.join(self.tmp.name, pattern))
+
+    def test_disabled_by_default(self):
+        with profiled('dag.task', output_dir=self.tmp.name):
+            pass
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_cprofile_includes_pool_threads(self):
+        with profiled('dag.task', 'cprofile', self.tmp.name):
+            _busy_on_a_pool_thread()
+
+        [path] = self._artifacts('*.pstats')
+        self.assertIn('spin', {f[2] for f in pstats.Stats(path).stats})
+        self.assertEqual(len(self._artifacts('*.tracemalloc')), 1)
+
+    def test_sampling_writes_collapsed_stacks(self):
+        with profiled('dag.task', 'sampling', self.tmp.name):
+            _busy_on_a_pool_thread()
+
+        [path] = self._artifacts('*.collapsed')
+        with open(path) as f:
+            self.assertIn('spin (test_profiling.py', f.read())
+
+    def test_run_metrics_operator(self):
+        operator = run_metrics_operator.RunMetricsOperator(task_id='run_metrics', connection_id='bigeye',
+                                                           warehouse_id=1, schema_name=None, table_name=None,
+                                                           metric_ids=[7], profiler='cprofile',
+                                                           profile_dir=self.tmp.name)
+        response = Mock(status_code=200, headers={}, json=Mock(return_value=[{"statusOk": True}]))
+        with patch.object(run_metrics_operator.BigeyeHttpHook.__bases__[0], 'run', return_value=response), \
+                self.assertLogs(level='INFO') as logs:
+            operator.execute(context={})
+
+        self.assertEqual(len(self._artifacts('*run_metrics*.pstats')), 1)
+        self.assertTrue(any('Profiled' in m for m in logs.output))
@@ -0,0 +1,61 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from airflow1.bigeye_airflow.hooks import request_stats
+from airflow1.bigeye_airflow.hooks.request_stats import RequestStats, endpoint_name
+
+
+class TestRequestStats(TestCase):
+
+    def test_endpoint_name(self):
+        self.assertEqual(endpoint_name("api/v1/metrics?warehouseIds=1&tableIds=2"), "api_v1_metrics")
+        self.assertEqual(endpoint_name("statistics/runOne/42"), "statistics_runOne_id")
+
+    @patch.object(request_stats, 'Stats')
+    def test_untagged_stats_name_the_endpoint(self, mock_stats):
+        stats = RequestStats('bigeye', operator='create_metrics')
+        stats.tags_supported = False
+
+        stats.record('GET', 'statistics/runOne/42', 200, 0.5, bytes_in=10)
+
+        mock_stats.timing.assert_called_once()
+        self.assertEqual(mock_stats.timing.call_args.args[0], 'bigeye.request.statistics_runOne_id.get.duration')
+        mock_stats.incr.assert_any_call('bigeye.request.statistics_runOne_id.get.status.200')
+        mock_stats.incr.assert_any_call('bigeye.request.statistics_runOne_id.get.bytes_in', 10)
+
+    @patch.object(request_stats, 'Stats')
+    def test_tagged_stats(self, mock_stats):
+        stats = RequestStats('bigeye', operator='create_metrics')
+        stats.tags_supported = True
+
+        stats.record('POST', 'api/v1/metrics', None, 0.5, bytes_out=3)
+
+        tags = {'endpoint': 'api_v1_metrics', 'method': 'POST', 'conn_id': 'bigeye', 'operator': 'create_metrics'}
+        mock_stats.incr.assert_any_call('bigeye.request.status', tags=dict(tags, status='error'))
+        mock_stats.incr.assert_any_call('bigeye.request.bytes_out', 3, tags=tags)
+
+    def test_slowest_requests_kept(self):
+        stats = RequestStats('bigeye', slow_request_count=2)
+        for i, seconds in enumerate([0.1, 0.5, 0.2, 0.9]):
+            stats.record('GET', 'api/v1/metrics/{}'.format(i), 200, seconds)
+
+        self.assertEqual([r.seconds for r in stats.slowest], [0.9, 0.5])
+        self.assertEqual(stats.count, 4)
+        stats.log_summary()
+
+    def test_operator_records_hook_calls(self):
+        from airflow1.bigeye_airflow.operators import run_metrics_operator
+
+        operator = run_metrics_operator.RunMetricsOperator(task_id='run_metrics', connection_id='bigeye',
+                                                           warehouse_id=1, schema_name=None, table_name=None,
+                                                           metric_ids=[7, 8])
+        response = Mock(status_code=200, headers={'Content-Length': '20'},
+                        json=Mock(return_value=[{"statusOk": True}]))
+        # The operator module resolves the hook and stats through its own import path.
+        with patch.object(run_metrics_operator.BigeyeHttpHook.__bases__[0], 'run', return_value=response), \
+                patch.object(run_metrics_operator.RequestStats, 'log_summary') as mock_log_summary:
+            operator.execute(context={})
+
+        self.assertEqual(operator._request_stats.count, 2)
+        self.assertEqual(operator._request_stats.bytes_in, 40)
+        mock_log_summary.assert_called_once()
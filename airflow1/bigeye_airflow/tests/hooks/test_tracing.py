@@ -0,0 +1,45 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from airflow1.bigeye_airflow.operators import run_metrics_operator
+
+
+class TestTracing(TestCase):
+
+    def setUp(self):
+        self.exporter = InMemorySpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(self.exporter))
+        patcher = patch.object(trace, 'get_tracer', side_effect=lambda name, *args, **kwargs: provider.get_tracer(name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_run_metrics_phases_and_http_calls_nest(self):
+        operator = run_metrics_operator.RunMetricsOperator(task_id='run_metrics', connection_id='bigeye',
+                                                           warehouse_id=1, schema_name=None, table_name=None,
+                                                           metric_ids=[7, 8], max_concurrency=2)
+        response = Mock(status_code=200, headers={}, json=Mock(return_value=[{"statusOk": True}]))
+        # The operator module resolves the hook through its own import path.
+        with patch.object(run_metrics_operator.BigeyeHttpHook.__bases__[0], 'run', return_value=response):
+            operator.execute(context={})
+
+        spans = self.exporter.get_finished_spans()
+        by_name = {}
+        for s in spans:
+            by_name.setdefault(s.name, []).append(s)
+        root = by_name['bigeye.run_metrics'][0]
+        batch_run = by_name['bigeye.batch_run'][0]
+        self.assertEqual(batch_run.parent.span_id, root.context.span_id)
+        self.assertEqual(batch_run.attributes['bigeye.metric_count'], 2)
+        http = by_name['bigeye.http GET']
+        self.assertEqual(len(http), 2)
+        # Run on pool threads, yet still children of the batch run.
+        self.assertTrue(all(s.parent.span_id == batch_run.context.span_id for s in http))
+        self.assertEqual(sorted(s.attributes['bigeye.url'] for s in http),
+                         ['statistics/runOne/7', 'statistics/runOne/8'])
+        self.assertEqual(http[0].attributes['bigeye.status_code'], 200)
@@ -0,0 +1,26 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+from airflow1.bigeye_airflow.models.catalog_index import CatalogIndex
+from airflow1.bigeye_airflow.tests.functions.test_metadata_functions import sample_table_metadata
+
+
+class TestCatalogIndex(TestCase):
+
+    def test_schema_fetched_once(self):
+        fetch = Mock(return_value=[sample_table_metadata])
+        catalog = CatalogIndex(fetch)
+
+        for _ in range(3):
+            table = catalog.get_table('demo_db.public', 'sga_eu_p2_ebs_input_staging_p9')
+            self.assertEqual(table['id'], 1225460)
+
+        self.assertIsNone(catalog.get_table('DEMO_DB.PUBLIC', 'missing'))
+        fetch.assert_called_once_with('demo_db.public')
+
+    def test_get_field_is_case_insensitive(self):
+        catalog = CatalogIndex(Mock(return_value=[sample_table_metadata]))
+        table = catalog.get_table('DEMO_DB.PUBLIC', 'SGA_EU_P2_EBS_INPUT_STAGING_P9')
+
+        self.assertEqual(catalog.get_field(table, 'CO_OBJECT_NAME')['fieldName'], 'co_object_Name')
+        self.assertIsNone(catalog.get_field(table, 'missing'))
@@ -0,0 +1,54 @@
+from unittest import TestCase
+
+from airflow1.bigeye_airflow.models.metric_index import MetricIndex, get_metric_fingerprint
+
+
+def _metric(metric_id, metric_name, column_name, group_bys=None, filters=None):
+    return {"id": metric_id,
+            "metricType": {"predefinedMetric": {"metricName": metric_name}},
+            "parameters": [{"key": "arg1", "columnName": column_name}],
+            "groupBys": group_bys or [],
+            "filters": filters or []}
+
+
+class TestMetricIndex(TestCase):
+
+    def test_matches_like_linear_scan(self):
+        ix = MetricIndex([{"id": 0, "metricType": {}},
+                          _metric(1, "COUNT_NULL", "Col_A"),
+                          _metric(2, "COUNT_NULL", "col_a"),
+                          _metric(3, "COUNT_NULL", "col_a", group_bys=["region"]),
+                          _metric(4, "HOURS_SINCE_MAX_DATE", "updated_at")])
+
+        self.assertEqual(ix.get("COUNT_NULL", "COL_A", [], [])["id"], 1)
+        self.assertEqual(ix.get("COUNT_NULL", "col_a", ["region"], [])["id"], 3)
+        self.assertIsNone(ix.get("COUNT_NULL", "col_a", ["REGION"], []))
+        self.assertEqual(ix.get("HOURS_SINCE_MAX_TIMESTAMP", "updated_at", [], [])["id"], 4)
+        self.assertEqual(len(ix), 3)
+
+    def test_put_replaces_metric(self):
+        ix = MetricIndex([_metric(1, "COUNT_NULL", "col_a")])
+        ix.put(_metric(5, "COUNT_NULL", "COL_A"))
+        ix.put(_metric(6, "COUNT_ROWS", "col_a"))
+
+        self.assertEqual(ix.get("COUNT_NULL", "col_a", [], [])["id"], 5)
+        self.assertEqual(ix.get("COUNT_ROWS", "col_a", [], [])["id"], 6)
+
+
+class TestMetricFingerprint(TestCase):
+
+    def test_fingerprint_ignores_order_and_empty_settings(self):
+        existing = dict(_metric(1, "COUNT_NULL", "col_a"),
+                        notificationChannels=[{"email": "a@b.co"}, {"slackChannel": "#dq"}],
+                        thresholds=[{"autoThreshold": {"bound": {"boundType": "LOWER_BOUND_SIMPLE_BOUND_TYPE"}}}],
+                        scheduleFrequency={"intervalType": "HOURS_TIME_INTERVAL_TYPE", "intervalValue": 2},
+                        createdAt=1)
+        desired = dict(existing,
+                       notificationChannels=list(reversed(existing["notificationChannels"])),
+                       grainSeconds=None)
+        del desired["createdAt"]
+
+        self.assertEqual(get_metric_fingerprint(existing), get_metric_fingerprint(desired))
+
+        desired["scheduleFrequency"] = {"intervalType": "HOURS_TIME_INTERVAL_TYPE", "intervalValue": 4}
+        self.assertNotEqual(get_metric_fingerprint(existing), get_metric_fingerprint(desired))
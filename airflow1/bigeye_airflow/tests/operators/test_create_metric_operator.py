@@ -0,0 +1,74 @@
+import copy
+import itertools
+import json
+from unittest import TestCase
+from unittest.mock import patch, Mock
+
+from airflow1.bigeye_airflow.operators.create_metric_operator import CreateMetricOperator
+from airflow1.bigeye_airflow.tests.functions.test_metadata_functions import sample_table_metadata
+
+
+class TestCreateMetricOperator(TestCase):
+
+    def setUp(self):
+        self.table = copy.deepcopy(sample_table_metadata)
+        self.table["fields"][0]["metricTimeField"] = True
+        self.metric_ids = itertools.count(1)
+        self.calls = []
+
+    def _run(self, endpoint, headers=None, data=None, extra_options=None):
+        self.calls.append((endpoint, json.loads(data) if data else None))
+        if endpoint.startswith("dataset/tables"):
+            return Mock(iter_content=Mock(return_value=[json.dumps([self.table]).encode('utf-8')]))
+        if endpoint.startswith("api/v1/metrics?"):
+            return Mock(json=Mock(return_value=[]))
+        if endpoint == "api/v1/metrics":
+            return Mock(status_code=200, json=Mock(return_value={"id": next(self.metric_ids)}))
+        return Mock(status_code=200)
+
+    @patch.object(CreateMetricOperator, 'get_hook')
+    def test_backfills_coalesced_after_upserts(self, mock_get_hook):
+        mock_get_hook.return_value.run.side_effect = self._run
+        configuration = [{"schema_name": "DEMO_DB.PUBLIC", "table_name": "SGA_EU_P2_EBS_INPUT_STAGING_P9",
+                          "column_name": f["fieldName"], "metric_name": "COUNT_NULL"}
+                         for f in self.table["fields"][:3]]
+        operator = CreateMetricOperator(task_id='create_metrics', connection_id='bigeye', warehouse_id=1,
+                                        configuration=configuration, backfill_batch_size=2)
+
+        self.assertEqual(operator.execute(context={}), [1, 2, 3])
+
+        endpoints = [e for e, _ in self.calls]
+        backfills = [d["metricIds"] for e, d in self.calls if e == "api/v1/metrics/backfill"]
+        self.assertEqual(backfills, [[1, 2], [3]])
+        self.assertLess(max(i for i, e in enumerate(endpoints) if e == "api/v1/metrics"),
+                        endpoints.index("api/v1/metrics/backfill"))
+
+    @patch.object(CreateMetricOperator, 'get_hook')
+    def test_created_metrics_backfilled_when_a_later_configuration_fails(self, mock_get_hook):
+        def run(endpoint, headers=None, data=None, extra_options=None):
+            if endpoint == "api/v1/metrics/backfill":
+                self.calls.append((endpoint, json.loads(data)))
+                raise ConnectionError("backfill down")
+            return self._run(endpoint, headers, data, extra_options)
+
+        mock_get_hook.return_value.run.side_effect = run
+        configuration = [{"schema_name": "DEMO_DB.PUBLIC", "table_name": "SGA_EU_P2_EBS_INPUT_STAGING_P9",
+                          "column_name": f["fieldName"], "metric_name": "COUNT_NULL"}
+                         for f in self.table["fields"][:2]]
+        configuration.append({"schema_name": "DEMO_DB.PUBLIC", "table_name": "MISSING",
+                              "column_name": self.table["fields"][2]["fieldName"], "metric_name": "COUNT_NULL"})
+        operator = CreateMetricOperator(task_id='create_metrics', connection_id='bigeye', warehouse_id=1,
+                                        configuration=configuration)
+
+        with self.assertLogs(level='ERROR') as logs:
+            with self.assertRaisesRegex(Exception, "Could not find table"):
+                operator.execute(context={})
+
+        self.assertEqual([d["metricIds"] for e, d in self.calls if e == "api/v1/metrics/backfill"], [[1, 2]])
+        self.assertTrue(any("backfill down" in line for line in logs.output))
+
+    def test_backfill_batch_size_must_be_positive(self):
+        for size in (0, -1):
+            with self.assertRaises(ValueError):
+                CreateMetricOperator(task_id='create_metrics', connection_id='bigeye', warehouse_id=1,
+                                     configuration=[], backfill_batch_size=size)
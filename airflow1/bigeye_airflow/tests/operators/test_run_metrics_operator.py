@@ -0,0 +1,51 @@
+import json
+from unittest import TestCase
+from unittest.mock import patch, Mock
+
+from airflow1.bigeye_airflow.operators.run_metrics_operator import RunMetricsOperator
+
+
+def _batch_response(endpoint, headers=None, data=None):
+    metric_ids = json.loads(data)["metricIds"]
+    return Mock(json=Mock(return_value={"metricInfos": [
+        {"metricConfiguration": {"id": i},
+         "status": "METRIC_RUN_STATUS_OK" if i % 2 else "METRIC_RUN_STATUS_UPPERBOUND_CRITICAL"}
+        for i in metric_ids]}))
+
+
+class TestRunMetricsOperator(TestCase):
+
+    @patch.object(RunMetricsOperator, 'get_hook')
+    def test_batch_run_aggregates_failures(self, mock_get_hook):
+        mock_get_hook.return_value.run.side_effect = _batch_response
+        operator = RunMetricsOperator(task_id='run_metrics', connection_id='bigeye', warehouse_id=1,
+                                      schema_name=None, table_name=None, metric_ids=[1, 2, 3, 4, 5],
+                                      batch_size=2, max_concurrency=3)
+
+        with self.assertRaisesRegex(ValueError, "There are 2 failing metrics"):
+            operator.execute(context={})
+
+        sent = sorted(json.loads(c.kwargs['data'])["metricIds"] for c in mock_get_hook.return_value.run.call_args_list)
+        self.assertEqual(sent, [[1, 2], [3, 4], [5]])
+
+    @patch.object(RunMetricsOperator, 'get_hook')
+    def test_run_one_path_unchanged(self, mock_get_hook):
+        mock_get_hook.return_value.run.return_value = Mock(json=Mock(return_value=[{"statusOk": True}]))
+        operator = RunMetricsOperator(task_id='run_metrics', connection_id='bigeye', warehouse_id=1,
+                                      schema_name=None, table_name=None, metric_ids=[7, 8])
+
+        operator.execute(context={})
+
+        endpoints = [c.args[0] for c in mock_get_hook.return_value.run.call_args_list]
+        self.assertEqual(endpoints, ["statistics/runOne/7", "statistics/runOne/8"])
+
+    @patch.object(RunMetricsOperator, 'get_hook')
+    def test_cache_stats_logged(self, mock_get_hook):
+        mock_get_hook.return_value.run.return_value = Mock(json=Mock(return_value=[{"statusOk": True}]))
+        operator = RunMetricsOperator(task_id='run_metrics', connection_id='bigeye', warehouse_id=1,
+                                      schema_name=None, table_name=None, metric_ids=[7])
+
+        with self.assertLogs(level='INFO') as logs:
+            operator.execute(context={})
+
+        self.assertTrue(any('Bigeye connection cache:' in m for m in logs.output))
@@ -18,6 +18,10 @@ setup(
     packages=find_packages(exclude=['tests', 'astro']),
     include_package_data=True,
     install_requires=[requirements],
+    extras_require={
+        'tracing': ['opentelemetry-sdk; python_version >= "3.7"',
+                    'opentelemetry-exporter-otlp-proto-http; python_version >= "3.7"'],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
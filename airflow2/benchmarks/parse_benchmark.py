@@ -0,0 +1,131 @@
+"""
+Measures what the operators cost the scheduler each time it parses a DAG file: importing the operator modules and
+constructing a DAG whose CreateMetricOperator holds a synthetic configuration.  Also measures parsing that
+configuration when the operator executes, first and then from the configuration cache.  Every sample runs in a fresh
+interpreter, as imports are cached for the life of a process.  Run from the airflow2 directory:
+
+    python -m benchmarks.parse_benchmark                       # 10, 1k and 10k configurations
+    python -m benchmarks.parse_benchmark --sizes 10000 --repeat 5
+
+airflow itself is imported before the measurements; the scheduler has already paid for it.
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import List, Optional
+
+DEFAULT_SIZES = [10, 1000, 10000]
+DEFAULT_REPEAT = 3
+OPERATOR_MODULES = ['bigeye_airflow.operators.create_metric_operator',
+                    'bigeye_airflow.operators.run_metrics_operator']
+
+
+@dataclass
+class ParseResult:
+    configurations: int
+    import_ms: float
+    dag_ms: float
+    sdk_imported: bool
+    execute_parse_ms: float
+    cached_parse_ms: float
+
+
+def measure_once(size: int) -> ParseResult:
+    """
+    Measures one sample in this interpreter; only meaningful in a fresh one.
+    :param size: number of metric configurations in the DAG.
+    """
+    import importlib
+
+    import airflow.models.baseoperator  # noqa: F401
+    from airflow import DAG
+
+    from benchmarks.fake_bigeye_server import FakeServerConfiguration, SyntheticCatalog
+
+    configuration = list(SyntheticCatalog(FakeServerConfiguration(metrics=size)).configurations())
+
+    start = time.perf_counter()
+    for m in OPERATOR_MODULES:
+        importlib.import_module(m)
+    import_seconds = time.perf_counter() - start
+
+    from bigeye_airflow.operators.create_metric_operator import CreateMetricOperator
+    start = time.perf_counter()
+    with DAG(dag_id='parse_benchmark', schedule_interval=None, start_date=datetime(2022, 1, 1)):
+        operator = CreateMetricOperator(task_id='create_metrics', connection_id='bigeye', warehouse_id=1,
+                                        configuration=configuration)
+    dag_seconds = time.perf_counter() - start
+    sdk_imported = any(m == 'bigeye_sdk' or m.startswith('bigeye_sdk.') for m in sys.modules)
+
+    from bigeye_airflow.airflow_ext.configuration_cache import configuration_cache
+    start = time.perf_counter()
+    configuration_cache.materialize(operator.configuration)
+    execute_parse_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    configuration_cache.materialize(operator.configuration)
+    cached_parse_seconds = time.perf_counter() - start
+
+    return ParseResult(configurations=size, import_ms=import_seconds * 1000, dag_ms=dag_seconds * 1000,
+                       sdk_imported=sdk_imported, execute_parse_ms=execute_parse_seconds * 1000,
+                       cached_parse_ms=cached_parse_seconds * 1000)
+
+
+def measure(size: int, repeat: int = DEFAULT_REPEAT) -> ParseResult:
+    """
+    :param size: number of metric configurations in the DAG.
+    :param repeat: number of fresh interpreters to sample.
+    :return: the best timings of the samples.
+    """
+    samples = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-W', 'ignore', '-m', 'benchmarks.parse_benchmark',
+                              '--sample', str(size)],
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        samples.append(ParseResult(**json.loads(out.strip().splitlines()[-1])))
+    return ParseResult(configurations=size,
+                       import_ms=min(s.import_ms for s in samples),
+                       dag_ms=min(s.dag_ms for s in samples),
+                       sdk_imported=any(s.sdk_imported for s in samples),
+                       execute_parse_ms=min(s.execute_parse_ms for s in samples),
+                       cached_parse_ms=min(s.cached_parse_ms for s in samples))
+
+
+def _print_table(results: List[ParseResult]):
+    print(f'{"configurations":>14}{"import ms":>11}{"DAG ms":>10}{"SDK at parse":>14}{"execute parse ms":>18}'
+          f'{"cached ms":>11}')
+    for r in results:
+        print(f'{r.configurations:>14}{r.import_ms:>11.1f}{r.dag_ms:>10.1f}{str(r.sdk_imported):>14}'
+              f'{r.execute_parse_ms:>18.1f}{r.cached_parse_ms:>11.1f}')
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the DAG parse time cost of the Bigeye operators.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='configurations per DAG.')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='keep the best timings of this many fresh interpreters.')
+    parser.add_argument('--output', help='also write the results to this JSON file.')
+    parser.add_argument('--sample', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.sample is not None:
+        logging.disable(logging.INFO)
+        print(json.dumps(asdict(measure_once(args.sample))))
+        return 0
+
+    results = [measure(size, args.repeat) for size in args.sizes]
+    _print_table(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump([asdict(r) for r in results], f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,323 @@
+"""
+Measures the operators against the fake Bigeye API in benchmarks.fake_bigeye_server and compares the results with the
+stored baselines.  Run from the airflow2 directory:
+
+    python -m benchmarks.run_benchmarks                        # 10, 1k and 10k metrics, compared with baselines.json
+    python -m benchmarks.run_benchmarks --sizes 10 1000 --latency-ms 20 --throttle-rate 0.05 --no-baseline
+    python -m benchmarks.run_benchmarks --update-baseline      # record this machine's numbers as the baseline
+    python -m benchmarks.run_benchmarks --sizes 1000 --repeat 3  # best of three, for a steadier comparison
+
+Exits with 1 when a scenario's run time, p99 latency or peak memory grows by more than --tolerance.
+Timings depend on the machine, so record baselines on the machine that runs the comparison.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+import requests
+
+from benchmarks.fake_bigeye_server import FakeBigeyeServer, FakeServerConfiguration, SyntheticCatalog
+
+DEFAULT_SIZES = [10, 1000, 10000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+DEFAULT_TOLERANCE = 0.5
+# Differences below these are noise on any machine, whatever the tolerance: scenarios at 10 metrics take milliseconds.
+NOISE_FLOOR_SECONDS = 0.25
+NOISE_FLOOR_MS = 5.0
+NOISE_FLOOR_MB = 1.0
+# The p99 of fewer requests is their maximum.
+MIN_LATENCY_SAMPLES = 100
+
+SCENARIOS = ['create_metrics', 'create_metrics_unchanged', 'run_metrics', 'get_asset_ix']
+
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    metrics: int
+    seconds: float
+    throughput: float
+    requests: int
+    p50_ms: float
+    p99_ms: float
+    peak_memory_mb: Optional[float]
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def key(self) -> str:
+        return f'{self.scenario}/{self.metrics}'
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    :param values: samples.
+    :param p: percentile between 0 and 100.
+    :return: the nearest-rank percentile, or 0 without samples.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(p / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class _RequestTimer:
+    """
+    Times every request sent through a requests.Session, which every synchronous Bigeye call goes through.
+    """
+
+    def __init__(self):
+        self.seconds: List[float] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def installed(self) -> Iterator['_RequestTimer']:
+        send = requests.Session.send
+        timer = self
+
+        def timed_send(session, request, **kwargs):
+            start = time.perf_counter()
+            try:
+                return send(session, request, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with timer._lock:
+                    timer.seconds.append(elapsed)
+
+        requests.Session.send = timed_send
+        try:
+            yield self
+        finally:
+            requests.Session.send = send
+
+
+def measure(scenario: str, metrics: int, fn: Callable[[], None], trace_memory: bool = False) -> ScenarioResult:
+    errors = []
+    timer = _RequestTimer()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with timer.installed():
+            fn()
+    except Exception as e:
+        errors.append(f'{type(e).__name__}: {str(e)[:200]}')
+    finally:
+        seconds = time.perf_counter() - start
+        peak = None
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+
+    return ScenarioResult(scenario=scenario, metrics=metrics, seconds=round(seconds, 3),
+                          throughput=round(metrics / seconds, 1) if seconds else 0.0,
+                          requests=len(timer.seconds),
+                          p50_ms=round(percentile(timer.seconds, 50) * 1000, 2),
+                          p99_ms=round(percentile(timer.seconds, 99) * 1000, 2),
+                          peak_memory_mb=round(peak, 2) if peak is not None else None,
+                          errors=errors)
+
+
+def run_size(conf: FakeServerConfiguration, scenarios: List[str], max_parallelism: int, chunk_size: int,
+             trace_memory: bool = True, repeat: int = 1) -> List[ScenarioResult]:
+    """
+    Runs the scenarios in order against a fake API sized for conf.metrics.  create_metrics_unchanged and run_metrics
+    act on the metrics create_metrics created.  Every pass starts a fresh server.  The timings are the best of repeat
+    untraced passes.  tracemalloc slows Python down several times over, so with trace_memory the peaks come from one
+    more, traced, pass.
+    """
+    results = _run_pass(conf, scenarios, max_parallelism, chunk_size, f'bigeye_benchmark_{conf.metrics}')
+    for i in range(1, repeat):
+        again = _run_pass(conf, scenarios, max_parallelism, chunk_size, f'bigeye_benchmark_{conf.metrics}_{i}')
+        for j, (r, a) in enumerate(zip(results, again)):
+            best = a if a.seconds < r.seconds else r
+            best.p99_ms = min(r.p99_ms, a.p99_ms)
+            best.p50_ms = min(r.p50_ms, a.p50_ms)
+            results[j] = best
+    if trace_memory:
+        traced = _run_pass(conf, scenarios, max_parallelism, chunk_size, f'bigeye_benchmark_{conf.metrics}_traced',
+                           trace_memory=True)
+        for r, t in zip(results, traced):
+            r.peak_memory_mb = t.peak_memory_mb
+            r.errors.extend(e for e in t.errors if e not in r.errors)
+    return results
+
+
+def _run_pass(conf: FakeServerConfiguration, scenarios: List[str], max_parallelism: int, chunk_size: int,
+              connection_id: str, trace_memory: bool = False) -> List[ScenarioResult]:
+    # Imported here so the benchmark's own imports don't count towards the first scenario.
+    from bigeye_airflow.bigeye_requests.catalog_requests import get_asset_ix
+    from bigeye_airflow.models.configurations import CreateMetricConfiguration
+    from bigeye_airflow.operators.create_metric_operator import CreateMetricOperator
+    from bigeye_airflow.operators.run_metrics_operator import RunMetricsOperator
+
+    configuration = list(SyntheticCatalog(conf).configurations())
+    results = []
+    created: List[int] = []
+
+    def create_metrics():
+        operator = CreateMetricOperator(task_id='create_metrics', connection_id=connection_id,
+                                        warehouse_id=conf.warehouse_id, configuration=configuration,
+                                        max_parallelism=max_parallelism)
+        created[:] = [i for i in operator.execute(context={}) if i]
+
+    def run_metrics():
+        if not created:
+            raise RuntimeError('create_metrics created no metrics to run.')
+        operator = RunMetricsOperator(task_id='run_metrics', connection_id=connection_id, metric_ids=created,
+                                      chunk_size=chunk_size, max_parallelism=max_parallelism)
+        operator.execute(context={})
+
+    def asset_ix():
+        conf_objects = [CreateMetricConfiguration(table_name=c['table_name'], schema_name=c['schema_name'],
+                                                  column_name=c['column_name'], metric_name='COUNT_NULL')
+                        for c in configuration]
+        ix = get_asset_ix(connection_id, conf.warehouse_id, conf_objects, max_parallelism=max_parallelism)
+        if ix.errors:
+            raise RuntimeError(f'{len(ix.errors)} schemas failed: {sorted(ix.errors)[:5]}')
+
+    runs = {'create_metrics': create_metrics, 'create_metrics_unchanged': create_metrics,
+            'run_metrics': run_metrics, 'get_asset_ix': asset_ix}
+
+    # Connections, sessions, limiters and breakers are cached per connection id, so every pass gets its own.
+    env_var = f'AIRFLOW_CONN_{connection_id.upper()}'
+    with FakeBigeyeServer(conf) as server:
+        os.environ[env_var] = server.url
+        try:
+            for scenario in scenarios:
+                results.append(measure(scenario, conf.metrics, runs[scenario], trace_memory=trace_memory))
+        finally:
+            os.environ.pop(env_var, None)
+    return results
+
+
+def compare(results: List[ScenarioResult], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """
+    :return: a description of every regression beyond tolerance, relative to the baseline's results, that is also
+    beyond the noise floors.
+    """
+    def worse(value, base, floor):
+        return value > base * (1 + tolerance) and value - base > floor
+
+    regressions = []
+    for r in results:
+        b = baseline.get(r.key)
+        if b is None:
+            continue
+        # Throughput regresses when the same metrics take longer.
+        if worse(r.seconds, b['seconds'], NOISE_FLOOR_SECONDS):
+            regressions.append(f'{r.key}: throughput {r.throughput}/s < baseline {b["throughput"]}/s')
+        if r.requests >= MIN_LATENCY_SAMPLES and worse(r.p99_ms, b['p99_ms'], NOISE_FLOOR_MS):
+            regressions.append(f'{r.key}: p99 {r.p99_ms}ms > baseline {b["p99_ms"]}ms')
+        if r.peak_memory_mb is not None and b.get('peak_memory_mb') is not None \
+                and worse(r.peak_memory_mb, b['peak_memory_mb'], NOISE_FLOOR_MB):
+            regressions.append(f'{r.key}: peak memory {r.peak_memory_mb}MB > baseline {b["peak_memory_mb"]}MB')
+    return regressions
+
+
+def load_baseline(path: str, conf: FakeServerConfiguration) -> Dict[str, dict]:
+    """
+    :return: the stored results by scenario/size, or nothing when they were recorded against a different server
+    configuration.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        stored = json.load(f)
+    if stored.get('server') != _server_fingerprint(conf):
+        logging.warning(f'{path} was recorded with server settings {stored.get("server")}; not comparing.')
+        return {}
+    return stored.get('results', {})
+
+
+def write_baseline(path: str, conf: FakeServerConfiguration, results: List[ScenarioResult]):
+    stored = {'python': platform.python_version(), 'platform': platform.platform(),
+              'server': _server_fingerprint(conf),
+              'results': {r.key: {k: v for k, v in asdict(r).items() if k not in ('scenario', 'metrics', 'errors')}
+                          for r in results}}
+    with open(path, 'w') as f:
+        json.dump(stored, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def _server_fingerprint(conf: FakeServerConfiguration) -> dict:
+    # Everything but the size, which is part of each result's key.
+    return {k: v for k, v in asdict(conf).items() if k != 'metrics'}
+
+
+def _print_table(results: List[ScenarioResult]):
+    print(f'{"scenario":<26}{"metrics":>8}{"seconds":>10}{"metrics/s":>11}{"requests":>10}{"p50 ms":>9}'
+          f'{"p99 ms":>9}{"peak MB":>9}')
+    for r in results:
+        peak = f'{r.peak_memory_mb:9.1f}' if r.peak_memory_mb is not None else f'{"-":>9}'
+        print(f'{r.scenario:<26}{r.metrics:>8}{r.seconds:>10.2f}{r.throughput:>11.1f}{r.requests:>10}'
+              f'{r.p50_ms:>9.2f}{r.p99_ms:>9.2f}{peak}')
+        for e in r.errors:
+            print(f'    error: {e}')
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the Bigeye operators against a fake Bigeye API.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='metric counts to run.')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--max-parallelism', type=int, default=8)
+    parser.add_argument('--chunk-size', type=int, default=500, help='metric ids per batch run request.')
+    parser.add_argument('--latency-ms', type=float, default=2.0)
+    parser.add_argument('--jitter-ms', type=float, default=1.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--padding-tables', type=int, default=0,
+                        help='tables added to every schema that no configuration targets.')
+    parser.add_argument('--repeat', type=int, default=1, help='keep the best timings of this many passes.')
+    parser.add_argument('--no-memory', action='store_true',
+                        help="skip the second, traced pass that measures peak memory.")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--no-baseline', action='store_true', help="don't compare with the baseline.")
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as the baseline.')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed relative regression before failing.')
+    parser.add_argument('--output', help='also write the results to this JSON file.')
+    args = parser.parse_args(argv)
+
+    # The operators and the SDK log every metric; keep the output to the results.
+    logging.disable(logging.INFO)
+
+    results: List[ScenarioResult] = []
+    conf = None
+    for size in args.sizes:
+        conf = FakeServerConfiguration(metrics=size, padding_tables=args.padding_tables, latency_ms=args.latency_ms,
+                                       jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                                       throttle_rate=args.throttle_rate)
+        results.extend(run_size(conf, args.scenarios, args.max_parallelism, args.chunk_size,
+                                trace_memory=not args.no_memory, repeat=args.repeat))
+
+    _print_table(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump([asdict(r) for r in results], f, indent=2)
+
+    if args.update_baseline:
+        write_baseline(args.baseline, conf, results)
+        print(f'Stored the results as the baseline in {args.baseline}.')
+        return 0
+
+    if args.no_baseline:
+        return 0
+    regressions = compare(results, load_baseline(args.baseline, conf), args.tolerance)
+    for r in regressions:
+        print(f'REGRESSION {r}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,26 +1,196 @@
 import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
 
+import requests
+from airflow.exceptions import AirflowException
 from airflow.providers.http.hooks.http import HttpHook
 from bigeye_sdk.client.datawatch_client import DatawatchClient, Method
+from bigeye_sdk.functions.metric_functions import set_default_model_type_for_threshold
+from bigeye_sdk.functions.urlfuncts import encode_url_params
+from bigeye_sdk.generated.com.torodata.models.generated import BatchRunMetricsRequest, BatchRunMetricsResponse, \
+    MetricInfo, Table, MetricConfiguration, MetricBackfillResponse, TableList
+
+from bigeye_airflow.airflow_ext.catalog_cache import CatalogCache, get_catalog_cache
+from bigeye_airflow.airflow_ext.circuit_breaker import CircuitBreaker, get_circuit_breaker
+from bigeye_airflow.airflow_ext.host_semaphore import HostSemaphore, get_host_semaphore
+from bigeye_airflow.airflow_ext.pooled_http_hook import PooledHttpHook, SessionPoolConfiguration
+from bigeye_airflow.airflow_ext.rate_limiter import AdaptiveRateLimiter, THROTTLE_STATUSES, get_rate_limiter, \
+    parse_retry_after
+from bigeye_airflow.airflow_ext.request_stats import RequestStats, endpoint_name, response_size
+from bigeye_airflow.airflow_ext.retry_policy import HttpStatusError, RetryPolicy, get_class_retry_policy, \
+    get_retry_policy
+from bigeye_airflow.airflow_ext.single_flight import SingleFlight, get_single_flight
+from bigeye_airflow.airflow_ext.tracing import propagate, set_attributes, span
+from bigeye_airflow.functions.batch_functions import chunk_list
+from bigeye_airflow.functions.metric_functions import MetricIndex, get_metric_configuration_identity, \
+    get_metric_fingerprint, metric_identity
 
 headers = {"Content-Type": "application/json", "Accept": "application/json"}
 
 
 class AirflowDatawatchClient(DatawatchClient):
-    def __init__(self, connection_id: str):
+    def __init__(self, connection_id: str, pool_conf: Optional[SessionPoolConfiguration] = None,
+                 catalog_cache: Optional[CatalogCache] = None,
+                 rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                 throttle_retries: int = 5,
+                 host_semaphore: Optional[HostSemaphore] = None,
+                 retry_policies: Optional[Dict[str, RetryPolicy]] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 single_flight: Optional[SingleFlight] = None,
+                 request_stats: Optional[RequestStats] = None):
+        """
+        param connection_id: string referencing a defined connection in the Airflow deployment.
+        param pool_conf: pool size, keep-alive and timeout settings for the connection's pooled session.
+        param catalog_cache: on-disk cache for schema table listings.  Defaults to the cache configured under
+        [bigeye] catalog_cache_dir, if any.
+        param rate_limiter: adaptive limit on in-flight requests.  Defaults to the limiter this process shares for
+        the connection.
+        param throttle_retries: number of times a request the API throttled with a 429 or 503 is retried.
+        param host_semaphore: cap on the connection's in-flight requests across every process on the host.  Defaults
+        to the one configured by [bigeye] host_max_concurrency, if any.
+        param retry_policies: { <endpoint class>: RetryPolicy } for idempotent requests that fail transiently,
+        overriding DEFAULT_RETRY_POLICIES.  Endpoint classes are catalog, metric, metric_run and default.
+        param circuit_breaker: fails requests fast once the API is down.  Defaults to the breaker this process
+        shares for the connection.
+        param single_flight: collapses identical GETs in flight at once into one request.  Defaults to the group this
+        process shares for the connection, so concurrent operators share requests too.
+        param request_stats: emits per-endpoint timings, status, byte and retry counts through Airflow's Stats and
+        keeps the slowest requests for a summary.
+        """
         self.conn_id = connection_id
-        pass
+        self.pool_conf = pool_conf or SessionPoolConfiguration()
+        self.catalog_cache = catalog_cache if catalog_cache is not None else get_catalog_cache()
+        self.rate_limiter = rate_limiter or get_rate_limiter(connection_id)
+        self.throttle_retries = throttle_retries
+        self.host_semaphore = host_semaphore if host_semaphore is not None else get_host_semaphore(connection_id)
+        self.retry_policies = retry_policies
+        self.circuit_breaker = circuit_breaker or get_circuit_breaker(connection_id)
+        self.single_flight = single_flight or get_single_flight(connection_id)
+        self.request_stats = request_stats or RequestStats(connection_id)
+        self._hooks: Dict[str, HttpHook] = {}
+        self._metric_ix: Dict[int, MetricIndex] = {}
+        self._metric_fingerprints: Dict[int, str] = {}
+        self._metric_ix_lock = threading.Lock()
+        self.upsert_counts = Counter(created=0, updated=0, unchanged=0)
+        self._pending_backfill: Optional[List[int]] = None
 
     def _get_hook(self, method) -> HttpHook:
-        return HttpHook(http_conn_id=self.conn_id, method=method)
+        if method not in self._hooks:
+            self._hooks.setdefault(method, PooledHttpHook(http_conn_id=self.conn_id, method=method,
+                                                          pool_conf=self.pool_conf))
+        return self._hooks[method]
 
-    def _call_datawatch_impl(self, method: Method, url, body: str = None):
+    def _send(self, method: Method, url, body: str = None, extra_headers: Optional[dict] = None,
+              read_timeout: Optional[float] = None) -> requests.Response:
+        """
+        Sends a request under the circuit breaker, the rate limiter and, when configured, the host semaphore.
+        Requests the API throttles are retried once the limiter allows, after any Retry-After.  Idempotent requests,
+        metric updates included, that fail with a transient status or a connection error are retried as the retry
+        policy of their endpoint class allows; metric creates are retried by upsert_metric.  Other error statuses
+        raise HttpStatusError, an AirflowException like HttpHook.check_response's.  A read_timeout overrides the
+        pool's; running out of it raises ReadTimeout but doesn't count against the circuit breaker, as the caller
+        chose not to wait.
+        """
         bigeye_request_hook = self._get_hook(method.name)
+        request_headers = {**headers, **extra_headers} if extra_headers else headers
+        extra_options = {'check_response': False}
+        if read_timeout is not None:
+            extra_options['timeout'] = (self.pool_conf.connect_timeout, read_timeout)
+        policy = get_retry_policy(method, url, self.retry_policies, body)
+        throttle_attempt = 0
+        retry_attempt = 0
+        response = None
+        start = time.monotonic()
+        with span(f'bigeye.http {method.name}', http_method=method.name, url=url, endpoint=endpoint_name(url),
+                  bytes_out=len(body) if body else 0) as s:
+            try:
+                while True:
+                    self.circuit_breaker.before_call()
+                    token = self.rate_limiter.acquire()
+                    response = None
+                    error = None
+                    throttled = False
+                    retry_after = None
+                    try:
+                        with self.host_semaphore.slot() if self.host_semaphore else nullcontext():
+                            response = bigeye_request_hook.run(
+                                endpoint=url,
+                                headers=request_headers,
+                                data=body,
+                                extra_options=extra_options)
+                        throttled = response.status_code in THROTTLE_STATUSES
+                        if throttled:
+                            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                            if retry_after is None:
+                                # Without a Retry-After, back off exponentially.
+                                retry_after = min(2.0 ** throttle_attempt, 30.0)
+                    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                        error = e
+                    except BaseException:
+                        # Any other error still settles the breaker, or a failed probe would leave it half open.
+                        self.circuit_breaker.record_failure()
+                        raise
+                    finally:
+                        self.rate_limiter.release(token, throttled=throttled, retry_after=retry_after)
+
+                    # A throttled request shows the API is up; only errors and 5xx count against it.
+                    failed = (error is not None and not (read_timeout is not None
+                                                         and isinstance(error, requests.exceptions.ReadTimeout))) \
+                        or (error is None and not throttled and response.status_code >= 500)
+                    if failed:
+                        self.circuit_breaker.record_failure()
+                    else:
+                        self.circuit_breaker.record_success()
+
+                    if throttled and throttle_attempt < self.throttle_retries:
+                        throttle_attempt += 1
+                        logging.info(f'{response.status_code} from {method.name} {url}.  Retrying, attempt '
+                                     f'{throttle_attempt} of {self.throttle_retries}.')
+                        continue
+
+                    if policy is not None and retry_attempt < policy.max_retries \
+                            and (error is not None or response.status_code in policy.statuses):
+                        delay = policy.delay(retry_attempt)
+                        retry_attempt += 1
+                        logging.warning(f'{error or response.status_code} from {method.name} {url}.  Retrying in '
+                                        f'{delay:.1f}s, attempt {retry_attempt} of {policy.max_retries}.')
+                        time.sleep(delay)
+                        continue
+
+                    if error is not None:
+                        raise error
+                    break
+            finally:
+                status_code = response.status_code if response is not None else None
+                bytes_in = response_size(response)
+                retries = throttle_attempt + retry_attempt
+                self.request_stats.record(method.name, url, status_code, time.monotonic() - start,
+                                          bytes_out=len(body) if body else 0, bytes_in=bytes_in, retries=retries)
+                set_attributes(s, status_code=status_code, bytes_in=bytes_in, retries=retries)
+
+        try:
+            bigeye_request_hook.check_response(response)
+        except AirflowException as e:
+            raise HttpStatusError(response.status_code, str(e)) from e
+        return response
+
+    def _call_datawatch_impl(self, method: Method, url, body: str = None):
+        """
+        Identical GETs in flight at the same time share one request and one parsed response.  Callers must not mutate
+        the returned JSON; the SDK only reads it into new models.
+        """
+        if method == Method.GET:
+            return self.single_flight.do((method.name, url), lambda: self._call_datawatch_once(method, url, body))
+        return self._call_datawatch_once(method, url, body)
+
+    def _call_datawatch_once(self, method: Method, url, body: str = None):
         try:
-            response = bigeye_request_hook.run(
-                endpoint=url,
-                headers=headers,
-                data=body)
+            response = self._send(method, url, body)
 
         except Exception as e:
             logging.error(f'Exception calling airflow datawatch: {str(e)}')
@@ -32,3 +202,245 @@ class AirflowDatawatchClient(DatawatchClient):
     def _call_datawatch(self, method: Method, url, body: str = None):
         url = url.replace('//', '/')
         return self._call_datawatch_impl(method=method, url=url, body=body)
+
+    def get_tables(self,
+                   *,
+                   warehouse_id: List[int] = [],
+                   schema: List[str] = [],
+                   table_name: List[str] = [],
+                   ids: List[int] = [],
+                   schema_id: List[int] = []) -> TableList:
+        """
+        With a catalog cache, a lookup in one warehouse and schema reads the schema's full table listing through the
+        cache and filters it by table_name locally.  Other lookups go straight to the API.
+        """
+        with span('bigeye.table_resolution', warehouse_id=warehouse_id or None, schema=schema or None,
+                  table=table_name or None) as s:
+            if self.catalog_cache is None or len(warehouse_id) != 1 or len(schema) != 1 or ids or schema_id:
+                tables = super(AirflowDatawatchClient, self).get_tables(warehouse_id=warehouse_id, schema=schema,
+                                                                        table_name=table_name, ids=ids,
+                                                                        schema_id=schema_id)
+            else:
+                params = encode_url_params(dict(warehouse_id=warehouse_id, schema=schema), remove_keys=[])
+                url = f"/api/v1/tables?{params}"
+                key = CatalogCache.key(self.conn_id, warehouse_id[0], schema[0])
+                tables = TableList().from_dict(self.single_flight.do(
+                    ('catalog', key),
+                    lambda: self.catalog_cache.fetch_json(
+                        key, lambda conditional_headers: self._send(Method.GET, url,
+                                                                    extra_headers=conditional_headers))))
+                if table_name:
+                    names = {n.lower() for n in table_name}
+                    tables.tables = [t for t in tables.tables if t.name.lower() in names]
+            set_attributes(s, table_count=len(tables.tables))
+            return tables
+
+    def _get_metric_index(self, warehouse_id: int, table_id: int) -> MetricIndex:
+        with self._metric_ix_lock:
+            ix = self._metric_ix.get(table_id)
+        if ix is None:
+            with span('bigeye.metric_search', warehouse_id=warehouse_id, table_id=table_id) as s:
+                metrics = self.search_metric_configuration(warehouse_ids=[warehouse_id], table_ids=[table_id])
+                set_attributes(s, metric_count=len(metrics))
+            with self._metric_ix_lock:
+                if table_id not in self._metric_ix:
+                    self._metric_fingerprints.update((m.id, get_metric_fingerprint(m)) for m in metrics)
+                ix = self._metric_ix.setdefault(table_id, MetricIndex(metrics, get_metric_configuration_identity))
+        return ix
+
+    def get_existing_metric(self,
+                            warehouse_id: int, table: Table, column_name: str, user_defined_name: str,
+                            metric_name: str, group_by: List[str], filters: List[str]):
+        """
+        Get an existing metric by name, column, group_by and filters.  A table's metrics are downloaded once per
+        client and matched through a hash index rather than searched and scanned for every configuration.
+        """
+        return self._get_metric_index(warehouse_id, table.id).get(
+            metric_identity(metric_name, user_defined_name, column_name, group_by, filters))
+
+    def upsert_metric(self, **kwargs) -> MetricConfiguration:
+        """
+        Create or update metric.  An update is skipped, and the desired configuration returned, when it would not
+        change the existing metric.  Outcomes are counted in upsert_counts.  Updates are retried by _send; a create
+        that fails transiently is retried by _create_metric once the table shows it didn't take effect.
+        """
+        metric_configuration: MetricConfiguration = kwargs.get('metric_configuration')
+        metric_id = metric_configuration.id if metric_configuration is not None else kwargs.get('id')
+
+        with span('bigeye.upsert_metric', metric_id=metric_id,
+                  table_id=metric_configuration.dataset_id if metric_configuration is not None else None) as s:
+            if metric_configuration is not None and metric_id:
+                set_default_model_type_for_threshold(metric_configuration.thresholds)
+                with self._metric_ix_lock:
+                    existing_fingerprint = self._metric_fingerprints.get(metric_id)
+                if existing_fingerprint == get_metric_fingerprint(metric_configuration):
+                    logging.info(f'Metric {metric_id} is unchanged.  Skipping upsert.')
+                    with self._metric_ix_lock:
+                        self.upsert_counts['unchanged'] += 1
+                    set_attributes(s, outcome='unchanged')
+                    return metric_configuration
+
+            if metric_id or metric_configuration is None:
+                result = super(AirflowDatawatchClient, self).upsert_metric(**kwargs)
+            else:
+                result = self._create_metric(metric_configuration)
+            set_attributes(s, outcome='updated' if metric_id else 'created')
+
+        # Keep the index current so later configurations in the same run match the upserted metric.
+        with self._metric_ix_lock:
+            self.upsert_counts['updated' if metric_id else 'created'] += 1
+            self._metric_fingerprints[result.id] = get_metric_fingerprint(result)
+            ix = self._metric_ix.get(result.dataset_id)
+        if ix is not None:
+            ix.put(result)
+        return result
+
+    def _create_metric(self, metric_configuration: MetricConfiguration) -> MetricConfiguration:
+        """
+        Creates a metric, retrying connection errors and transient statuses as the metric retry policy allows.  A
+        create that failed may still have created the metric, so before each retry the table's metrics are searched
+        for one with the same identity, which is returned rather than created twice.
+        """
+        policy = get_class_retry_policy('metric', self.retry_policies)
+        identity = get_metric_configuration_identity(metric_configuration)
+        attempt = 0
+        while True:
+            try:
+                return super(AirflowDatawatchClient, self).upsert_metric(metric_configuration=metric_configuration)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, HttpStatusError) as e:
+                transient = not isinstance(e, HttpStatusError) or e.status_code in policy.statuses
+                if not transient or attempt >= policy.max_retries:
+                    raise
+                delay = policy.delay(attempt)
+                attempt += 1
+                logging.warning(f'Creating a metric failed with {e}.  Retrying in {delay:.1f}s, unless it was '
+                                f'created, attempt {attempt} of {policy.max_retries}.')
+
+            time.sleep(delay)
+            metrics = self.search_metric_configuration(warehouse_ids=[metric_configuration.warehouse_id],
+                                                       table_ids=[metric_configuration.dataset_id])
+            created = MetricIndex(metrics, get_metric_configuration_identity).get(identity)
+            if created is not None:
+                logging.info(f'Metric {created.id} was created by the failed request.')
+                return created
+
+    def backfill_metric(self, **kwargs) -> Optional[MetricBackfillResponse]:
+        """
+        Runs metrics for past data.  Inside coalesced_backfills the metric ids are held back, and None returned, until
+        the block exits.
+        """
+        with self._metric_ix_lock:
+            if self._pending_backfill is not None and kwargs.get('backfill_range') is None:
+                self._pending_backfill.extend(kwargs.get('metric_ids', []))
+                return None
+        return super(AirflowDatawatchClient, self).backfill_metric(**kwargs)
+
+    @contextmanager
+    def coalesced_backfills(self, batch_size: int = 100):
+        """
+        Collects the metric ids passed to backfill_metric in the block and backfills them, once each, in requests of
+        at most batch_size ids when the block exits.  When the block raised, the backfills are still sent but their
+        failure is only logged, so the block's exception is the one raised.
+        :param batch_size: maximum metric ids per backfill request.
+        """
+        with self._metric_ix_lock:
+            self._pending_backfill = []
+        try:
+            yield
+        except BaseException:
+            try:
+                self._flush_backfills(batch_size)
+            except Exception as e:
+                logging.error(f'Exception backfilling metrics: {str(e)}')
+            raise
+        self._flush_backfills(batch_size)
+
+    def _flush_backfills(self, batch_size: int):
+        with self._metric_ix_lock:
+            metric_ids = list(dict.fromkeys(self._pending_backfill))
+            self._pending_backfill = None
+        with span('bigeye.backfill', metric_count=len(metric_ids)):
+            for chunk in chunk_list(metric_ids, batch_size):
+                logging.info(f'Backfilling {len(chunk)} metrics.')
+                super(AirflowDatawatchClient, self).backfill_metric(metric_ids=chunk)
+
+    def submit_metric_batch(self,
+                            *,
+                            metric_ids: List[int],
+                            chunk_size: Optional[int] = None,
+                            max_parallelism: int = 1,
+                            submit_timeout: float = 10.0) -> float:
+        """
+        Starts a run of metric_ids without waiting for its results, which are read afterwards with
+        get_metric_info_batch.  The API only has a blocking run endpoint, so each chunk's run request is sent with a
+        read timeout of submit_timeout and the run left to complete server side.  Requests that fail otherwise raise.
+        :param metric_ids: list of metric ids to run.
+        :param chunk_size: maximum metric ids per run request.  One request for all ids if None.
+        :param max_parallelism: maximum number of run requests in flight at once.
+        :param submit_timeout: seconds to wait on each run request before leaving it to the server.
+        :return: epoch seconds just before the runs were submitted.  Metric runs at or after it belong to them.
+        """
+        submitted_at = time.time()
+
+        def submit(chunk: List[int]):
+            body = BatchRunMetricsRequest(metric_ids=chunk).to_json()
+            try:
+                self._send(Method.POST, '/api/v1/metrics/run/batch', body, read_timeout=submit_timeout)
+            except requests.exceptions.ReadTimeout:
+                logging.info(f'Submitted a run of {len(chunk)} metrics.')
+
+        chunks = chunk_list(metric_ids, chunk_size)
+        with span('bigeye.batch_submit', metric_count=len(metric_ids), chunk_size=chunk_size):
+            with ThreadPoolExecutor(max_workers=max(1, min(max_parallelism, len(chunks)))) as executor:
+                for f in [executor.submit(propagate(submit), c) for c in chunks]:
+                    f.result()
+        return submitted_at
+
+    def run_metric_batch_chunked(self,
+                                 *,
+                                 metric_ids: List[int],
+                                 chunk_size: Optional[int] = None,
+                                 max_parallelism: int = 1,
+                                 retries: int = 1,
+                                 retry_policy: Optional[RetryPolicy] = None) -> BatchRunMetricsResponse:
+        """
+        Splits metric_ids into chunks, runs each chunk with run_metric_batch on a bounded thread pool and merges the
+        MetricInfos, in chunk order, into a single response.  Only chunks whose request failed are retried, after a
+        backoff.
+        :param metric_ids: list of metric ids to run.
+        :param chunk_size: maximum metric ids per run_metric_batch request.  One request for all ids if None.
+        :param max_parallelism: maximum number of chunks in flight at once.
+        :param retries: number of times to retry the chunks that failed.
+        :param retry_policy: spaces the retries.  Defaults to the client's metric_run policy.
+        :return: BatchRunMetricsResponse with the metric infos of every chunk.
+        """
+        retry_policy = retry_policy or get_class_retry_policy('metric_run', self.retry_policies)
+        chunks = chunk_list(metric_ids, chunk_size)
+        results: Dict[int, List[MetricInfo]] = {}
+        pending = list(range(len(chunks)))
+
+        for attempt in range(retries + 1):
+            errors: Dict[int, Exception] = {}
+            with ThreadPoolExecutor(max_workers=max(1, min(max_parallelism, len(pending)))) as executor:
+                futures = {executor.submit(propagate(self.run_metric_batch), metric_ids=chunks[i]): i for i in pending}
+                for f in as_completed(futures):
+                    i = futures[f]
+                    try:
+                        results[i] = f.result().metric_infos
+                    except Exception as e:
+                        errors[i] = e
+
+            pending = sorted(errors)
+            if not pending:
+                break
+            if attempt < retries:
+                delay = retry_policy.delay(attempt)
+                logging.warning(f'{len(pending)} of {len(chunks)} metric run chunks failed on attempt {attempt + 1}.  '
+                                f'Retrying in {delay:.1f}s.')
+                time.sleep(delay)
+
+        if pending:
+            raise AirflowException(f'{len(pending)} of {len(chunks)} metric run chunks failed after {retries} '
+                                   f'retries.  Last error: {errors[pending[-1]]}')
+
+        return BatchRunMetricsResponse(metric_infos=[mi for i in range(len(chunks)) for mi in results[i]])
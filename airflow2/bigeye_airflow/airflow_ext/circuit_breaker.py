@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+from typing import Dict
+
+from airflow.configuration import conf
+from airflow.exceptions import AirflowException
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(AirflowException):
+    """Raised instead of sending a request while the API is considered down."""
+
+
+class CircuitBreaker:
+    """
+    Stops requests to an API that is clearly down.  After failure_threshold consecutive failures the breaker opens and
+    every request fails immediately with CircuitOpenError.  Once reset_timeout seconds pass a single probe request is
+    let through: its success closes the breaker, its failure opens it for another reset_timeout.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, name: str = 'bigeye'):
+        """
+        :param failure_threshold: consecutive failed requests that open the breaker.
+        :param reset_timeout: seconds the breaker stays open before probing the API.
+        :param name: what the breaker guards, for logs and errors.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Raises CircuitOpenError unless a request may be sent now.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            remaining = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            raise CircuitOpenError(f'{self.name} API is unavailable after {self._failures} consecutive failures.  '
+                                   f'Not sending requests for another {remaining:.0f}s.')
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logging.info(f'{self.name} API is responding again.  Closing the circuit breaker.')
+            self.state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self._failures >= self.failure_threshold):
+                logging.error(f'{self.name} API failed {self._failures} consecutive requests.  Opening the circuit '
+                              f'breaker for {self.reset_timeout:.0f}s.')
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(connection_id: str) -> CircuitBreaker:
+    """
+    :return: the process wide breaker for a connection, set by [bigeye] circuit_breaker_failure_threshold and
+    circuit_breaker_reset_seconds.
+    """
+    with _breakers_lock:
+        if connection_id not in _breakers:
+            _breakers[connection_id] = CircuitBreaker(
+                failure_threshold=conf.getint('bigeye', 'circuit_breaker_failure_threshold', fallback=5),
+                reset_timeout=conf.getfloat('bigeye', 'circuit_breaker_reset_seconds', fallback=30.0),
+                name=connection_id)
+        return _breakers[connection_id]
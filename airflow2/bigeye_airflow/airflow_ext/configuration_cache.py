@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from airflow.configuration import conf
+from airflow.exceptions import AirflowException
+
+if TYPE_CHECKING:
+    from bigeye_sdk.model.configuration_templates import SimpleUpsertMetricRequest
+
+DEFAULT_MAX_SIZE = 100000
+
+
+@dataclass(frozen=True)
+class ConfigurationCacheStats:
+    hits: int
+    misses: int
+    size: int
+
+
+def configuration_key(configuration: dict) -> str:
+    """
+    :param configuration: a metric configuration dict.
+    :return: hash of the configuration, the same for equal dicts whatever the order of their keys.
+    """
+    return hashlib.sha256(json.dumps(configuration, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _describe(configuration) -> str:
+    if not isinstance(configuration, dict):
+        return type(configuration).__name__
+    return '.'.join(str(configuration.get(k, '?')) for k in ('schema_name', 'table_name', 'column_name'))
+
+
+class ConfigurationCache:
+    """
+    Process level cache of metric configurations parsed into SimpleUpsertMetricRequest objects, keyed by a hash of
+    the configuration dict.  Operators keep their configuration as dicts and parse it here when they execute, so
+    parsing a DAG file neither imports the Bigeye SDK models nor validates every configuration.  Invalid
+    configurations are cached too, as their error.  The least recently used entries are evicted past max_size.
+    The parsed requests are shared and must not be modified.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[str, Tuple[Optional[SimpleUpsertMetricRequest], Optional[str]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def _parse(self, configuration) -> Tuple[Optional['SimpleUpsertMetricRequest'], Optional[str]]:
+        if not isinstance(configuration, dict):
+            return None, f'expected a dict, got {type(configuration).__name__}'
+
+        key = configuration_key(configuration)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry
+            self._misses += 1
+
+        from bigeye_sdk.model.configuration_templates import SimpleUpsertMetricRequest
+        try:
+            entry = SimpleUpsertMetricRequest.from_dict(configuration), None
+        except Exception as e:
+            entry = None, f'{type(e).__name__}: {str(e)}'
+
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def materialize(self, configuration: List[dict]) -> List['SimpleUpsertMetricRequest']:
+        """
+        :param configuration: list of metric configuration dicts that conform to SimpleUpsertMetricRequest.
+        :return: the parsed requests, in the order of the configuration.
+        :raises AirflowException: listing every invalid configuration.
+        """
+        sumrs = []
+        errors = []
+        for i, c in enumerate(configuration):
+            sumr, error = self._parse(c)
+            if error is not None:
+                errors.append(f'{i} {_describe(c)}: {error}')
+            sumrs.append(sumr)
+
+        if errors:
+            failures = '\n'.join(errors)
+            raise AirflowException(f'{len(errors)} of {len(configuration)} metric configurations are invalid.\n'
+                                   f'{failures}')
+        return sumrs
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> ConfigurationCacheStats:
+        with self._lock:
+            return ConfigurationCacheStats(hits=self._hits, misses=self._misses, size=len(self._entries))
+
+    def log_stats(self):
+        s = self.stats()
+        logging.info(f'Bigeye configuration cache: {s.hits} hits, {s.misses} misses, {s.size} cached '
+                     f'configurations.')
+
+
+configuration_cache = ConfigurationCache(
+    max_size=conf.getint('bigeye', 'configuration_cache_size', fallback=DEFAULT_MAX_SIZE))
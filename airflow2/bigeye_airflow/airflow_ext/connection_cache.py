@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from airflow.configuration import conf
+from airflow.models import Connection
+
+DEFAULT_TTL_SECONDS = 300.0
+
+
+@dataclass(frozen=True)
+class ConnectionCacheStats:
+    hits: int
+    misses: int
+    size: int
+
+
+class ConnectionCache:
+    """
+    Process level cache of Airflow connections keyed by connection id.  Entries expire after ttl_seconds so rotated
+    credentials are picked up without a restart; invalidate forces an early refresh.
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[Connection, float]] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, conn_id: str, loader: Callable[[str], Connection]) -> Connection:
+        """
+        Returns the cached connection for conn_id, calling loader to fetch it from the metadata DB or secrets backend
+        when it is missing or expired.
+        :param conn_id: name of the Airflow connection.
+        :param loader: callable that looks up a connection by id.
+        :return: the Airflow connection.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(conn_id)
+            if entry is not None and entry[1] > now:
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+
+        connection = loader(conn_id)
+        with self._lock:
+            self._entries[conn_id] = (connection, time.monotonic() + self.ttl_seconds)
+        return connection
+
+    def invalidate(self, conn_id: Optional[str] = None):
+        """
+        Drops a cached connection so the next lookup reloads it.
+        :param conn_id: connection to drop.  Drops every entry if None.
+        """
+        with self._lock:
+            if conn_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(conn_id, None)
+
+    def stats(self) -> ConnectionCacheStats:
+        with self._lock:
+            return ConnectionCacheStats(hits=self._hits, misses=self._misses, size=len(self._entries))
+
+    def log_stats(self):
+        s = self.stats()
+        logging.info(f'Bigeye connection cache: {s.hits} hits, {s.misses} misses, {s.size} cached connections.')
+
+
+connection_cache = ConnectionCache(
+    ttl_seconds=conf.getfloat('bigeye', 'connection_cache_ttl_seconds', fallback=DEFAULT_TTL_SECONDS))
@@ -0,0 +1,103 @@
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from airflow.configuration import conf
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class HostSemaphore:
+    """
+    Counting semaphore shared by every process on a host, built from slots lock files flocked in a directory.  A
+    request holds one slot while it is in flight, so the processes of a worker together never run more than slots
+    requests for a connection.  The kernel drops a process's locks when it exits, so a killed task can't leak a slot.
+    """
+
+    def __init__(self, name: str, slots: int, directory: Optional[str] = None, poll_interval: float = 0.05):
+        """
+        :param name: what the semaphore guards, e.g. a connection id.  Part of the lock file names.
+        :param slots: maximum number of holders on the host.
+        :param directory: directory for the lock files.  Defaults to a bigeye_airflow directory under the system
+        temp directory.
+        :param poll_interval: initial seconds between attempts while every slot is held.
+        """
+        self.name = name
+        self.slots = slots
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'bigeye_airflow')
+        self.poll_interval = poll_interval
+        os.makedirs(self.directory, exist_ok=True)
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', name)
+        self._paths = [os.path.join(self.directory, f'{safe_name}.{i}.lock') for i in range(slots)]
+
+    def _try_lock(self, path: str) -> Optional[int]:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            os.close(fd)
+            return None
+
+    def acquire(self, timeout: Optional[float] = None) -> int:
+        """
+        Blocks until a slot is free.
+        :param timeout: seconds to wait before raising TimeoutError.  Waits indefinitely if None.
+        :return: handle to pass to release.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        wait = self.poll_interval
+        while True:
+            # Start at a random slot so waiters don't all contend for the first file.
+            start = random.randrange(self.slots)
+            for i in range(self.slots):
+                fd = self._try_lock(self._paths[(start + i) % self.slots])
+                if fd is not None:
+                    return fd
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f'No free host slot for {self.name} after {timeout}s.')
+            time.sleep(wait)
+            wait = min(wait * 2, 1.0)
+
+    def release(self, handle: int):
+        fcntl.flock(handle, fcntl.LOCK_UN)
+        os.close(handle)
+
+    @contextmanager
+    def slot(self):
+        handle = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(handle)
+
+
+_semaphores: Dict[str, HostSemaphore] = {}
+_semaphores_lock = threading.Lock()
+
+
+def get_host_semaphore(connection_id: str) -> Optional[HostSemaphore]:
+    """
+    :return: the host semaphore for a connection, sized by [bigeye] host_max_concurrency with lock files in
+    [bigeye] host_semaphore_dir, or None when host_max_concurrency is unset or file locks are unavailable.
+    """
+    slots = conf.getint('bigeye', 'host_max_concurrency', fallback=0)
+    if slots <= 0:
+        return None
+    if fcntl is None:
+        logging.warning('host_max_concurrency is set but file locks are not supported on this platform.  Ignoring.')
+        return None
+    with _semaphores_lock:
+        if connection_id not in _semaphores:
+            _semaphores[connection_id] = HostSemaphore(
+                connection_id, slots, directory=conf.get('bigeye', 'host_semaphore_dir', fallback=None))
+        return _semaphores[connection_id]
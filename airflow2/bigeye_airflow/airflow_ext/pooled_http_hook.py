@@ -0,0 +1,181 @@
+import socket
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import requests
+from airflow.models import Connection
+from airflow.providers.http.hooks.http import HttpHook
+from requests.adapters import HTTPAdapter
+from requests.auth import AuthBase
+from urllib3.connection import HTTPConnection
+
+from bigeye_airflow.airflow_ext.connection_cache import connection_cache
+
+
+@dataclass(frozen=True)
+class SessionPoolConfiguration:
+    """
+    Sizing and timeout settings for the pooled session shared by every hook on a connection id.
+    :param pool_connections: number of per-host connection pools to cache.
+    :param pool_maxsize: maximum number of connections kept alive per host.
+    :param keep_alive: enables TCP keep-alive probes on pooled sockets.
+    :param keep_alive_idle: seconds a socket may be idle before the first keep-alive probe.
+    :param keep_alive_interval: seconds between keep-alive probes.
+    :param keep_alive_count: failed probes before the socket is considered dead.
+    :param connect_timeout: seconds to wait for a connection to be established.
+    :param read_timeout: seconds to wait for the server to send a response.
+    """
+    pool_connections: int = 4
+    pool_maxsize: int = 16
+    keep_alive: bool = True
+    keep_alive_idle: int = 120
+    keep_alive_interval: int = 30
+    keep_alive_count: int = 20
+    connect_timeout: float = 10.0
+    read_timeout: float = 300.0
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        return self.connect_timeout, self.read_timeout
+
+
+class _PooledAdapter(HTTPAdapter):
+    """HTTPAdapter that sizes its pool from a SessionPoolConfiguration and applies TCP keep-alive options."""
+
+    def __init__(self, pool_conf: SessionPoolConfiguration):
+        self._socket_options = list(HTTPConnection.default_socket_options)
+        if pool_conf.keep_alive:
+            self._socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                self._socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, pool_conf.keep_alive_idle))
+            if hasattr(socket, 'TCP_KEEPINTVL'):
+                self._socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL,
+                                             pool_conf.keep_alive_interval))
+            if hasattr(socket, 'TCP_KEEPCNT'):
+                self._socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPCNT, pool_conf.keep_alive_count))
+        super().__init__(pool_connections=pool_conf.pool_connections,
+                         pool_maxsize=pool_conf.pool_maxsize,
+                         max_retries=0)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = self._socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+
+@dataclass(frozen=True)
+class _PooledSession:
+    session: requests.Session
+    base_url: str
+    # Auth and headers of the connection, sent on each request so a reload never touches the shared session.
+    auth: Optional[AuthBase]
+    headers: Dict[str, str]
+    # Connection the entry was built from.
+    conn: Connection
+
+
+# { (<connection_id>, <pool_conf>): _PooledSession }
+_sessions: Dict[Tuple[str, SessionPoolConfiguration], _PooledSession] = {}
+# Guards _sessions and _session_locks.  Held only to read or swap entries, never while building one.
+_sessions_lock = threading.Lock()
+# { (<connection_id>, <pool_conf>): lock held while the entry is built or refreshed }
+_session_locks: Dict[Tuple[str, SessionPoolConfiguration], threading.Lock] = {}
+
+
+def close_pooled_sessions(connection_id: Optional[str] = None):
+    """
+    Closes pooled sessions and drops them from the registry so the next request opens a fresh one.
+    :param connection_id: only close sessions for this connection id.  Closes every session if None.
+    """
+    with _sessions_lock:
+        for key in [k for k in _sessions if connection_id is None or k[0] == connection_id]:
+            _sessions.pop(key).session.close()
+
+
+class PooledHttpHook(HttpHook):
+    """
+    HttpHook that reuses one long-lived, keep-alive requests.Session per connection id for the life of the process
+    instead of opening a new session, TCP connection and TLS handshake for every request.  The session is shared by
+    concurrent requests and never modified once built: the connection's auth and headers, like per request headers,
+    are sent on each request.  Connection lookups go through the process level connection_cache; when a cached
+    connection expires and is reloaded the pooled session picks up the new host and credentials but keeps its open
+    sockets.  Sessions are built and refreshed under a lock per connection id, so a slow lookup of one connection
+    doesn't hold up the others.
+    """
+
+    def __init__(self,
+                 method: str = 'POST',
+                 http_conn_id: str = HttpHook.default_conn_name,
+                 pool_conf: Optional[SessionPoolConfiguration] = None,
+                 **kwargs):
+        super(PooledHttpHook, self).__init__(method=method, http_conn_id=http_conn_id, **kwargs)
+        self.pool_conf = pool_conf or SessionPoolConfiguration()
+
+    @classmethod
+    def get_connection(cls, conn_id: str) -> Connection:
+        return connection_cache.get(conn_id, super(PooledHttpHook, cls).get_connection)
+
+    def _get_pooled(self) -> _PooledSession:
+        key = (self.http_conn_id, self.pool_conf)
+        conn = self.get_connection(self.http_conn_id)
+        pooled = _sessions.get(key)
+        if pooled is None or pooled.conn is not conn:
+            with _sessions_lock:
+                lock = _session_locks.setdefault(key, threading.Lock())
+            with lock:
+                pooled = _sessions.get(key)
+                if pooled is None or pooled.conn is not conn:
+                    # HttpHook.get_conn resolves the base url, auth and headers of the connection on a throwaway
+                    # session; a reloaded connection keeps the pooled session and its open sockets.
+                    resolved = super(PooledHttpHook, self).get_conn()
+                    resolved.close()
+                    if pooled is None:
+                        session = requests.Session()
+                        adapter = _PooledAdapter(self.pool_conf)
+                        session.mount('http://', adapter)
+                        session.mount('https://', adapter)
+                    else:
+                        session = pooled.session
+                    pooled = _PooledSession(session, self.base_url, resolved.auth, dict(resolved.headers), conn)
+                    with _sessions_lock:
+                        _sessions[key] = pooled
+
+        self.base_url = pooled.base_url
+        return pooled
+
+    def get_conn(self, headers: Optional[dict] = None) -> requests.Session:
+        """
+        :param headers: ignored.  Pass headers to run, which sends them on the request; the session is shared.
+        :return: the pooled session of the connection.  It carries no auth or headers; run adds those.
+        """
+        return self._get_pooled().session
+
+    def _url_for(self, endpoint: Optional[str]) -> str:
+        if self.base_url and not self.base_url.endswith('/') and endpoint and not endpoint.startswith('/'):
+            return self.base_url + '/' + endpoint
+        return (self.base_url or '') + (endpoint or '')
+
+    def run(self,
+            endpoint: Optional[str] = None,
+            data=None,
+            headers: Optional[dict] = None,
+            extra_options: Optional[dict] = None,
+            **request_kwargs) -> requests.Response:
+        extra_options = dict(extra_options or {})
+        extra_options.setdefault('timeout', self.pool_conf.timeout)
+
+        pooled = self._get_pooled()
+        url = self._url_for(endpoint)
+        headers = {**pooled.headers, **headers} if headers else pooled.headers
+        request_kwargs.setdefault('auth', pooled.auth)
+
+        if self.method == 'GET':
+            req = requests.Request(self.method, url, params=data, headers=headers, **request_kwargs)
+        elif self.method == 'HEAD':
+            req = requests.Request(self.method, url, headers=headers, **request_kwargs)
+        else:
+            req = requests.Request(self.method, url, data=data, headers=headers, **request_kwargs)
+
+        prepped_request = pooled.session.prepare_request(req)
+        self.log.debug("Sending '%s' to url: %s", self.method, url)
+        return self.run_and_check(pooled.session, prepped_request, extra_options)
@@ -0,0 +1,208 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Optional
+
+from airflow.configuration import conf
+
+PROFILERS = ('cprofile', 'sampling')
+DEFAULT_SAMPLE_INTERVAL = 0.005
+SUMMARY_LINES = 20
+TRACEMALLOC_FRAMES = 10
+
+_UNSAFE = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class _DeterministicProfiler:
+    """
+    cProfile over the calling thread and every thread started while it runs, so the upserts and runs done on the
+    operators' thread pools are included.  Before Python 3.12 a profile only sees the thread that enabled it, so each
+    new thread enables its own and they are merged when stopped.
+    """
+    suffix = 'pstats'
+
+    def __init__(self):
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._per_thread = sys.version_info < (3, 12)
+
+    def _start_in_thread(self, frame, event, arg):
+        # Called on the first event of a new thread; the thread's own profile then replaces this function.
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def start(self):
+        if self._per_thread:
+            threading.setprofile(self._start_in_thread)
+        profile = cProfile.Profile()
+        self._profiles.append(profile)
+        profile.enable()
+
+    def stop(self) -> pstats.Stats:
+        self._profiles[0].disable()
+        if self._per_thread:
+            threading.setprofile(None)
+        stats = pstats.Stats(self._profiles[0])
+        with self._lock:
+            for p in self._profiles[1:]:
+                stats.add(p)
+        return stats
+
+    @staticmethod
+    def write(stats: pstats.Stats, path: str):
+        stats.dump_stats(path)
+
+    @staticmethod
+    def summary(stats: pstats.Stats) -> str:
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats('cumulative').print_stats(SUMMARY_LINES)
+        return out.getvalue()
+
+
+class _SamplingProfiler:
+    """
+    Samples the stacks of every thread but its own at a fixed interval.  Wall-clock, so time spent waiting on the
+    network shows up next to time spent decoding JSON or building models, at a small and constant overhead.
+    """
+    suffix = 'collapsed'
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='bigeye-profiler', daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    @staticmethod
+    def write(stacks: Counter, path: str):
+        # Collapsed stacks, as read by flamegraph.pl and speedscope.
+        with open(path, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+    @staticmethod
+    def summary(stacks: Counter) -> str:
+        total = sum(stacks.values())
+        if not total:
+            return 'No samples.'
+        own: Counter = Counter()
+        for stack, count in stacks.items():
+            own[stack.rsplit(';', 1)[-1]] += count
+        lines = [f'{total} samples across threads.  Functions by own samples:']
+        lines.extend(f'  {count / total:6.1%} {count:>7} {function}'
+                     for function, count in own.most_common(SUMMARY_LINES))
+        return '\n'.join(lines)
+
+
+def profile_artifact_prefix(name: str, output_dir: Optional[str] = None) -> str:
+    """
+    :param name: identifies the profiled task, e.g. <dag_id>.<task_id>.
+    :param output_dir: directory of the artifacts.  Defaults to [bigeye] profile_dir, else bigeye_profiles in the
+    temp directory.
+    :return: path, without suffix, of the artifacts of one profiled run.
+    """
+    output_dir = output_dir or conf.get('bigeye', 'profile_dir', fallback=None) or \
+        os.path.join(tempfile.gettempdir(), 'bigeye_profiles')
+    os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, f'{_UNSAFE.sub("_", name)}.{time.strftime("%Y%m%dT%H%M%S")}.{os.getpid()}')
+
+
+def _memory_summary(snapshot: tracemalloc.Snapshot, peak: int) -> str:
+    lines = [f'Peak traced memory {peak / (1024 * 1024):.1f}MB.  Largest allocations still held, by line:']
+    lines.extend(f'  {s.size / 1024:10.1f}KB {s.count:>8} blocks {s.traceback}'
+                 for s in snapshot.statistics('lineno')[:SUMMARY_LINES // 2])
+    return '\n'.join(lines)
+
+
+@contextmanager
+def profiled(name: str, profiler: Optional[str] = None, output_dir: Optional[str] = None):
+    """
+    Profiles the block with profiler, or else [bigeye] profiler, and traces its allocations with tracemalloc.  The
+    profile, cProfile's pstats or the sampling profiler's collapsed stacks, and the tracemalloc snapshot are written
+    next to each other and summarized in the log.  Does nothing when neither names a profiler.  Both profilers and
+    tracemalloc slow the block down; use them to diagnose a slow task, not on every run.
+    :param name: identifies the profiled task in the artifact names, e.g. <dag_id>.<task_id>.
+    :param profiler: cprofile, for a deterministic profile, or sampling.
+    :param output_dir: directory of the artifacts.  Defaults to [bigeye] profile_dir, else bigeye_profiles in the
+    temp directory.
+    """
+    profiler = profiler or conf.get('bigeye', 'profiler', fallback=None)
+    if not profiler:
+        yield
+        return
+    if profiler not in PROFILERS:
+        logging.warning(f'Unknown profiler {profiler}.  Use one of {", ".join(PROFILERS)}.')
+        yield
+        return
+
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    elif hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+        tracemalloc.reset_peak()
+    p = _DeterministicProfiler() if profiler == 'cprofile' else _SamplingProfiler()
+    start = time.monotonic()
+    p.start()
+    try:
+        yield
+    finally:
+        result = p.stop()
+        seconds = time.monotonic() - start
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if started_tracemalloc:
+            tracemalloc.stop()
+        _write_artifacts(name, output_dir, p, result, snapshot, peak, seconds)
+
+
+def _write_artifacts(name: str, output_dir: Optional[str], p, result, snapshot: tracemalloc.Snapshot, peak: int,
+                     seconds: float):
+    # Profiling must never fail the task.
+    try:
+        prefix = profile_artifact_prefix(name, output_dir)
+        profile_path = f'{prefix}.{p.suffix}'
+        memory_path = f'{prefix}.tracemalloc'
+        p.write(result, profile_path)
+        snapshot.dump(memory_path)
+    except Exception as e:
+        logging.warning(f'Could not write the profile of {name}: {str(e)}')
+        profile_path = memory_path = None
+
+    try:
+        logging.info(f'Profiled {name} for {seconds:.2f}s.  Profile: {profile_path}  Allocations: {memory_path}\n'
+                     f'{p.summary(result)}\n{_memory_summary(snapshot, peak)}')
+    except Exception as e:
+        logging.warning(f'Could not summarize the profile of {name}: {str(e)}')
@@ -0,0 +1,118 @@
+import email.utils
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from airflow.configuration import conf
+
+# Statuses Bigeye answers with when it wants clients to slow down.
+THROTTLE_STATUSES = {429, 503}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    :param value: a Retry-After header, either delay seconds or an HTTP date.
+    :return: seconds to wait, or None when absent or unparseable.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveRateLimiter:
+    """
+    Caps in-flight requests with a window adjusted additive-increase/multiplicative-decrease, as TCP does: every
+    successful request grows the window by increase / window, so about one request per round trip, and a throttled
+    request shrinks it by decrease_factor.  Only requests sent before the last decrease can't shrink it again, so a
+    burst of 429s from one overload halves the window once rather than collapsing it.  A Retry-After pauses new
+    requests until it passes.
+    """
+
+    def __init__(self,
+                 initial_limit: float = 8.0,
+                 min_limit: float = 1.0,
+                 max_limit: float = 64.0,
+                 increase: float = 1.0,
+                 decrease_factor: float = 0.5,
+                 name: str = 'bigeye'):
+        self.limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.name = name
+        self._in_flight = 0
+        self._resume_at = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self) -> float:
+        """
+        Blocks until the window has room and any Retry-After pause has passed.
+        :return: token to hand back to release.
+        """
+        with self._cond:
+            while True:
+                wait = self._resume_at - time.monotonic()
+                if wait <= 0 and self._in_flight < int(self.limit):
+                    self._in_flight += 1
+                    return time.monotonic()
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, token: float, throttled: bool = False, retry_after: Optional[float] = None):
+        """
+        :param token: value returned by acquire.
+        :param throttled: whether the server throttled the request.
+        :param retry_after: seconds the server asked clients to wait.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            previous = int(self.limit)
+            if throttled:
+                if retry_after:
+                    self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+                if token >= self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = time.monotonic()
+                    logging.warning(f'{self.name} API throttled the client.  Rate limit now {int(self.limit)} '
+                                    f'concurrent requests' + (f', pausing {retry_after:.1f}s.' if retry_after else '.'))
+            else:
+                self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+                if int(self.limit) > previous:
+                    logging.info(f'{self.name} API rate limit now {int(self.limit)} concurrent requests.')
+            self._cond.notify_all()
+
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(connection_id: str) -> AdaptiveRateLimiter:
+    """
+    :return: the process wide limiter for a connection, sized by [bigeye] rate_limit_initial, rate_limit_min and
+    rate_limit_max.
+    """
+    with _limiters_lock:
+        if connection_id not in _limiters:
+            _limiters[connection_id] = AdaptiveRateLimiter(
+                initial_limit=conf.getfloat('bigeye', 'rate_limit_initial', fallback=8.0),
+                min_limit=conf.getfloat('bigeye', 'rate_limit_min', fallback=1.0),
+                max_limit=conf.getfloat('bigeye', 'rate_limit_max', fallback=64.0),
+                name=connection_id)
+        return _limiters[connection_id]
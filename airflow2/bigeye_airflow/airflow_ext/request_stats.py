@@ -0,0 +1,158 @@
+import heapq
+import inspect
+import itertools
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from airflow.stats import Stats
+
+STAT_PREFIX = 'bigeye.request'
+DEFAULT_SLOW_REQUEST_COUNT = 10
+
+_ID_SEGMENT = re.compile(r'^(\d+|[0-9a-f]{8}-[0-9a-f-]{27})$', re.IGNORECASE)
+_UNSAFE = re.compile(r'[^A-Za-z0-9_-]')
+
+
+def endpoint_name(url: str) -> str:
+    """
+    :param url: request path, e.g. /api/v1/metrics/123?x=1.
+    :return: the path as a stat name component with ids collapsed, e.g. api_v1_metrics_id.
+    """
+    path = url.split('?', 1)[0].strip('/')
+    segments = ['id' if _ID_SEGMENT.match(s) else _UNSAFE.sub('_', s) for s in path.split('/') if s]
+    return '_'.join(segments) or 'root'
+
+
+def response_size(response) -> int:
+    if response is None:
+        return 0
+    length = response.headers.get('Content-Length')
+    if length is not None:
+        try:
+            return int(length)
+        except (TypeError, ValueError):
+            return 0
+    # Don't read a streamed body just to measure it.
+    if getattr(response, '_content_consumed', False) is not True:
+        return 0
+    content = getattr(response, 'content', None)
+    return len(content) if isinstance(content, (bytes, str)) else 0
+
+
+def _stats_support_tags() -> bool:
+    try:
+        return 'tags' in inspect.signature(Stats.incr).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+@dataclass(order=True)
+class RequestRecord:
+    seconds: float
+    method: str = field(compare=False)
+    url: str = field(compare=False)
+    status: Optional[int] = field(compare=False)
+    retries: int = field(compare=False)
+
+
+class RequestStats:
+    """
+    Emits a timer, a status counter and byte and retry counters for every Bigeye request through Airflow's Stats, and
+    keeps the slowest requests of the task for log_summary.  Metrics are tagged with the endpoint, method, connection
+    and operator where the configured Stats backend takes tags; otherwise the endpoint is part of the stat name.
+    """
+
+    def __init__(self, connection_id: str, operator: Optional[str] = None,
+                 slow_request_count: int = DEFAULT_SLOW_REQUEST_COUNT):
+        """
+        :param connection_id: connection the requests are sent through.
+        :param operator: task id of the operator sending them.
+        :param slow_request_count: number of slowest requests listed by log_summary.
+        """
+        self.connection_id = connection_id
+        self.operator = operator
+        self.slow_request_count = slow_request_count
+        self.tags_supported = _stats_support_tags()
+        self.count = 0
+        self.seconds = 0.0
+        self.retries = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self._slowest: List[RequestRecord] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _tags(self, endpoint: str, method: str) -> Dict[str, str]:
+        tags = {'endpoint': endpoint, 'method': method, 'conn_id': self.connection_id}
+        if self.operator:
+            tags['operator'] = self.operator
+        return tags
+
+    def record(self, method: str, url: str, status: Optional[int], seconds: float, bytes_out: int = 0,
+               bytes_in: int = 0, retries: int = 0):
+        """
+        :param method: request method.
+        :param url: request path.
+        :param status: final status code, or None when no response was received.
+        :param seconds: wall time of the request including its retries.
+        :param bytes_out: size of the request body.
+        :param bytes_in: size of the response body.
+        :param retries: number of times the request was repeated.
+        """
+        endpoint = endpoint_name(url)
+        status_name = str(status) if status is not None else 'error'
+        try:
+            if self.tags_supported:
+                tags = self._tags(endpoint, method)
+                Stats.timing(f'{STAT_PREFIX}.duration', timedelta(seconds=seconds), tags=tags)
+                Stats.incr(f'{STAT_PREFIX}.status', tags={**tags, 'status': status_name})
+                Stats.incr(f'{STAT_PREFIX}.bytes_out', bytes_out, tags=tags)
+                Stats.incr(f'{STAT_PREFIX}.bytes_in', bytes_in, tags=tags)
+                if retries:
+                    Stats.incr(f'{STAT_PREFIX}.retries', retries, tags=tags)
+            else:
+                prefix = f'{STAT_PREFIX}.{endpoint}.{method.lower()}'
+                Stats.timing(f'{prefix}.duration', timedelta(seconds=seconds))
+                Stats.incr(f'{prefix}.status.{status_name}')
+                Stats.incr(f'{prefix}.bytes_out', bytes_out)
+                Stats.incr(f'{prefix}.bytes_in', bytes_in)
+                if retries:
+                    Stats.incr(f'{prefix}.retries', retries)
+        except Exception as e:
+            # Metrics must never fail a request.
+            logging.debug(f'Could not emit request stats: {str(e)}')
+
+        record = RequestRecord(seconds=seconds, method=method, url=url, status=status, retries=retries)
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            self.retries += retries
+            self.bytes_out += bytes_out
+            self.bytes_in += bytes_in
+            if self.slow_request_count > 0:
+                entry = (record, next(self._seq))
+                if len(self._slowest) < self.slow_request_count:
+                    heapq.heappush(self._slowest, entry)
+                else:
+                    heapq.heappushpop(self._slowest, entry)
+
+    @property
+    def slowest(self) -> List[RequestRecord]:
+        """
+        :return: the slowest requests recorded, slowest first.
+        """
+        with self._lock:
+            return [r for r, _ in sorted(self._slowest, reverse=True)]
+
+    def log_summary(self):
+        if not self.count:
+            return
+        lines = '\n'.join(f'  {r.seconds:8.3f}s {r.method} {r.url} -> {r.status or "error"}'
+                          + (f' ({r.retries} retries)' if r.retries else '')
+                          for r in self.slowest)
+        logging.info(f'Bigeye requests: {self.count} in {self.seconds:.2f}s, {self.retries} retries, '
+                     f'{self.bytes_out} bytes sent, {self.bytes_in} bytes received.  Slowest:\n{lines}')
@@ -0,0 +1,116 @@
+import json
+import random
+import re
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional
+
+from airflow.exceptions import AirflowException
+from bigeye_sdk.client.datawatch_client import Method
+
+# Statuses a gateway or an overloaded replica answers with that a repeat of the same request can outlive.  429 and
+# 503 are left to the rate limiter.
+TRANSIENT_STATUSES = frozenset({500, 502, 504})
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+# POST endpoints that only read, so are as safe to repeat as a GET.
+READ_ONLY_POSTS = re.compile(r'^/?api/v1/(metrics/info|metrics/comparisons/tables/info|sources/fetch|issues/fetch)'
+                             r'(\?|$)')
+
+# Metric upserts.  An update, whose body carries the metric's id, sets the same settings however often it is sent.  A
+# create isn't safe to repeat blindly; AirflowDatawatchClient checks whether a failed one took effect before retrying.
+METRIC_UPSERT = re.compile(r'^/?api/v1/metrics(\?|$)')
+
+ENDPOINT_CLASSES = (
+    ('catalog', re.compile(r'^/?(dataset/|api/v1/(tables|sources|schemas)\b)')),
+    ('metric_run', re.compile(r'^/?(api/v1/metrics/(run|backfill)\b|statistics\b)')),
+    ('metric', re.compile(r'^/?api/v1/metrics\b')),
+)
+
+
+class HttpStatusError(AirflowException):
+    """An error status from the API, raised as HttpHook.check_response does, that keeps the status code."""
+
+    def __init__(self, status_code: int, message: str):
+        super(HttpStatusError, self).__init__(message)
+        self.status_code = status_code
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Retries of an endpoint class's idempotent requests after transient errors, spaced by exponential backoff with
+    full jitter so the retries of many clients spread out rather than arriving together.
+    """
+    max_retries: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+    statuses: FrozenSet[int] = TRANSIENT_STATUSES
+
+    def delay(self, attempt: int) -> float:
+        """
+        :param attempt: zero based number of the retry.
+        :return: seconds to wait before it, uniformly drawn up to base_delay * 2 ** attempt capped at max_delay.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+DEFAULT_RETRY_POLICIES: Dict[str, RetryPolicy] = {
+    # Catalog reads are cheap to repeat and a task can't start without them.
+    'catalog': RetryPolicy(max_retries=5),
+    'metric': RetryPolicy(max_retries=3),
+    # Metric runs are long server side; a repeated one mostly queues behind the original.
+    'metric_run': RetryPolicy(max_retries=1, base_delay=2.0),
+    'default': RetryPolicy(max_retries=2),
+}
+
+
+def endpoint_class(url: str) -> str:
+    """
+    :param url: endpoint path, e.g. /api/v1/metrics/info.
+    :return: name of the first of ENDPOINT_CLASSES whose pattern matches, or default.
+    """
+    for name, pattern in ENDPOINT_CLASSES:
+        if pattern.match(url):
+            return name
+    return 'default'
+
+
+def _has_id(body: Optional[str]) -> bool:
+    try:
+        return bool(json.loads(body).get('id'))
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+
+def is_idempotent(method: Method, url: str, body: Optional[str] = None) -> bool:
+    if method.name in IDEMPOTENT_METHODS:
+        return True
+    if method.name != 'POST':
+        return False
+    return bool(READ_ONLY_POSTS.match(url)) or (bool(METRIC_UPSERT.match(url)) and _has_id(body))
+
+
+def get_class_retry_policy(name: str, policies: Optional[Dict[str, RetryPolicy]] = None) -> RetryPolicy:
+    """
+    :param name: endpoint class, one of ENDPOINT_CLASSES or default.
+    :param policies: { <endpoint class>: RetryPolicy } overriding DEFAULT_RETRY_POLICIES.
+    :return: the policy of the endpoint class.
+    """
+    policies = {**DEFAULT_RETRY_POLICIES, **(policies or {})}
+    return policies.get(name, policies['default'])
+
+
+def get_retry_policy(method: Method, url: str,
+                     policies: Optional[Dict[str, RetryPolicy]] = None,
+                     body: Optional[str] = None) -> Optional[RetryPolicy]:
+    """
+    :param method: request method.
+    :param url: endpoint path.
+    :param policies: { <endpoint class>: RetryPolicy } overriding DEFAULT_RETRY_POLICIES.
+    :param body: request body, which tells a metric update from a create.
+    :return: the policy of the endpoint's class, or None when the request isn't safe to repeat.
+    """
+    if not is_idempotent(method, url, body):
+        return None
+    return get_class_retry_policy(endpoint_class(url), policies)
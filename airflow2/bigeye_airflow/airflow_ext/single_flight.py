@@ -0,0 +1,63 @@
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one.  The first caller runs the function; callers arriving while
+    it is in flight wait for it and receive the same result, or the same exception.  Nothing is cached: a call made
+    after the first one finished runs again.
+    """
+
+    def __init__(self, name: str = 'bigeye'):
+        self.name = name
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        :param key: identifies calls that may share a result, e.g. the method and url of a request.
+        :param fn: the call to make.
+        :return: the result of fn, from this call or from the identical one already in flight.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+
+        if not leader:
+            logging.debug(f'Sharing the in-flight {self.name} call for {key}.')
+            return call.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+_single_flights: Dict[str, SingleFlight] = {}
+_single_flights_lock = threading.Lock()
+
+
+def get_single_flight(connection_id: str) -> SingleFlight:
+    """
+    :return: the process wide single flight group for a connection's requests.
+    """
+    with _single_flights_lock:
+        if connection_id not in _single_flights:
+            _single_flights[connection_id] = SingleFlight(name=connection_id)
+        return _single_flights[connection_id]
@@ -0,0 +1,416 @@
+import asyncio
+import json
+import logging
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+import aiohttp
+from airflow.exceptions import AirflowException
+from airflow.models import Connection
+from bigeye_sdk.client.datawatch_client import DatawatchClient
+from bigeye_sdk.client.enum import Method
+from bigeye_sdk.functions.metric_functions import set_default_model_type_for_threshold
+from bigeye_sdk.functions.urlfuncts import encode_url_params
+from bigeye_sdk.generated.com.torodata.models.generated import TableList, Table, MetricConfiguration, \
+    SearchMetricConfigurationRequest, BatchGetMetricResponse, BatchRunMetricsRequest, BatchRunMetricsResponse, \
+    MetricBackfillRequest, MetricBackfillResponse, GetMetricInfoListRequest, MetricInfoList, MetricInfo
+from bigeye_sdk.model.configuration_templates import SimpleUpsertMetricRequest
+
+from bigeye_airflow.airflow_ext.catalog_cache import CatalogCache, get_catalog_cache
+from bigeye_airflow.airflow_ext.pooled_http_hook import PooledHttpHook, SessionPoolConfiguration
+from bigeye_airflow.airflow_ext.request_stats import endpoint_name
+from bigeye_airflow.airflow_ext.retry_policy import RetryPolicy, get_class_retry_policy
+from bigeye_airflow.airflow_ext.tracing import set_attributes, span
+from bigeye_airflow.functions.batch_functions import chunk_list
+from bigeye_airflow.functions.metric_functions import MetricIndex, get_metric_configuration_identity, \
+    get_metric_fingerprint, metric_identity
+
+headers = {"Content-Type": "application/json", "Accept": "application/json"}
+
+
+def _get_base_url(conn: Connection) -> str:
+    """Mirrors HttpHook.get_conn so both clients resolve the same url from a connection."""
+    if conn.host and "://" in conn.host:
+        base_url = conn.host
+    else:
+        schema = conn.schema if conn.schema else "http"
+        host = conn.host if conn.host else ""
+        base_url = schema + "://" + host
+    if conn.port:
+        base_url = base_url + ":" + str(conn.port)
+    return base_url.rstrip('/')
+
+
+class AsyncAirflowDatawatchClient:
+    """
+    asyncio counterpart of AirflowDatawatchClient.  Reads the same Airflow connection and runs up to max_concurrency
+    requests at once over a single aiohttp session.  A client is bound to the event loop it is first used on; use it
+    as an async context manager, or call close, so the session is released.
+    """
+
+    def __init__(self,
+                 connection_id: str,
+                 max_concurrency: int = 10,
+                 pool_conf: Optional[SessionPoolConfiguration] = None,
+                 catalog_cache: Optional[CatalogCache] = None):
+        """
+        param connection_id: string referencing a defined connection in the Airflow deployment.
+        param max_concurrency: maximum number of requests in flight at once.
+        param pool_conf: pool size and timeout settings for the aiohttp session.
+        param catalog_cache: on-disk cache for schema table listings.  Defaults to the cache configured under
+        [bigeye] catalog_cache_dir, if any.
+        """
+        self.conn_id = connection_id
+        self.max_concurrency = max_concurrency
+        self.pool_conf = pool_conf or SessionPoolConfiguration()
+        self.catalog_cache = catalog_cache if catalog_cache is not None else get_catalog_cache()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session_lock: Optional[asyncio.Lock] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._base_url: Optional[str] = None
+        self._metric_ix: Dict[int, 'asyncio.Future[MetricIndex]'] = {}
+        self._metric_fingerprints: Dict[int, str] = {}
+        self.upsert_counts = Counter(created=0, updated=0, unchanged=0)
+        self._pending_backfill: Optional[List[int]] = None
+
+    async def __aenter__(self) -> 'AsyncAirflowDatawatchClient':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is not None:
+            return self._session
+        if self._session_lock is None:
+            self._session_lock = asyncio.Lock()
+        async with self._session_lock:
+            if self._session is not None:
+                return self._session
+            # Connection lookups may hit the metadata DB; keep them off the event loop.
+            conn = await asyncio.get_running_loop().run_in_executor(None, PooledHttpHook.get_connection,
+                                                                    self.conn_id)
+            self._base_url = _get_base_url(conn)
+            auth = aiohttp.BasicAuth(conn.login, conn.password or '') if conn.login else None
+            session_headers = dict(headers)
+            if conn.extra:
+                session_headers.update(conn.extra_dejson)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._session = aiohttp.ClientSession(
+                auth=auth,
+                headers=session_headers,
+                connector=aiohttp.TCPConnector(limit=max(self.max_concurrency, self.pool_conf.pool_maxsize)),
+                timeout=aiohttp.ClientTimeout(connect=self.pool_conf.connect_timeout,
+                                              sock_read=self.pool_conf.read_timeout))
+        return self._session
+
+    async def _call_datawatch(self, method: Method, url, body: str = None):
+        url = url.replace('//', '/')
+        session = await self._get_session()
+        fq_url = f'{self._base_url}/{url.lstrip("/")}'
+        async with self._semaphore:
+            try:
+                with span(f'bigeye.http {method.name}', http_method=method.name, url=url,
+                          endpoint=endpoint_name(url), bytes_out=len(body) if body else 0) as s:
+                    async with session.request(method.name, fq_url, data=body) as response:
+                        set_attributes(s, status_code=response.status, bytes_in=response.content_length)
+                        if response.status >= 400:
+                            text = await response.text()
+                            logging.error(f'HTTP error calling airflow datawatch: {response.status} {text}')
+                            raise AirflowException(f'{response.status}:{response.reason}')
+                        if response.status != 204:
+                            return await response.json(content_type=None)
+            except aiohttp.ClientError as e:
+                logging.error(f'Exception calling airflow datawatch: {str(e)}')
+                raise e
+
+    async def _get_cached_json(self, key: str, url: str):
+        """See CatalogCache.fetch_json.  Cache reads and writes run on the default executor."""
+        loop = asyncio.get_running_loop()
+        entry = await loop.run_in_executor(None, self.catalog_cache.get, key)
+        if entry is not None and entry.fresh:
+            return json.loads(entry.body)
+
+        session = await self._get_session()
+        fq_url = f'{self._base_url}/{url.replace("//", "/").lstrip("/")}'
+        async with self._semaphore:
+            with span('bigeye.http GET', http_method='GET', url=url, endpoint=endpoint_name(url)) as s:
+                async with session.get(fq_url, headers=CatalogCache.conditional_headers(entry)) as response:
+                    set_attributes(s, status_code=response.status, bytes_in=response.content_length)
+                    if response.status >= 400:
+                        logging.error(f'HTTP error calling airflow datawatch: {response.status} '
+                                      f'{await response.text()}')
+                        raise AirflowException(f'{response.status}:{response.reason}')
+                    if response.status == 304 and entry is not None:
+                        await loop.run_in_executor(None, self.catalog_cache.touch, key)
+                        return json.loads(entry.body)
+                    body = await response.read()
+                    etag = response.headers.get('ETag')
+                    last_modified = response.headers.get('Last-Modified')
+
+        await loop.run_in_executor(None, lambda: self.catalog_cache.put(key, body, etag=etag,
+                                                                        last_modified=last_modified))
+        return json.loads(body)
+
+    async def get_tables(self,
+                         *,
+                         warehouse_id: List[int] = [],
+                         schema: List[str] = [],
+                         table_name: List[str] = [],
+                         ids: List[int] = [],
+                         schema_id: List[int] = []) -> TableList:
+        if self.catalog_cache is not None and len(warehouse_id) == 1 and len(schema) == 1 and not ids \
+                and not schema_id:
+            # See AirflowDatawatchClient.get_tables.
+            url = f"/api/v1/tables?{encode_url_params(dict(warehouse_id=warehouse_id, schema=schema), remove_keys=[])}"
+            tables = TableList().from_dict(
+                await self._get_cached_json(CatalogCache.key(self.conn_id, warehouse_id[0], schema[0]), url))
+            if table_name:
+                names = {n.lower() for n in table_name}
+                tables.tables = [t for t in tables.tables if t.name.lower() in names]
+            return tables
+
+        params = dict(warehouse_id=warehouse_id, schema=schema, table_name=table_name, ids=ids, schema_id=schema_id)
+        url = f"/api/v1/tables?{encode_url_params(params, remove_keys=[])}"
+        response = await self._call_datawatch(Method.GET, url)
+        return TableList().from_dict(response)
+
+    async def search_metric_configuration(self,
+                                          *,
+                                          ids: List[int] = [],
+                                          warehouse_ids: List[int] = [],
+                                          table_ids: List[int] = [],
+                                          table_name: str = "",
+                                          status: str = "",
+                                          muted: bool = False) -> List[MetricConfiguration]:
+        request = SearchMetricConfigurationRequest()
+        request.ids = ids
+        request.warehouse_ids = warehouse_ids
+        request.table_ids = table_ids
+        request.table_name = table_name
+        request.status = status
+        request.muted = muted
+
+        url = f'/api/v1/metrics?{encode_url_params(d=request.to_dict(), remove_keys=[])}'
+        response = await self._call_datawatch(Method.GET, url=url)
+        return [MetricConfiguration().from_dict(m) for m in BatchGetMetricResponse(metrics=response).metrics]
+
+    async def get_metric_configuration(self, *, metric_id: int = 0) -> MetricConfiguration:
+        response = await self._call_datawatch(Method.GET, f'/api/v1/metrics/{metric_id}')
+        return MetricConfiguration().from_dict(response)
+
+    async def _get_metric_index(self, warehouse_id: int, table_id: int) -> MetricIndex:
+        # Concurrent upserts on one table share a single search request.
+        if table_id not in self._metric_ix:
+            self._metric_ix[table_id] = asyncio.ensure_future(self._build_metric_index(warehouse_id, table_id))
+        try:
+            return await asyncio.shield(self._metric_ix[table_id])
+        except Exception:
+            self._metric_ix.pop(table_id, None)
+            raise
+
+    async def _build_metric_index(self, warehouse_id: int, table_id: int) -> MetricIndex:
+        metrics = await self.search_metric_configuration(warehouse_ids=[warehouse_id], table_ids=[table_id])
+        self._metric_fingerprints.update((m.id, get_metric_fingerprint(m)) for m in metrics)
+        return MetricIndex(metrics, get_metric_configuration_identity)
+
+    async def get_existing_metric(self,
+                                  warehouse_id: int, table: Table, column_name: str, user_defined_name: str,
+                                  metric_name: str, group_by: List[str], filters: List[str]):
+        ix = await self._get_metric_index(warehouse_id, table.id)
+        return ix.get(metric_identity(metric_name, user_defined_name, column_name, group_by, filters))
+
+    async def upsert_metric(self, metric_configuration: MetricConfiguration) -> MetricConfiguration:
+        """Skips the request when it would not change an existing metric.  See AirflowDatawatchClient."""
+        set_default_model_type_for_threshold(metric_configuration.thresholds)
+        metric_id = metric_configuration.id
+        if metric_id and self._metric_fingerprints.get(metric_id) == get_metric_fingerprint(metric_configuration):
+            logging.info(f'Metric {metric_id} is unchanged.  Skipping upsert.')
+            self.upsert_counts['unchanged'] += 1
+            return metric_configuration
+
+        response = await self._call_datawatch(Method.POST, url="/api/v1/metrics",
+                                              body=metric_configuration.to_json())
+        result = MetricConfiguration().from_dict(response)
+        self.upsert_counts['updated' if metric_id else 'created'] += 1
+        self._metric_fingerprints[result.id] = get_metric_fingerprint(result)
+        ix_future = self._metric_ix.get(result.dataset_id)
+        if ix_future is not None and ix_future.done() and not ix_future.exception():
+            ix_future.result().put(result)
+        return result
+
+    async def backfill_metric(self, *, metric_ids: List[int] = []) -> Optional[MetricBackfillResponse]:
+        if self._pending_backfill is not None:
+            self._pending_backfill.extend(metric_ids)
+            return None
+        return await self._backfill_metric(metric_ids)
+
+    async def _backfill_metric(self, metric_ids: List[int]) -> MetricBackfillResponse:
+        request = MetricBackfillRequest()
+        request.metric_ids = metric_ids
+        response = await self._call_datawatch(Method.POST, url="/api/v1/metrics/backfill", body=request.to_json())
+        return MetricBackfillResponse().from_dict(response)
+
+    @asynccontextmanager
+    async def coalesced_backfills(self, batch_size: int = 100):
+        """See AirflowDatawatchClient.coalesced_backfills.  The batches are sent concurrently."""
+        self._pending_backfill = []
+        try:
+            yield
+        except BaseException:
+            try:
+                await self._flush_backfills(batch_size)
+            except Exception as e:
+                logging.error(f'Exception backfilling metrics: {str(e)}')
+            raise
+        await self._flush_backfills(batch_size)
+
+    async def _flush_backfills(self, batch_size: int):
+        metric_ids = list(dict.fromkeys(self._pending_backfill))
+        self._pending_backfill = None
+        await asyncio.gather(*[self._backfill_metric(chunk) for chunk in chunk_list(metric_ids, batch_size)])
+
+    async def upsert_metric_from_simple_template(self,
+                                                 sumr: SimpleUpsertMetricRequest,
+                                                 target_warehouse_id: int = None,
+                                                 existing_metric_id: int = None) -> int:
+        """
+        Async version of DatawatchClient.upsert_metric_from_simple_template.  The SDK's method itself validates the
+        template, matches the table, builds the request and decides on the backfill, run by _UpsertPlanner; this
+        client only sends the requests it asks for.
+        :param sumr: SimpleUpsertMetricRequest object
+        :param target_warehouse_id: deploy to warehouse id.
+        :param existing_metric_id: id of the metric to update, skips the search for an existing metric.
+        :return: Id of the resulting metric.
+        """
+        results = []
+        while True:
+            try:
+                return _UpsertPlanner(results).upsert_metric_from_simple_template(
+                    sumr=sumr, target_warehouse_id=target_warehouse_id, existing_metric_id=existing_metric_id)
+            except _PlannedCall as call:
+                results.append(await getattr(self, call.name)(*call.args, **call.kwargs))
+
+    async def run_metric_batch(self, *, metric_ids: List[int] = []) -> BatchRunMetricsResponse:
+        request = BatchRunMetricsRequest()
+        request.metric_ids = metric_ids
+        response = await self._call_datawatch(Method.POST, '/api/v1/metrics/run/batch', request.to_json())
+        return BatchRunMetricsResponse().from_dict(response)
+
+    async def run_metric_batch_chunked(self,
+                                       *,
+                                       metric_ids: List[int],
+                                       chunk_size: Optional[int] = None,
+                                       retries: int = 1,
+                                       retry_policy: Optional[RetryPolicy] = None) -> BatchRunMetricsResponse:
+        """
+        Async version of AirflowDatawatchClient.run_metric_batch_chunked.  Chunks run concurrently, bounded by the
+        client's max_concurrency, and only chunks whose request failed are retried, after a backoff.
+        :param metric_ids: list of metric ids to run.
+        :param chunk_size: maximum metric ids per run_metric_batch request.  One request for all ids if None.
+        :param retries: number of times to retry the chunks that failed.
+        :param retry_policy: spaces the retries.  Defaults to the metric_run policy.
+        :return: BatchRunMetricsResponse with the metric infos of every chunk.
+        """
+        retry_policy = retry_policy or get_class_retry_policy('metric_run')
+        chunks = chunk_list(metric_ids, chunk_size)
+        results: Dict[int, List[MetricInfo]] = {}
+        pending = list(range(len(chunks)))
+
+        for attempt in range(retries + 1):
+            responses = await asyncio.gather(*[self.run_metric_batch(metric_ids=chunks[i]) for i in pending],
+                                             return_exceptions=True)
+            errors: Dict[int, BaseException] = {}
+            for i, r in zip(pending, responses):
+                if isinstance(r, BaseException):
+                    errors[i] = r
+                else:
+                    results[i] = r.metric_infos
+
+            pending = sorted(errors)
+            if not pending:
+                break
+            if attempt < retries:
+                delay = retry_policy.delay(attempt)
+                logging.warning(f'{len(pending)} of {len(chunks)} metric run chunks failed on attempt {attempt + 1}.  '
+                                f'Retrying in {delay:.1f}s.')
+                await asyncio.sleep(delay)
+
+        if pending:
+            raise AirflowException(f'{len(pending)} of {len(chunks)} metric run chunks failed after {retries} '
+                                   f'retries.  Last error: {errors[pending[-1]]}')
+
+        return BatchRunMetricsResponse(metric_infos=[mi for i in range(len(chunks)) for mi in results[i]])
+
+    async def get_metric_info_batch(self, *, metric_ids: List[int] = []) -> MetricInfoList:
+        """
+        Gets the current info, including latest run status, for a list of metrics.  Follows pagination cursors and
+        returns every page in a single MetricInfoList.
+        :param metric_ids: list of metric ids.
+        :return: MetricInfoList object.
+        """
+        request = GetMetricInfoListRequest()
+        request.metric_ids = metric_ids
+        url = '/api/v1/metrics/info'
+
+        mil = MetricInfoList().from_dict(await self._call_datawatch(Method.POST, url=url, body=request.to_json()))
+        result = MetricInfoList(metrics=list(mil.metrics))
+        while mil.pagination_info.next_cursor:
+            request.page_cursor = mil.pagination_info.next_cursor
+            mil = MetricInfoList().from_dict(await self._call_datawatch(Method.POST, url=url, body=request.to_json()))
+            result.metrics.extend(mil.metrics)
+
+        return result
+
+
+class _PlannedCall(Exception):
+    """A call _UpsertPlanner has no result for yet."""
+
+    def __init__(self, name: str, args: tuple, kwargs: dict):
+        super(_PlannedCall, self).__init__(name)
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+
+
+class _UpsertPlanner(DatawatchClient):
+    """
+    Runs DatawatchClient.upsert_metric_from_simple_template without I/O.  Each client call the SDK makes is answered
+    from results, in order, or raised as a _PlannedCall for the async client to make, append to results and replay
+    the method.  Every call the method makes is a read or an upsert and backfill it only reaches once the reads are
+    answered, so a replay repeats no request.
+    """
+
+    def __init__(self, results: list):
+        self._results = results
+        self._calls = 0
+
+    def _answer(self, name: str, args: tuple, kwargs: dict):
+        if self._calls < len(self._results):
+            self._calls += 1
+            return self._results[self._calls - 1]
+        raise _PlannedCall(name, args, kwargs)
+
+    def get_tables(self, *args, **kwargs):
+        return self._answer('get_tables', args, kwargs)
+
+    def get_metric_configuration(self, *args, **kwargs):
+        return self._answer('get_metric_configuration', args, kwargs)
+
+    def get_existing_metric(self, *args, **kwargs):
+        return self._answer('get_existing_metric', args, kwargs)
+
+    def upsert_metric(self, *args, **kwargs):
+        return self._answer('upsert_metric', args, kwargs)
+
+    def backfill_metric(self, *args, **kwargs):
+        return self._answer('backfill_metric', args, kwargs)
+
+    def _call_datawatch_impl(self, method: Method, url, body: str = None):
+        raise AirflowException(f'Unexpected request planning a metric upsert: {method.name} {url}')
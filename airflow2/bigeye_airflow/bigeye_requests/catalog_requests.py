@@ -1,50 +1,84 @@
-from typing import List, Dict
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, Optional, Set
 
+from bigeye_airflow.airflow_ext.catalog_cache import CatalogCache, get_catalog_cache
 from bigeye_airflow.bigeye_requests.http_hook import get_hook
+from bigeye_airflow.functions.json_functions import DEFAULT_CHUNK_SIZE, iter_json_array
+from bigeye_airflow.models.catalog import AssetIndex, CatalogSchema
 from bigeye_airflow.models.configurations import CreateMetricConfiguration
 
 
 # TODO: These have been moved to the SDK at table_functions or to create_metrics_operator as helper functions.
-def _transform_table_field_list_to_dict(table: dict) -> dict:
-    """
-    Converts the table['fields'] list to a dictionary of { <tableName.lower>: <field_entry> } for quick, easy,
-    case-insensitive keying
-    :param table: a dictionary representing a dataset in Bigeye derived from the dataset/tables endpoint.
-    :return: the modified table entry
-    """
-    table['fields'] = {f['fieldName'].lower(): f for f in table['fields']}
-    return table
-
-
-def _transform_table_list_to_dict(tables: List[dict]) -> dict:
-    return {t['datasetName'].lower(): _transform_table_field_list_to_dict(t) for t in tables}
+def _filter_tables(tables: Iterable[dict], table_names: Optional[Set[str]]) -> Iterator[dict]:
+    return (t for t in tables if table_names is None or t['datasetName'].lower() in table_names)
 
 
-def _get_schema_tables_json(connection_id: str, warehouse_id: int, schema_name: str) -> Dict[str, dict]:
+def _get_schema_catalog(connection_id: str, warehouse_id: int, schema_name: str,
+                        table_names: Optional[Set[str]] = None) -> CatalogSchema:
     """
-    Calls the dataset/tables/{warehouse_id}/{schema_name} API endpoint then transforms the result to include lower case
-    table and column names for quick, easy, case-insensitive keying
+    Calls the dataset/tables/{warehouse_id}/{schema_name} API endpoint and converts the tables to a CatalogSchema with
+    case-insensitive table and field lookups.  Without a catalog cache the response is parsed as a stream, one table
+    at a time, so tables outside table_names are never held in memory together.
     :param connection_id: name of connection in airflow with bigeye login info
     :param warehouse_id: int id of Bigeye warehouse
     :param schema_name: name of the schema for which to query tables.
-    :return: { <table_name.lower>: <transformed_table_entry> }
+    :param table_names: lower case names of the tables to keep.  Keeps every table if None.
+    :return: CatalogSchema of the kept tables.
     """
     hook = get_hook(connection_id, 'GET')
-    tables = hook.run("dataset/tables/{warehouse_id}/{schema_name}"
-                      .format(warehouse_id=warehouse_id,
-                              schema_name=schema_name),
-                      headers={"Accept": "application/json"}).json()
+    endpoint = "dataset/tables/{warehouse_id}/{schema_name}".format(warehouse_id=warehouse_id,
+                                                                     schema_name=schema_name)
+    cache = get_catalog_cache()
+    if cache is None:
+        response = hook.run(endpoint, headers={"Accept": "application/json"}, extra_options={'stream': True})
+        try:
+            tables = iter_json_array(response.iter_content(DEFAULT_CHUNK_SIZE))
+            return CatalogSchema.from_dicts(schema_name, _filter_tables(tables, table_names))
+        finally:
+            response.close()
 
-    return _transform_table_list_to_dict(tables)
+    # The cache stores whole bodies, so this path parses the full response.
+    tables = cache.fetch_json(CatalogCache.key(connection_id, warehouse_id, schema_name, kind='dataset_tables'),
+                              lambda conditional_headers: hook.run(endpoint, headers={"Accept": "application/json",
+                                                                                      **conditional_headers}))
+    return CatalogSchema.from_dicts(schema_name, _filter_tables(tables, table_names))
 
 
-def get_asset_ix(connection_id: str, warehouse_id: int, conf: List[CreateMetricConfiguration]) -> dict:
+def get_asset_ix(connection_id: str, warehouse_id: int, conf: List[CreateMetricConfiguration],
+                 max_parallelism: int = 8) -> AssetIndex:
     """
-    Builds a case-insensitive, keyable index of assets needed by the CreateMetricConfiguration
+    Builds a case-insensitive, keyable index of assets needed by the CreateMetricConfiguration.  Schemas are fetched
+    concurrently and a schema that fails is reported in the result's errors rather than failing the others.
     :param connection_id: name of connection in airflow with bigeye login info
     :param warehouse_id: int id of Bigeye warehouse
     :param conf: the CreateMetricConfiguration object
-    :return: { <schema_name.lower>: { <table_name.lower>: <transformed_table_entry> }}
+    :param max_parallelism: maximum number of schemas fetched at once.
+    :return: AssetIndex of { <schema_name.lower>: CatalogSchema }.  Look tables up with CatalogSchema.get_table and
+    fields with CatalogTable.get_field, or key them as before: ix[schema][table]['fields'][field_name.lower].
     """
-    return {sn.lower(): _get_schema_tables_json(connection_id, warehouse_id, sn)
-            for sn in {c.schema_name for c in conf}}
+    # Keyed by the lower case schema name, so one fetch serves every spelling of a schema; the first spelling is
+    # the one requested.
+    schema_names: Dict[str, str] = {}
+    table_names: Dict[str, Set[str]] = {}
+    for c in conf:
+        key = c.schema_name.lower()
+        schema_names.setdefault(key, c.schema_name)
+        table_names.setdefault(key, set()).add(c.table_name.lower())
+
+    ix = AssetIndex()
+    if not table_names:
+        return ix
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_parallelism, len(table_names)))) as executor:
+        futures = {executor.submit(_get_schema_catalog, connection_id, warehouse_id, schema_names[key], tns): key
+                   for key, tns in table_names.items()}
+        for f in as_completed(futures):
+            key = futures[f]
+            try:
+                ix[key] = f.result()
+            except Exception as e:
+                logging.error(f'Exception fetching tables of schema {schema_names[key]}: {str(e)}')
+                ix.errors[key] = e
+
+    return ix
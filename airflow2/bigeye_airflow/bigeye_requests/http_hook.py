@@ -1,5 +1,7 @@
 from airflow.providers.http.hooks.http import HttpHook
 
+from bigeye_airflow.airflow_ext.pooled_http_hook import PooledHttpHook
+
 
 def get_hook(connection_id, method) -> HttpHook:
-    return HttpHook(http_conn_id=connection_id, method=method)
\ No newline at end of file
+    return PooledHttpHook(http_conn_id=connection_id, method=method)
@@ -3,23 +3,34 @@ import logging
 from typing import List
 
 from bigeye_airflow.bigeye_requests.http_hook import get_hook
-from bigeye_sdk.functions.metric_functions import is_same_type_metric, is_same_column_metric
+from bigeye_airflow.functions.batch_functions import chunk_list
+from bigeye_airflow.functions.metric_functions import MetricIndex, get_metric_dict_identity, metric_identity
 
 
 # TODO: These have all been moved to the SDK and are being used in bigeye-airflow from the SDK.
 
-def get_existing_metric(connection_id: str, warehouse_id: int, table: dict, column_name: str, metric_name: str,
-                        group_by: List[str]):
+def get_metric_index(connection_id: str, warehouse_id: int, table: dict) -> MetricIndex:
+    """
+    Downloads a table's metrics once and indexes them by identity.  Pass the result to get_existing_metric when
+    matching many configurations against the same table.
+    :param connection_id: name of connection in airflow with bigeye login info
+    :param warehouse_id: int id of Bigeye warehouse
+    :param table: a dictionary representing a dataset in Bigeye derived from the dataset/tables endpoint.
+    :return: MetricIndex of the table's raw metric dictionaries.
+    """
     hook = get_hook(connection_id, 'GET')
     result = hook.run("api/v1/metrics?warehouseIds={warehouse_id}&tableIds={table_id}"
                       .format(warehouse_id=warehouse_id,
                               table_id=table.get("id")),
                       headers={"Accept": "application/json"})
-    metrics = result.json()
-    for m in metrics:
-        if is_same_type_metric(m, metric_name, group_by) and is_same_column_metric(m, column_name):
-            return m
-    return None
+    return MetricIndex(result.json(), get_metric_dict_identity)
+
+
+def get_existing_metric(connection_id: str, warehouse_id: int, table: dict, column_name: str, metric_name: str,
+                        group_by: List[str], filters: List[str] = [], metric_index: MetricIndex = None):
+    if metric_index is None:
+        metric_index = get_metric_index(connection_id, warehouse_id, table)
+    return metric_index.get(metric_identity(metric_name, None, column_name, group_by, filters))
 
 
 def upsert_metric(connection_id: str, metric: str):
@@ -38,8 +49,14 @@ def upsert_metric(connection_id: str, metric: str):
     return result
 
 
-def backfill_metric(connection_id: str, metric_ids: List[int]):
+def backfill_metric(connection_id: str, metric_ids: List[int], batch_size: int = None):
+    """
+    :param connection_id: name of connection in airflow with bigeye login info
+    :param metric_ids: ids of the metrics to backfill.
+    :param batch_size: maximum metric ids per request.  One request for all ids if None.
+    """
     bigeye_post_hook = get_hook(connection_id, 'POST')
-    bigeye_post_hook.run("api/v1/metrics/backfill",
-                         headers={"Content-Type": "application/json", "Accept": "application/json"},
-                         data=json.dumps({"metricIds": metric_ids}))
+    for chunk in chunk_list(metric_ids, batch_size):
+        bigeye_post_hook.run("api/v1/metrics/backfill",
+                             headers={"Content-Type": "application/json", "Accept": "application/json"},
+                             data=json.dumps({"metricIds": chunk}))
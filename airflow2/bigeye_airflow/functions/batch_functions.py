@@ -0,0 +1,18 @@
+from typing import List, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+def chunk_list(items: List[T], chunk_size: Optional[int]) -> List[List[T]]:
+    """
+    Splits a list into consecutive chunks of at most chunk_size items.
+    :param items: the list to split.
+    :param chunk_size: maximum items per chunk.  A falsy chunk_size returns the whole list as one chunk.
+    :return: list of chunks, in input order.
+    :raises ValueError: if chunk_size is negative.
+    """
+    if chunk_size is not None and chunk_size < 0:
+        raise ValueError(f'chunk_size must not be negative, got {chunk_size}.')
+    if not chunk_size or chunk_size >= len(items):
+        return [list(items)] if items else []
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
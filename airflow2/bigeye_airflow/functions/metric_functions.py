@@ -0,0 +1,95 @@
+import hashlib
+import json
+from typing import Callable, Dict, Hashable, List, Optional, TypeVar
+
+from bigeye_sdk.functions.metric_functions import is_freshness_metric, get_column_name
+from bigeye_sdk.generated.com.torodata.models.generated import MetricConfiguration
+from bigeye_sdk.model.enums import SimpleMetricType
+
+# Every freshness metric shares one identity; HOURS_SINCE_MAX_TIMESTAMP and HOURS_SINCE_MAX_DATE match each other.
+FRESHNESS_METRIC_NAME = 'HOURS_SINCE_MAX'
+
+# The settings an upsert of an existing metric can change.  See merge_existing_metric_conf in the SDK.
+UPDATABLE_FIELDS = ['name', 'thresholds', 'notificationChannels', 'scheduleFrequency', 'lookbackType', 'lookback',
+                    'grainSeconds']
+# List fields whose order carries no meaning.
+UNORDERED_FIELDS = ['thresholds', 'notificationChannels']
+
+M = TypeVar('M')
+
+
+def _normalize_metric_name(metric_name: Optional[str]) -> Optional[str]:
+    return FRESHNESS_METRIC_NAME if metric_name and is_freshness_metric(metric_name) else metric_name
+
+
+def metric_identity(metric_name: str, user_defined_name: Optional[str], column_name: Optional[str],
+                    group_by: List[str], filters: List[str]) -> tuple:
+    """
+    Canonical identity of a metric, matching the rules of the SDK's is_same_metric and is_same_column_metric: the
+    metric name with freshness normalization, user defined name, and the lower-cased column, group bys and filters.
+    :return: a hashable tuple.
+    """
+    return (_normalize_metric_name(metric_name),
+            user_defined_name,
+            (column_name or '').lower(),
+            tuple(g.lower() for g in group_by or []),
+            tuple(f.lower() for f in filters or []))
+
+
+def get_metric_configuration_identity(metric: MetricConfiguration) -> tuple:
+    if is_freshness_metric(metric.metric_type.predefined_metric.metric_name.name):
+        metric_name = FRESHNESS_METRIC_NAME
+    else:
+        metric_name = SimpleMetricType.get_metric_name(metric.metric_type)
+    return metric_identity(metric_name, metric.name, get_column_name(metric), metric.group_bys, metric.filters)
+
+
+def get_metric_dict_identity(metric: dict) -> tuple:
+    """
+    Identity of a raw api/v1/metrics entry.  Raw entries are matched without a user defined name.
+    """
+    metric_name = ((metric.get('metricType') or {}).get('predefinedMetric') or {}).get('metricName')
+    parameters = metric.get('parameters') or [{}]
+    return metric_identity(metric_name, None, parameters[0].get('columnName'),
+                           metric.get('groupBys', []), metric.get('filters', []))
+
+
+def get_metric_fingerprint(metric: MetricConfiguration) -> str:
+    """
+    Digest of the updatable settings of a metric, so a desired configuration can be compared with the existing one.
+    Defaults are left out and unordered lists are sorted so equal settings always produce equal fingerprints.
+    :param metric: MetricConfiguration to fingerprint.
+    :return: hex digest.
+    """
+    d = metric.to_dict()
+    state = {}
+    for f in UPDATABLE_FIELDS:
+        v = d.get(f)
+        if f in UNORDERED_FIELDS and v:
+            v = sorted(v, key=lambda i: json.dumps(i, sort_keys=True))
+        if v:
+            state[f] = v
+    return hashlib.sha1(json.dumps(state, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class MetricIndex:
+    """
+    Hash index of one table's metrics keyed by identity, for O(1) matching of configurations against existing
+    metrics.  When several metrics share an identity the first one listed wins, as it did with a linear scan.
+    """
+
+    def __init__(self, metrics: List[M], key_func: Callable[[M], Hashable]):
+        self._key_func = key_func
+        self._ix: Dict[Hashable, M] = {}
+        for m in metrics:
+            self._ix.setdefault(key_func(m), m)
+
+    def get(self, identity: Hashable) -> Optional[M]:
+        return self._ix.get(identity)
+
+    def put(self, metric: M):
+        """Adds or replaces a metric, e.g. after it was upserted."""
+        self._ix[self._key_func(metric)] = metric
+
+    def __len__(self):
+        return len(self._ix)
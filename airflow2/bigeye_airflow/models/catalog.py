@@ -0,0 +1,169 @@
+import collections.abc
+import sys
+from types import MappingProxyType
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+
+class CatalogField(collections.abc.Mapping):
+    """
+    The parts of a dataset/tables field entry the operators read.  Slotted, with the repeated type strings interned,
+    so a field costs a fraction of its JSON dict.  Also a read-only mapping of the JSON keys it keeps, so code written
+    against the field dicts keeps working.
+    """
+    __slots__ = ('id', 'name', 'type', 'metric_time_field', 'can_be_metric_time')
+    _KEYS = {'id': 'id', 'fieldName': 'name', 'type': 'type', 'metricTimeField': 'metric_time_field',
+             'canBeMetricTime': 'can_be_metric_time'}
+
+    def __init__(self, id: int, name: str, type: Optional[str], metric_time_field: bool, can_be_metric_time: bool):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.metric_time_field = metric_time_field
+        self.can_be_metric_time = can_be_metric_time
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'CatalogField':
+        t = d.get('type')
+        return cls(id=d.get('id'),
+                   name=d['fieldName'],
+                   type=sys.intern(t) if t else t,
+                   metric_time_field=bool(d.get('metricTimeField')),
+                   can_be_metric_time=bool(d.get('canBeMetricTime')))
+
+    def __getitem__(self, key: str):
+        return getattr(self, self._KEYS[key])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __len__(self):
+        return len(self._KEYS)
+
+    def __repr__(self):
+        return f'CatalogField(id={self.id}, name={self.name!r}, type={self.type!r})'
+
+
+class CatalogTable(collections.abc.Mapping):
+    """
+    A table of the catalog with its fields and a case-insensitive field lookup.  The field entries are converted to
+    CatalogFields, and the lookup built, on first use, so the tables a task never touches cost no more than their
+    field list.  Also a read-only mapping of id, datasetName and fields, the last being the field lookup, as the
+    table dicts of the asset index were.
+    """
+    __slots__ = ('id', 'name', '_fields', '_field_ix')
+    _KEYS = ('id', 'datasetName', 'fields')
+
+    def __init__(self, id: int, name: str, fields: Union[Tuple[CatalogField, ...], List[dict]]):
+        """
+        :param id: table id.
+        :param name: table name.
+        :param fields: the CatalogFields, or the dataset/tables field entries to convert on first use.
+        """
+        self.id = id
+        self.name = name
+        self._fields = fields
+        self._field_ix: Optional[Mapping[str, CatalogField]] = None
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'CatalogTable':
+        return cls(id=d.get('id'),
+                   name=d['datasetName'],
+                   fields=list(d.get('fields') or []))
+
+    @property
+    def fields(self) -> Tuple[CatalogField, ...]:
+        fields = self._fields
+        if not isinstance(fields, tuple):
+            # Converts the list read above, so a concurrent first use converts the same entries.
+            fields = self._fields = tuple(CatalogField.from_dict(f) for f in fields)
+        return fields
+
+    @property
+    def field_ix(self) -> Mapping[str, CatalogField]:
+        """
+        :return: read-only { <field_name.lower>: CatalogField }, built on first access.
+        """
+        if self._field_ix is None:
+            self._field_ix = MappingProxyType({f.name.lower(): f for f in self.fields})
+        return self._field_ix
+
+    def get_field(self, field_name: str) -> Optional[CatalogField]:
+        """
+        :param field_name: case-insensitive name of the field.
+        :return: the field or None.
+        """
+        return self.field_ix.get(field_name.lower())
+
+    @property
+    def has_metric_time(self) -> bool:
+        return any(f.metric_time_field for f in self.fields)
+
+    def __getitem__(self, key: str):
+        if key == 'id':
+            return self.id
+        if key == 'datasetName':
+            return self.name
+        if key == 'fields':
+            return self.field_ix
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __len__(self):
+        return len(self._KEYS)
+
+    def __repr__(self):
+        return f'CatalogTable(id={self.id}, name={self.name!r}, fields={len(self._fields)})'
+
+
+class CatalogSchema(collections.abc.Mapping):
+    """
+    The tables of one schema with a case-insensitive table lookup.  A read-only mapping of
+    { <table_name.lower>: CatalogTable } whose lookups ignore case, as get_table does.
+    """
+    __slots__ = ('name', '_table_ix')
+
+    def __init__(self, name: str, tables: Iterable[CatalogTable]):
+        self.name = name
+        self._table_ix: Dict[str, CatalogTable] = {t.name.lower(): t for t in tables}
+
+    @classmethod
+    def from_dicts(cls, name: str, tables: Iterable[dict]) -> 'CatalogSchema':
+        return cls(name, (CatalogTable.from_dict(t) for t in tables))
+
+    def get_table(self, table_name: str) -> Optional[CatalogTable]:
+        """
+        :param table_name: case-insensitive name of the table.
+        :return: the table or None.
+        """
+        return self._table_ix.get(table_name.lower())
+
+    @property
+    def tables(self) -> Tuple[CatalogTable, ...]:
+        return tuple(self._table_ix.values())
+
+    def __getitem__(self, table_name: str) -> CatalogTable:
+        if not isinstance(table_name, str):
+            raise KeyError(table_name)
+        return self._table_ix[table_name.lower()]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._table_ix)
+
+    def __len__(self):
+        return len(self._table_ix)
+
+    def __repr__(self):
+        return f'CatalogSchema(name={self.name!r}, tables={len(self._table_ix)})'
+
+
+class AssetIndex(dict):
+    """
+    { <schema_name.lower>: CatalogSchema } of the schemas that resolved, with the failures of the rest in errors as
+    { <schema_name.lower>: Exception }.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(AssetIndex, self).__init__(*args, **kwargs)
+        self.errors: Dict[str, Exception] = {}
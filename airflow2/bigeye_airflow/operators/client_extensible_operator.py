@@ -1,10 +1,18 @@
 from abc import abstractmethod
+from typing import TYPE_CHECKING
 
 from airflow.models import BaseOperator
-from bigeye_sdk.client.datawatch_client import DatawatchClient
+
+if TYPE_CHECKING:
+    from bigeye_sdk.client.datawatch_client import DatawatchClient
 
 
 class ClientExtensibleOperator(BaseOperator):
     @abstractmethod
-    def get_client(self) -> DatawatchClient:
+    def get_client(self) -> 'DatawatchClient':
         pass
+
+    @staticmethod
+    def _log_cache_stats():
+        from bigeye_airflow.airflow_ext.connection_cache import connection_cache
+        connection_cache.log_stats()
@@ -1,13 +1,24 @@
+import asyncio
 import logging
-from typing import List
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
-from bigeye_sdk.client.datawatch_client import DatawatchClient
+from airflow.exceptions import AirflowException
 
-from bigeye_sdk.model.configuration_templates import SimpleUpsertMetricRequest
-
-from bigeye_airflow.airflow_datawatch_client import AirflowDatawatchClient
+from bigeye_airflow.airflow_ext.configuration_cache import configuration_cache
+from bigeye_airflow.airflow_ext.profiling import profiled
+from bigeye_airflow.airflow_ext.request_stats import RequestStats
+from bigeye_airflow.airflow_ext.tracing import propagate, span
 from bigeye_airflow.operators.client_extensible_operator import ClientExtensibleOperator
 
+if TYPE_CHECKING:
+    from bigeye_sdk.client.datawatch_client import DatawatchClient
+    from bigeye_sdk.model.configuration_templates import SimpleUpsertMetricRequest
+
+    from bigeye_airflow.airflow_ext.pooled_http_hook import SessionPoolConfiguration
+    from bigeye_airflow.async_airflow_datawatch_client import AsyncAirflowDatawatchClient
+
 
 class CreateMetricOperator(ClientExtensibleOperator):
     """
@@ -19,39 +30,188 @@ class CreateMetricOperator(ClientExtensibleOperator):
                  connection_id: str,
                  warehouse_id: int,
                  configuration: List[dict],
+                 pool_conf: Optional['SessionPoolConfiguration'] = None,
+                 use_async: bool = False,
+                 max_concurrency: int = 10,
+                 max_parallelism: int = 1,
+                 serialize_by_table: bool = False,
+                 backfill_batch_size: int = 100,
+                 profiler: Optional[str] = None,
+                 profile_dir: Optional[str] = None,
                  *args,
                  **kwargs):
         """
         param connection_id: string referencing a defined connection in the Airflow deployment.
         param warehouse_id: int id of the warehouse where the operator will upsert the metrics.
         param configuration: list of metric configurations to upsert.  The dicts passed as a list must conform to the
-        dataclass SimplePredefinedMetricTemplate.
+        dataclass SimpleUpsertMetricRequest.  They are parsed and validated when the operator executes, not when the
+        DAG is parsed.
+        param pool_conf: Optional[SessionPoolConfiguration] pool size, keep-alive and timeout settings for the
+        pooled HTTP session.
+        param use_async: bool upserts the configurations concurrently with the AsyncAirflowDatawatchClient.
+        param max_concurrency: int maximum number of requests in flight at once when use_async is set.
+        param max_parallelism: int maximum number of configurations upserted at once on a thread pool.  The default
+        of 1 upserts them one at a time.
+        param serialize_by_table: bool upserts the configurations that target the same table one after another, in
+        input order, while different tables proceed in parallel.
+        param backfill_batch_size: int maximum metric IDs per backfill request.  Backfills of new metrics are
+        collected during the upserts and sent once they finish.
+        param profiler: Optional[str] profiles execute with cprofile or sampling, traces its allocations and logs a
+        summary.  Defaults to [bigeye] profiler.
+        param profile_dir: Optional[str] directory of the profile artifacts.  Defaults to [bigeye] profile_dir.
         param args: not currently supported
         param kwargs: not currently supported
         """
 
         super(CreateMetricOperator, self).__init__(*args, **kwargs)
         self.connection_id = connection_id
+        self.warehouse_id = warehouse_id
 
-        self.configuration = [SimpleUpsertMetricRequest(**c)
-                              for c in configuration]
+        self.configuration = configuration
 
         self.connection_id = connection_id
+        self.pool_conf = pool_conf
+        self.use_async = use_async
+        self.max_concurrency = max_concurrency
+        self.max_parallelism = max_parallelism
+        self.serialize_by_table = serialize_by_table
+        self.backfill_batch_size = backfill_batch_size
+        self.profiler = profiler
+        self.profile_dir = profile_dir
         self.client = None
 
-    def get_client(self) -> DatawatchClient:
+    def get_client(self) -> 'DatawatchClient':
         if not self.client:
-            self.client = AirflowDatawatchClient(self.connection_id)
+            from bigeye_airflow.airflow_datawatch_client import AirflowDatawatchClient
+            self.client = AirflowDatawatchClient(self.connection_id, pool_conf=self.pool_conf,
+                                                 request_stats=RequestStats(self.connection_id,
+                                                                            operator=self.task_id))
         return self.client
 
+    def get_async_client(self) -> 'AsyncAirflowDatawatchClient':
+        from bigeye_airflow.async_airflow_datawatch_client import AsyncAirflowDatawatchClient
+        return AsyncAirflowDatawatchClient(self.connection_id, max_concurrency=self.max_concurrency,
+                                           pool_conf=self.pool_conf)
+
     def execute(self, context):
-        created_metrics_ids: List[int] = []
+        with profiled(f'{self.dag_id}.{self.task_id}', self.profiler, self.profile_dir), \
+                span('bigeye.create_metrics', task_id=self.task_id, warehouse_id=self.warehouse_id,
+                     metric_count=len(self.configuration)):
+            try:
+                sumrs = configuration_cache.materialize(self.configuration)
+                if self.use_async:
+                    return asyncio.run(self._execute_async(sumrs))
+                return self._execute_sync(sumrs)
+            finally:
+                self._log_cache_stats()
+                configuration_cache.log_stats()
+
+    def _execute_sync(self, sumrs: List['SimpleUpsertMetricRequest']) -> List[int]:
+        results: Dict[int, int] = {}
+        errors: Dict[int, Exception] = {}
+
+        def upsert_group(indexes: List[int]):
+            for i in indexes:
+                try:
+                    with self._upsert_span(sumrs, i):
+                        results[i] = self.get_client().upsert_metric_from_simple_template(
+                            sumr=sumrs[i], target_warehouse_id=self.warehouse_id)
+                except Exception as e:
+                    logging.error(f'Exception upserting metric configuration {i}: {str(e)}')
+                    errors[i] = e
+
+        groups = self._group_configuration(sumrs)
+        with self.get_client().coalesced_backfills(batch_size=self.backfill_batch_size):
+            if self.max_parallelism <= 1:
+                for g in groups:
+                    upsert_group(g)
+            else:
+                with ThreadPoolExecutor(max_workers=max(1, min(self.max_parallelism, len(groups)))) as executor:
+                    list(executor.map(propagate(upsert_group), groups))
+
+        self._log_upsert_counts(self.get_client())
+        self._log_request_summary(self.get_client())
+        return self._collect_results(sumrs, results, errors)
+
+    async def _execute_async(self, sumrs: List['SimpleUpsertMetricRequest']) -> List[int]:
+        async with self.get_async_client() as client:
+            async def upsert_one(i: int):
+                with self._upsert_span(sumrs, i):
+                    return await client.upsert_metric_from_simple_template(sumr=sumrs[i],
+                                                                           target_warehouse_id=self.warehouse_id)
+
+            async def upsert_group(indexes: List[int]) -> List:
+                if not self.serialize_by_table:
+                    return await asyncio.gather(*[upsert_one(i) for i in indexes], return_exceptions=True)
+                group_results = []
+                for i in indexes:
+                    try:
+                        group_results.append(await upsert_one(i))
+                    except Exception as e:
+                        group_results.append(e)
+                return group_results
 
-        # Iterate each configuration
-        for c in self.configuration:
+            groups = self._group_configuration(sumrs) if self.serialize_by_table \
+                else [list(range(len(sumrs)))]
+            async with client.coalesced_backfills(batch_size=self.backfill_batch_size):
+                group_results = await asyncio.gather(*[upsert_group(g) for g in groups])
+            self._log_upsert_counts(client)
 
-            r = self.get_client().upsert_metric_from_simple_template(sumr=c)
-            created_metrics_ids.append(r)
+        results: Dict[int, int] = {}
+        errors: Dict[int, Exception] = {}
+        for g, rs in zip(groups, group_results):
+            for i, r in zip(g, rs):
+                if isinstance(r, Exception):
+                    logging.error(f'Exception upserting metric configuration {i}: {str(r)}')
+                    errors[i] = r
+                else:
+                    results[i] = r
 
-        return created_metrics_ids
+        return self._collect_results(sumrs, results, errors)
+
+    @staticmethod
+    def _upsert_span(sumrs: List['SimpleUpsertMetricRequest'], i: int):
+        c = sumrs[i]
+        return span('bigeye.upsert_configuration', index=i, schema=c.schema_name, table=c.table_name,
+                    column=c.column_name)
+
+    def _group_configuration(self, sumrs: List['SimpleUpsertMetricRequest']) -> List[List[int]]:
+        """
+        :return: lists of configuration indexes to upsert one after another.  One list per table when
+        serialize_by_table is set, otherwise one list per configuration.
+        """
+        if not self.serialize_by_table:
+            return [[i] for i in range(len(sumrs))]
+
+        groups: Dict[Tuple[str, str], List[int]] = OrderedDict()
+        for i, c in enumerate(sumrs):
+            groups.setdefault((c.schema_name.lower(), c.table_name.lower()), []).append(i)
+        return list(groups.values())
+
+    @staticmethod
+    def _log_upsert_counts(client):
+        counts = getattr(client, 'upsert_counts', None)
+        if counts is not None:
+            logging.info(f"Metrics created: {counts['created']}, updated: {counts['updated']}, "
+                         f"unchanged: {counts['unchanged']}.")
+
+    @staticmethod
+    def _log_request_summary(client):
+        request_stats = getattr(client, 'request_stats', None)
+        if request_stats is not None:
+            request_stats.log_summary()
+
+    @staticmethod
+    def _collect_results(sumrs: List['SimpleUpsertMetricRequest'], results: Dict[int, int],
+                         errors: Dict[int, Exception]) -> List[int]:
+        """
+        :return: metric ids in the order of the configuration.
+        :raises AirflowException: listing every configuration that failed, once all of them have been attempted.
+        """
+        if errors:
+            failures = '\n'.join(f'{sumrs[i].schema_name}.{sumrs[i].table_name}.{sumrs[i].column_name}: {str(e)}'
+                                  for i, e in sorted(errors.items()))
+            raise AirflowException(f'{len(errors)} of {len(sumrs)} metric configurations failed to '
+                                   f'upsert.\n{failures}')
 
+        return [results[i] for i in range(len(sumrs))]
@@ -1,13 +1,27 @@
+import asyncio
 import logging
-from typing import List, Optional
+from datetime import timedelta
+from typing import TYPE_CHECKING, List, Optional
 
-from bigeye_sdk.client.datawatch_client import DatawatchClient
-from bigeye_sdk.generated.com.torodata.models.generated import Table, MetricConfiguration, \
-    MetricInfo, MetricRunStatus
+from airflow.exceptions import AirflowException
 
-from bigeye_airflow.airflow_datawatch_client import AirflowDatawatchClient
+from bigeye_airflow.airflow_ext.profiling import profiled
+from bigeye_airflow.airflow_ext.request_stats import RequestStats
+from bigeye_airflow.airflow_ext.tracing import set_attributes, span
 from bigeye_airflow.operators.client_extensible_operator import ClientExtensibleOperator
 
+# The trigger stops polling this long, or a tenth of deferral_timeout if less, before the deferral times out, so the
+# task fails with the metrics that had not settled rather than a bare deferral timeout.
+TRIGGER_TIMEOUT_MARGIN_SECONDS = 60.0
+DEFAULT_DEFERRAL_TIMEOUT = timedelta(hours=6)
+
+if TYPE_CHECKING:
+    from bigeye_sdk.client.datawatch_client import DatawatchClient
+    from bigeye_sdk.generated.com.torodata.models.generated import Table, MetricConfiguration, MetricInfo
+
+    from bigeye_airflow.airflow_ext.pooled_http_hook import SessionPoolConfiguration
+    from bigeye_airflow.async_airflow_datawatch_client import AsyncAirflowDatawatchClient
+
 
 class RunMetricsOperator(ClientExtensibleOperator):
     """
@@ -26,6 +40,18 @@ class RunMetricsOperator(ClientExtensibleOperator):
                  schema_name: Optional[str] = None,
                  table_name: Optional[str] = None,
                  metric_ids: Optional[List[int]] = None,
+                 pool_conf: Optional['SessionPoolConfiguration'] = None,
+                 use_async: bool = False,
+                 max_concurrency: int = 10,
+                 deferrable: bool = False,
+                 poll_interval: float = 30.0,
+                 deferral_timeout: timedelta = DEFAULT_DEFERRAL_TIMEOUT,
+                 submit_timeout: float = 10.0,
+                 chunk_size: Optional[int] = None,
+                 max_parallelism: int = 1,
+                 chunk_retries: int = 1,
+                 profiler: Optional[str] = None,
+                 profile_dir: Optional[str] = None,
                  *args,
                  **kwargs):
         """
@@ -34,29 +60,111 @@ class RunMetricsOperator(ClientExtensibleOperator):
                 param schema_name: Optional[str] name of the schema where the table resides.
                 param table_name: Optional[str] name of the table to run all metrics.
                 param metric_ids: Optional[List[int]] list of metric IDs to run.
+                param pool_conf: Optional[SessionPoolConfiguration] pool size, keep-alive and timeout settings for
+                the pooled HTTP session.
+                param use_async: bool runs the metrics with the AsyncAirflowDatawatchClient.
+                param max_concurrency: int maximum number of requests in flight at once when use_async is set.
+                param deferrable: bool submits the run from the worker without waiting for its results, then frees
+                the worker slot and polls the metrics from the triggerer until they settle.  Not supported with
+                use_async.
+                param poll_interval: float seconds between metric status polls when deferrable is set.
+                param deferral_timeout: timedelta how long to wait on the triggerer before the task fails.  The
+                trigger stops polling shortly before and the task fails listing the metrics that have not settled.
+                param submit_timeout: float seconds the worker waits on each run request when deferrable is set,
+                before leaving the run to Bigeye.
+                param chunk_size: Optional[int] maximum metric IDs per batch run request.  All metric IDs are sent in
+                one request if None.
+                param max_parallelism: int number of chunks run, or submitted when deferrable is set, at once on the
+                worker.  The async path and the triggerer's polling are bounded by max_concurrency.
+                param chunk_retries: int number of times to retry the chunks whose request failed.
+                param profiler: Optional[str] profiles execute with cprofile or sampling, traces its allocations
+                and logs a summary.  Defaults to [bigeye] profiler.
+                param profile_dir: Optional[str] directory of the profile artifacts.  Defaults to [bigeye]
+                profile_dir.
                 param args: not currently supported
                 param kwargs: not currently supported
         """
         super(RunMetricsOperator, self).__init__(*args, **kwargs)
+        if use_async and deferrable:
+            raise AirflowException('use_async and deferrable cannot both be set.  Deferrable runs poll from the '
+                                   'triggerer, which is always asynchronous.')
         self.connection_id = connection_id
         self.warehouse_id = warehouse_id
         self.schema_name = schema_name
         self.table_name = table_name
         self.metric_ids = metric_ids
         self.connection_id = connection_id;
+        self.pool_conf = pool_conf
+        self.use_async = use_async
+        self.max_concurrency = max_concurrency
+        self.deferrable = deferrable
+        self.poll_interval = poll_interval
+        self.deferral_timeout = deferral_timeout or DEFAULT_DEFERRAL_TIMEOUT
+        self.submit_timeout = submit_timeout
+        self.chunk_size = chunk_size
+        self.max_parallelism = max_parallelism
+        self.chunk_retries = chunk_retries
+        self.profiler = profiler
+        self.profile_dir = profile_dir
         self.client = None
 
-    def get_client(self) -> DatawatchClient:
+    def get_client(self) -> 'DatawatchClient':
         if not self.client:
-            self.client = AirflowDatawatchClient(self.connection_id)
+            from bigeye_airflow.airflow_datawatch_client import AirflowDatawatchClient
+            self.client = AirflowDatawatchClient(self.connection_id, pool_conf=self.pool_conf,
+                                                 request_stats=RequestStats(self.connection_id,
+                                                                            operator=self.task_id))
         return self.client
 
+    def get_async_client(self) -> 'AsyncAirflowDatawatchClient':
+        from bigeye_airflow.async_airflow_datawatch_client import AsyncAirflowDatawatchClient
+        return AsyncAirflowDatawatchClient(self.connection_id, max_concurrency=self.max_concurrency,
+                                           pool_conf=self.pool_conf)
+
     def execute(self, context):
+        with profiled(f'{self.dag_id}.{self.task_id}', self.profiler, self.profile_dir):
+            with span('bigeye.run_metrics', task_id=self.task_id, warehouse_id=self.warehouse_id,
+                      schema=self.schema_name, table=self.table_name):
+                try:
+                    if self.use_async:
+                        return asyncio.run(self._execute_async())
+
+                    metric_ids_to_run = self._set_metric_ids_to_run()
+
+                    if not self.deferrable:
+                        return self._run_metrics(metric_ids_to_run)
+
+                    # The run is submitted here rather than from the trigger, which a triggerer restart would re-run.
+                    submitted_at = self._submit_metric_batch(metric_ids_to_run)
+                finally:
+                    self._log_cache_stats()
+
+            # Deferred outside the span, which would otherwise record TaskDeferred as an error.
+            from bigeye_airflow.triggers.run_metrics_trigger import RunMetricsTrigger
+            self.defer(trigger=RunMetricsTrigger(connection_id=self.connection_id,
+                                                 metric_ids=metric_ids_to_run,
+                                                 submitted_at=submitted_at,
+                                                 timeout=self._trigger_timeout(),
+                                                 poll_interval=self.poll_interval,
+                                                 max_concurrency=self.max_concurrency,
+                                                 chunk_size=self.chunk_size),
+                       method_name="execute_complete",
+                       timeout=self.deferral_timeout)
+
+    def _trigger_timeout(self) -> float:
+        seconds = self.deferral_timeout.total_seconds()
+        return max(0.0, seconds - min(TRIGGER_TIMEOUT_MARGIN_SECONDS, seconds / 10))
 
-        metric_ids_to_run = self._set_metric_ids_to_run()
-        return self._run_metrics(metric_ids_to_run)
+    def execute_complete(self, context, event: dict) -> dict:
+        if event["status"] == "error":
+            raise AirflowException(f"Bigeye metric run failed: {event['message']}")
+        if event["status"] == "timeout":
+            raise AirflowException(f"Bigeye metric run timed out: {event['message']}  Pending metric IDs: "
+                                   f"{event['pending_metric_ids']}")
+        from bigeye_sdk.generated.com.torodata.models.generated import MetricInfo
+        return self._summarize_metric_infos([MetricInfo().from_dict(mi) for mi in event["metric_infos"]])
 
-    def _get_table_for_name(self, schema_name, table_name) -> Table:
+    def _get_table_for_name(self, schema_name, table_name) -> 'Table':
         tables = self.get_client().get_tables(warehouse_id=[self.warehouse_id],
                                               schema=[schema_name],
                                               table_name=[table_name]).tables
@@ -69,19 +177,82 @@ class RunMetricsOperator(ClientExtensibleOperator):
     def _set_metric_ids_to_run(self) -> List[int]:
         if self.metric_ids is None:
             table = self._get_table_for_name(self.schema_name, self.table_name)
-            metrics: List[MetricConfiguration] = self.get_client().search_metric_configuration(
-                warehouse_ids=[table.warehouse_id],
-                table_ids=[table.id])
+            with span('bigeye.metric_search', warehouse_id=table.warehouse_id, table_id=table.id) as s:
+                metrics: List['MetricConfiguration'] = self.get_client().search_metric_configuration(
+                    warehouse_ids=[table.warehouse_id],
+                    table_ids=[table.id])
+                set_attributes(s, metric_count=len(metrics))
 
             return [m.id for m in metrics]
         else:
             return self.metric_ids
 
+    async def _execute_async(self) -> dict:
+        async with self.get_async_client() as client:
+            if self.metric_ids is None:
+                with span('bigeye.table_resolution', warehouse_id=self.warehouse_id, schema=self.schema_name,
+                          table=self.table_name):
+                    tables = (await client.get_tables(warehouse_id=[self.warehouse_id],
+                                                      schema=[self.schema_name],
+                                                      table_name=[self.table_name])).tables
+                if not tables:
+                    raise Exception(f"Could not find table: {self.table_name} in {self.schema_name}")
+                table = tables.pop()
+                with span('bigeye.metric_search', warehouse_id=table.warehouse_id, table_id=table.id) as s:
+                    metrics = await client.search_metric_configuration(warehouse_ids=[table.warehouse_id],
+                                                                       table_ids=[table.id])
+                    set_attributes(s, metric_count=len(metrics))
+                metric_ids_to_run = [m.id for m in metrics]
+            else:
+                metric_ids_to_run = self.metric_ids
+
+            logging.debug("Running metric IDs: %s", metric_ids_to_run)
+            with span('bigeye.batch_run', metric_count=len(metric_ids_to_run), chunk_size=self.chunk_size):
+                if self.chunk_size:
+                    response = await client.run_metric_batch_chunked(metric_ids=metric_ids_to_run,
+                                                                     chunk_size=self.chunk_size,
+                                                                     retries=self.chunk_retries)
+                else:
+                    response = await client.run_metric_batch(metric_ids=metric_ids_to_run)
+            return self._summarize_metric_infos(response.metric_infos)
+
     def _run_metrics(self, metric_ids_to_run: List[int]) -> dict:
+        return self._summarize_metric_infos(self._run_metric_batch(metric_ids_to_run))
+
+    def _submit_metric_batch(self, metric_ids_to_run: List[int]) -> float:
+        logging.debug("Submitting metric IDs: %s", metric_ids_to_run)
+        try:
+            return self.get_client().submit_metric_batch(metric_ids=metric_ids_to_run,
+                                                         chunk_size=self.chunk_size,
+                                                         max_parallelism=self.max_parallelism,
+                                                         submit_timeout=self.submit_timeout)
+        finally:
+            request_stats = getattr(self.get_client(), 'request_stats', None)
+            if request_stats is not None:
+                request_stats.log_summary()
+
+    def _run_metric_batch(self, metric_ids_to_run: List[int]) -> List['MetricInfo']:
+        logging.debug("Running metric IDs: %s", metric_ids_to_run)
+        try:
+            with span('bigeye.batch_run', metric_count=len(metric_ids_to_run), chunk_size=self.chunk_size):
+                if self.chunk_size:
+                    metric_infos: List['MetricInfo'] = self.get_client().run_metric_batch_chunked(
+                        metric_ids=metric_ids_to_run,
+                        chunk_size=self.chunk_size,
+                        max_parallelism=self.max_parallelism,
+                        retries=self.chunk_retries).metric_infos
+                else:
+                    metric_infos = self.get_client().run_metric_batch(metric_ids=metric_ids_to_run).metric_infos
+        finally:
+            request_stats = getattr(self.get_client(), 'request_stats', None)
+            if request_stats is not None:
+                request_stats.log_summary()
+        return metric_infos
+
+    def _summarize_metric_infos(self, metric_infos: List['MetricInfo']) -> dict:
+        from bigeye_sdk.generated.com.torodata.models.generated import MetricRunStatus
         success: List[str] = []
         failure: List[str] = []
-        logging.debug("Running metric IDs: %s", metric_ids_to_run)
-        metric_infos: List[MetricInfo] = self.get_client().run_metric_batch(metric_ids=metric_ids_to_run).metric_infos
         num_failing_metrics = 0
         for mi in metric_infos:
             if mi.status is not MetricRunStatus.METRIC_RUN_STATUS_OK:
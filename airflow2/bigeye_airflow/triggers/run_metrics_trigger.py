@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from airflow.triggers.base import BaseTrigger, TriggerEvent
+from bigeye_sdk.generated.com.torodata.models.generated import MetricInfo, MetricRunStatus
+
+from bigeye_airflow.async_airflow_datawatch_client import AsyncAirflowDatawatchClient
+from bigeye_airflow.functions.batch_functions import chunk_list
+
+# Statuses that mean the metric has not reported a result for the run yet.
+PENDING_STATUSES = {MetricRunStatus.METRIC_RUN_STATUS_UNSPECIFIED,
+                    MetricRunStatus.METRIC_RUN_STATUS_NO_RUNS,
+                    MetricRunStatus.METRIC_RUN_STATUS_UNKNOWN}
+
+
+class RunMetricsTrigger(BaseTrigger):
+    """
+    Polls, from the triggerer, the metrics whose run the operator submitted at submitted_at, until each reports a run
+    at or after it that has settled, or timeout seconds pass.  Fires a single event carrying the latest MetricInfo of
+    each metric as a dict, with status success, or timeout when some metrics had not settled.  The trigger never
+    submits a run itself, so a triggerer restart or handoff only repeats the polling, not the run.
+    """
+
+    def __init__(self,
+                 connection_id: str,
+                 metric_ids: List[int],
+                 submitted_at: float,
+                 timeout: float,
+                 poll_interval: float = 30.0,
+                 max_concurrency: int = 10,
+                 chunk_size: Optional[int] = None):
+        """
+        param connection_id: str referencing a defined connection in the Airflow deployment.
+        param metric_ids: List[int] list of the metric IDs that were run.
+        param submitted_at: float epoch seconds at which the run was submitted.  Earlier metric runs are ignored.
+        param timeout: float seconds to keep polling before firing a timeout event.
+        param poll_interval: float seconds between status polls for metrics that have not settled.
+        param max_concurrency: int maximum number of requests in flight at once.
+        param chunk_size: Optional[int] maximum metric IDs per status request.  All metric IDs are sent in one
+        request if None.
+        """
+        super(RunMetricsTrigger, self).__init__()
+        self.connection_id = connection_id
+        self.metric_ids = metric_ids
+        self.submitted_at = submitted_at
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.max_concurrency = max_concurrency
+        self.chunk_size = chunk_size
+
+    def serialize(self) -> Tuple[str, Dict[str, Any]]:
+        return ("bigeye_airflow.triggers.run_metrics_trigger.RunMetricsTrigger",
+                {"connection_id": self.connection_id,
+                 "metric_ids": self.metric_ids,
+                 "submitted_at": self.submitted_at,
+                 "timeout": self.timeout,
+                 "poll_interval": self.poll_interval,
+                 "max_concurrency": self.max_concurrency,
+                 "chunk_size": self.chunk_size})
+
+    def get_async_client(self) -> AsyncAirflowDatawatchClient:
+        return AsyncAirflowDatawatchClient(self.connection_id, max_concurrency=self.max_concurrency)
+
+    async def run(self) -> AsyncIterator[TriggerEvent]:
+        try:
+            async with self.get_async_client() as client:
+                metric_infos, pending = await self._poll(client)
+        except Exception as e:
+            logging.error(f'Exception polling Bigeye metrics: {str(e)}')
+            yield TriggerEvent({"status": "error", "message": str(e)})
+            return
+
+        event = {"status": "success", "metric_infos": [mi.to_dict() for mi in metric_infos]}
+        if pending:
+            event.update(status="timeout", pending_metric_ids=pending,
+                         message=f'{len(pending)} of {len(self.metric_ids)} metrics had not settled after '
+                                 f'{self.timeout}s.')
+        yield TriggerEvent(event)
+
+    def _settled(self, mi: MetricInfo) -> bool:
+        last_run = max((r.run_at_epoch_seconds for r in mi.latest_metric_runs), default=0)
+        return last_run >= int(self.submitted_at) and mi.status not in PENDING_STATUSES
+
+    async def _get_metric_infos(self, client: AsyncAirflowDatawatchClient, metric_ids: List[int]) -> List[MetricInfo]:
+        responses = await asyncio.gather(*[client.get_metric_info_batch(metric_ids=c)
+                                           for c in chunk_list(metric_ids, self.chunk_size)])
+        return [mi for r in responses for mi in r.metrics]
+
+    async def _poll(self, client: AsyncAirflowDatawatchClient) -> Tuple[List[MetricInfo], List[int]]:
+        """
+        :return: the latest MetricInfo of each metric and the ids of the metrics that had not settled by the timeout.
+        """
+        deadline = time.monotonic() + self.timeout
+        metric_infos: Dict[int, MetricInfo] = {}
+        pending = list(self.metric_ids)
+
+        while True:
+            for mi in await self._get_metric_infos(client, pending):
+                metric_infos[mi.metric_configuration.id] = mi
+            pending = [i for i in pending if i not in metric_infos or not self._settled(metric_infos[i])]
+
+            remaining = deadline - time.monotonic()
+            if not pending or remaining <= 0:
+                break
+            logging.info(f'Waiting on {len(pending)} of {len(self.metric_ids)} Bigeye metrics.')
+            await asyncio.sleep(min(self.poll_interval, remaining))
+
+        if pending:
+            logging.warning(f'{len(pending)} Bigeye metrics had not settled after {self.timeout}s.')
+        return list(metric_infos.values()), pending
@@ -15,13 +15,16 @@ setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/torodata/toro-airflow",
-    packages=find_packages(exclude=['tests', 'astro']),
+    packages=find_packages(exclude=['tests', 'astro', 'benchmarks', 'benchmarks.*']),
     include_package_data=True,
     install_requires=[requirements],
+    extras_require={
+        'tracing': ['opentelemetry-sdk', 'opentelemetry-exporter-otlp-proto-http'],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires='>=3.7',
+    python_requires='>=3.8',
 )
@@ -1,25 +1,29 @@
 from unittest import TestCase
 from unittest.mock import patch, Mock
 
-from bigeye_sdk.datawatch_client import Method
+from bigeye_sdk.client.datawatch_client import Method
 from bigeye_airflow.airflow_datawatch_client import AirflowDatawatchClient
+from bigeye_airflow.airflow_ext.circuit_breaker import CircuitBreaker
 
 
 class TestAirflowDatawatchClient(TestCase):
 
     def setUp(self):
-        self.client = AirflowDatawatchClient("test")
+        self.client = AirflowDatawatchClient("test", circuit_breaker=CircuitBreaker())
 
-    @patch.object(AirflowDatawatchClient, '_call_datawatch', autospec=True)
-    def test_datawatch_run(self, mock_get_run):
-        mock_get_run.return_value = {'metric': 'config'}
-        response = self.client.call_datawatch(method=Method.GET, url="/api/v1/metrics")
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_datawatch_run(self, mock_get_hook):
+        mock_get_hook.return_value.run.return_value = Mock(status_code=200, headers={},
+                                                           json=Mock(return_value={'metric': 'config'}))
+        response = self.client._call_datawatch(method=Method.GET, url="/api/v1/metrics")
         self.assertEqual(response, {'metric': 'config'})
-        mock_get_run.assert_called()
+        mock_get_hook.assert_called_with('GET')
+        self.assertEqual(mock_get_hook.return_value.run.call_args.kwargs['endpoint'], "/api/v1/metrics")
 
-    @patch.object(AirflowDatawatchClient, '_call_datawatch', autospec=True, side_effect=Exception('Test'))
-    def test_datawatch_fail(self, mock_run_fail):
-        with self.assertRaises(Exception):
-            response = self.client.call_datawatch(method=Method.GET, url="/api/v1/metrics")
-            self.assertFalse(response)
-            mock_run_fail.assert_called()
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_datawatch_fail(self, mock_get_hook):
+        mock_get_hook.return_value.run.side_effect = Exception('Test')
+        with self.assertRaises(Exception) as ctx:
+            self.client._call_datawatch(method=Method.GET, url="/api/v1/metrics")
+        self.assertEqual(str(ctx.exception), 'Test')
+        mock_get_hook.return_value.run.assert_called()
@@ -0,0 +1,92 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from airflow.models import Connection
+
+from bigeye_sdk.model.configuration_templates import SimpleUpsertMetricRequest
+
+from bigeye_airflow.airflow_ext.pooled_http_hook import PooledHttpHook
+from bigeye_airflow.async_airflow_datawatch_client import AsyncAirflowDatawatchClient
+
+
+class TestAsyncAirflowDatawatchClient(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = []
+
+        async def get_tables(request):
+            self.requests.append(('GET', request.path))
+            column = {'id': 5, 'name': 'created_at', 'type': 'TIMESTAMP_LIKE'}
+            return web.json_response({'tables': [{'id': 1, 'name': request.query['tableName'], 'warehouseId': 2,
+                                                  'schemaName': request.query['schema'], 'columns': [column],
+                                                  'metricTimeColumn': column}]})
+
+        async def search_metrics(request):
+            self.requests.append(('GET', request.path))
+            return web.json_response([])
+
+        async def upsert_metric(request):
+            self.requests.append(('POST', request.path))
+            return web.json_response({**await request.json(), 'id': 7})
+
+        async def backfill(request):
+            self.requests.append(('POST', request.path, (await request.json())['metricIds']))
+            return web.json_response({})
+
+        async def run_batch(request):
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            body = await request.json()
+            return web.json_response({'metricInfos': [{'metricConfiguration': {'id': i}, 'status': 3}
+                                                      for i in body['metricIds']]})
+
+        app = web.Application()
+        app.router.add_get('/api/v1/tables', get_tables)
+        app.router.add_get('/api/v1/metrics', search_metrics)
+        app.router.add_post('/api/v1/metrics', upsert_metric)
+        app.router.add_post('/api/v1/metrics/backfill', backfill)
+        app.router.add_post('/api/v1/metrics/run/batch', run_batch)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+        connection = Connection(conn_id='test', conn_type='http', host=f'http://127.0.0.1:{self.server.port}',
+                                login='user', password='password')
+        self.patcher = patch.object(PooledHttpHook, 'get_connection', return_value=connection)
+        self.patcher.start()
+
+    async def asyncTearDown(self):
+        self.patcher.stop()
+        await self.server.close()
+
+    async def test_get_tables(self):
+        async with AsyncAirflowDatawatchClient('test') as client:
+            tables = (await client.get_tables(warehouse_id=[2], schema=['s'], table_name=['orders'])).tables
+
+        self.assertEqual(tables[0].name, 'orders')
+        self.assertEqual(tables[0].warehouse_id, 2)
+
+    async def test_concurrency_is_bounded(self):
+        async with AsyncAirflowDatawatchClient('test', max_concurrency=3) as client:
+            responses = await asyncio.gather(*[client.run_metric_batch(metric_ids=[i]) for i in range(1, 13)])
+
+        self.assertEqual([r.metric_infos[0].metric_configuration.id for r in responses], list(range(1, 13)))
+        self.assertLessEqual(self.max_in_flight, 3)
+
+    async def test_upsert_metric_from_simple_template(self):
+        sumr = SimpleUpsertMetricRequest.from_dict({'schema_name': 's', 'table_name': 'orders',
+                                                    'column_name': 'created_at',
+                                                    'metric_template': {'metric_name': 'COUNT_NULL'}})
+        async with AsyncAirflowDatawatchClient('test') as client:
+            metric_id = await client.upsert_metric_from_simple_template(sumr=sumr, target_warehouse_id=2)
+
+        self.assertEqual(metric_id, 7)
+        self.assertEqual(self.requests[:3], [('GET', '/api/v1/tables'), ('GET', '/api/v1/metrics'),
+                                             ('POST', '/api/v1/metrics')])
+        self.assertEqual(client.upsert_counts['created'], 1)
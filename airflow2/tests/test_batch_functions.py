@@ -0,0 +1,125 @@
+import json
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import AsyncMock, patch
+
+from airflow.exceptions import AirflowException
+from bigeye_sdk.generated.com.torodata.models.generated import BatchRunMetricsResponse, MetricInfo, \
+    MetricConfiguration
+
+from bigeye_airflow.airflow_datawatch_client import AirflowDatawatchClient
+from bigeye_airflow.airflow_ext.retry_policy import RetryPolicy
+from bigeye_airflow.async_airflow_datawatch_client import AsyncAirflowDatawatchClient
+from bigeye_airflow.functions.batch_functions import chunk_list
+
+
+def _response(metric_ids):
+    return BatchRunMetricsResponse(metric_infos=[MetricInfo(metric_configuration=MetricConfiguration(id=i))
+                                                 for i in metric_ids])
+
+
+class TestChunkList(TestCase):
+
+    def test_chunk_list(self):
+        self.assertEqual(chunk_list([1, 2, 3, 4, 5], 2), [[1, 2], [3, 4], [5]])
+        self.assertEqual(chunk_list([1, 2, 3], None), [[1, 2, 3]])
+        self.assertEqual(chunk_list([], 2), [])
+
+    def test_negative_chunk_size_rejected(self):
+        with self.assertRaises(ValueError):
+            chunk_list([1, 2, 3], -1)
+
+
+class TestRunMetricBatchChunked(TestCase):
+
+    def setUp(self):
+        self.client = AirflowDatawatchClient("test", retry_policies={'metric_run': RetryPolicy(base_delay=0)})
+
+    @patch.object(AirflowDatawatchClient, 'run_metric_batch')
+    def test_results_merged_in_chunk_order(self, mock_run):
+        mock_run.side_effect = lambda metric_ids: _response(metric_ids)
+
+        response = self.client.run_metric_batch_chunked(metric_ids=list(range(1, 8)), chunk_size=3,
+                                                        max_parallelism=3)
+
+        self.assertEqual([mi.metric_configuration.id for mi in response.metric_infos], list(range(1, 8)))
+        self.assertEqual(mock_run.call_count, 3)
+
+    @patch.object(AirflowDatawatchClient, 'run_metric_batch')
+    def test_only_failed_chunks_retried(self, mock_run):
+        failed_once = set()
+
+        def run(metric_ids):
+            if metric_ids[0] == 3 and 3 not in failed_once:
+                failed_once.add(3)
+                raise AirflowException('502:Bad Gateway')
+            return _response(metric_ids)
+
+        mock_run.side_effect = run
+
+        response = self.client.run_metric_batch_chunked(metric_ids=[1, 2, 3, 4], chunk_size=2, max_parallelism=2)
+
+        self.assertEqual([mi.metric_configuration.id for mi in response.metric_infos], [1, 2, 3, 4])
+        self.assertEqual([c.kwargs['metric_ids'] for c in mock_run.call_args_list].count([1, 2]), 1)
+        self.assertEqual(mock_run.call_count, 3)
+
+    @patch.object(AirflowDatawatchClient, 'run_metric_batch', side_effect=AirflowException('502:Bad Gateway'))
+    def test_raises_when_retries_exhausted(self, mock_run):
+        with self.assertRaises(AirflowException):
+            self.client.run_metric_batch_chunked(metric_ids=[1, 2], chunk_size=1, retries=1)
+        self.assertEqual(mock_run.call_count, 4)
+
+    @patch('bigeye_airflow.airflow_datawatch_client.time.sleep')
+    @patch.object(AirflowDatawatchClient, 'run_metric_batch', side_effect=AirflowException('502:Bad Gateway'))
+    def test_retries_back_off(self, mock_run, mock_sleep):
+        with self.assertRaises(AirflowException):
+            self.client.run_metric_batch_chunked(metric_ids=[1], retries=3,
+                                                 retry_policy=RetryPolicy(base_delay=1.0, max_delay=2.0))
+
+        delays = [c.args[0] for c in mock_sleep.call_args_list]
+        self.assertEqual(len(delays), 3)
+        self.assertTrue(0 <= delays[0] <= 1.0 and all(0 <= d <= 2.0 for d in delays))
+
+
+class TestAsyncRunMetricBatchChunked(IsolatedAsyncioTestCase):
+
+    @patch('bigeye_airflow.async_airflow_datawatch_client.asyncio.sleep', new_callable=AsyncMock)
+    @patch.object(AsyncAirflowDatawatchClient, 'run_metric_batch', new_callable=AsyncMock)
+    async def test_retries_back_off(self, mock_run, mock_sleep):
+        mock_run.side_effect = [AirflowException('502:Bad Gateway'), _response([1])]
+
+        response = await AsyncAirflowDatawatchClient("test").run_metric_batch_chunked(
+            metric_ids=[1], retries=1, retry_policy=RetryPolicy(base_delay=1.0))
+
+        self.assertEqual([mi.metric_configuration.id for mi in response.metric_infos], [1])
+        mock_sleep.assert_awaited_once()
+        self.assertLessEqual(mock_sleep.await_args.args[0], 1.0)
+
+
+class TestCoalescedBackfills(TestCase):
+
+    @patch.object(AirflowDatawatchClient, '_call_datawatch', return_value={})
+    def test_backfills_sent_in_batches_on_exit(self, mock_call):
+        client = AirflowDatawatchClient("test")
+
+        with client.coalesced_backfills(batch_size=2):
+            for i in [1, 2, 2, 3]:
+                self.assertIsNone(client.backfill_metric(metric_ids=[i]))
+            mock_call.assert_not_called()
+
+        self.assertEqual([json.loads(c.kwargs['body'])['metricIds'] for c in mock_call.call_args_list],
+                         [[1, 2], [3]])
+
+        client.backfill_metric(metric_ids=[4])
+        self.assertEqual(mock_call.call_count, 3)
+
+    @patch.object(AirflowDatawatchClient, '_call_datawatch', side_effect=ConnectionError('backfill down'))
+    def test_block_exception_kept_when_backfill_fails(self, mock_call):
+        client = AirflowDatawatchClient("test")
+
+        with self.assertLogs(level='ERROR') as logs, self.assertRaises(ValueError):
+            with client.coalesced_backfills():
+                client.backfill_metric(metric_ids=[1])
+                raise ValueError('upsert failed')
+
+        mock_call.assert_called_once()
+        self.assertIn('backfill down', logs.output[0])
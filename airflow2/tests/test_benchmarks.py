@@ -0,0 +1,109 @@
+import threading
+from unittest import TestCase
+
+import requests
+
+from benchmarks.fake_bigeye_server import FakeServerConfiguration, SyntheticCatalog, make_server
+from benchmarks.parse_benchmark import measure as measure_parse
+from benchmarks.run_benchmarks import ScenarioResult, compare, percentile, run_size
+
+
+class TestFakeBigeyeServer(TestCase):
+
+    def setUp(self):
+        self.server = make_server(FakeServerConfiguration(metrics=25, columns_per_table=5, tables_per_schema=2,
+                                                          padding_tables=1))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_catalog_sized_for_metrics(self):
+        catalog = SyntheticCatalog(FakeServerConfiguration(metrics=25, columns_per_table=5, tables_per_schema=2))
+        configuration = list(catalog.configurations())
+        self.assertEqual(len(configuration), 25)
+        self.assertEqual(catalog.table_count, 5)
+        self.assertEqual(catalog.schema_count, 3)
+        self.assertEqual({c['schema_name'] for c in configuration},
+                         {'bench_schema_0', 'bench_schema_1', 'bench_schema_2'})
+
+    def test_tables_and_dataset_tables(self):
+        tables = requests.get(f'{self.url}/api/v1/tables?warehouseId=1&schema=bench_schema_1&tableName=table_3')
+        self.assertEqual([t['name'] for t in tables.json()['tables']], ['table_3'])
+        self.assertEqual(tables.json()['tables'][0]['metricTimeColumn']['name'], 'created_at')
+
+        datasets = requests.get(f'{self.url}/dataset/tables/1/bench_schema_1').json()
+        # Two configured tables and one padding table.
+        self.assertEqual([d['datasetName'] for d in datasets], ['table_2', 'table_3', 'table_6'])
+
+    def test_metrics_are_stored_and_run(self):
+        created = requests.post(f'{self.url}/api/v1/metrics', json={'datasetId': 2, 'name': 'COUNT_NULL'}).json()
+        requests.post(f'{self.url}/api/v1/metrics', json={'datasetId': 3, 'name': 'COUNT_NULL'})
+
+        found = requests.get(f'{self.url}/api/v1/metrics?warehouseIds=1&tableIds=2').json()
+        self.assertEqual(found, [created])
+
+        run = requests.post(f'{self.url}/api/v1/metrics/run/batch', json={'metricIds': [created['id']]}).json()
+        self.assertEqual(run['metricInfos'][0]['metricConfiguration'], created)
+
+    def test_injected_faults(self):
+        server = make_server(FakeServerConfiguration(metrics=10, throttle_rate=1.0))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            response = requests.get(f'http://127.0.0.1:{server.server_address[1]}/api/v1/metrics')
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response.headers['Retry-After'], '0')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestRunBenchmarks(TestCase):
+
+    def test_percentile(self):
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 50.0)
+        self.assertEqual(percentile(values, 99), 99.0)
+        self.assertEqual(percentile([], 99), 0.0)
+
+    def test_compare_flags_regressions_beyond_tolerance(self):
+        baseline = {'run_metrics/1000': {'seconds': 1.0, 'throughput': 1000.0, 'p99_ms': 20.0,
+                                         'peak_memory_mb': 10.0}}
+        within = ScenarioResult('run_metrics', 1000, 1.1, 909.1, 200, 5.0, 22.0, 11.0)
+        beyond = ScenarioResult('run_metrics', 1000, 2.0, 500.0, 200, 5.0, 40.0, 20.0)
+        too_few_samples = ScenarioResult('run_metrics', 1000, 1.0, 1000.0, 2, 5.0, 40.0, 10.0)
+
+        self.assertEqual(compare([within], baseline, 0.25), [])
+        self.assertEqual(len(compare([beyond], baseline, 0.25)), 3)
+        self.assertEqual(compare([too_few_samples], baseline, 0.25), [])
+
+    def test_compare_ignores_noise(self):
+        baseline = {'get_asset_ix/10': {'seconds': 0.01, 'throughput': 1000.0, 'p99_ms': 2.0, 'peak_memory_mb': 0.1}}
+        # Several times slower, yet by milliseconds.
+        noisy = ScenarioResult('get_asset_ix', 10, 0.04, 250.0, 1, 6.0, 6.0, 0.3)
+
+        self.assertEqual(compare([noisy], baseline, 0.25), [])
+
+    def test_scenarios_run_against_the_fake_server(self):
+        results = run_size(FakeServerConfiguration(metrics=10), ['create_metrics', 'run_metrics', 'get_asset_ix'],
+                           max_parallelism=2, chunk_size=5, trace_memory=False)
+
+        self.assertEqual([r.scenario for r in results], ['create_metrics', 'run_metrics', 'get_asset_ix'])
+        for r in results:
+            self.assertEqual(r.errors, [])
+            self.assertGreater(r.requests, 0)
+        # Two chunks of five metrics.
+        self.assertEqual(results[1].requests, 2)
+
+
+class TestParseBenchmark(TestCase):
+
+    def test_measure(self):
+        result = measure_parse(100, repeat=1)
+
+        self.assertEqual(result.configurations, 100)
+        self.assertFalse(result.sdk_imported)
+        self.assertGreater(result.import_ms, 0)
+        self.assertGreater(result.execute_parse_ms, result.cached_parse_ms)
@@ -0,0 +1,123 @@
+import json
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from bigeye_airflow.bigeye_requests import catalog_requests
+from bigeye_airflow.models.catalog import CatalogSchema, CatalogTable
+from bigeye_airflow.models.configurations import CreateMetricConfiguration
+
+
+def _table(table_id, name, fields):
+    return {"id": table_id, "datasetName": name, "entityType": "TABLE", "partitionField": None,
+            "fields": [{"id": table_id * 100 + i, "fieldName": f, "type": t, "metricTimeField": mt,
+                        "canBeMetricTime": mt, "entityId": i}
+                       for i, (f, t, mt) in enumerate(fields)]}
+
+
+class TestCatalogModel(TestCase):
+
+    def test_case_insensitive_lookups(self):
+        schema = CatalogSchema.from_dicts('PUBLIC', [
+            _table(1, 'Orders', [('Created_At', 'TIMESTAMP_LIKE', True), ('amount', 'NUMERIC', False)]),
+            _table(2, 'customers', [('name', 'STRING', False)])])
+
+        orders = schema.get_table('ORDERS')
+        self.assertEqual(orders.id, 1)
+        self.assertEqual(orders.get_field('created_at').type, 'TIMESTAMP_LIKE')
+        self.assertTrue(orders.get_field('CREATED_AT').can_be_metric_time)
+        self.assertIsNone(orders.get_field('missing'))
+        self.assertTrue(orders.has_metric_time)
+        self.assertFalse(schema.get_table('Customers').has_metric_time)
+        self.assertIsNone(schema.get_table('missing'))
+        self.assertFalse(hasattr(orders.get_field('amount'), '__dict__'))
+
+    def test_field_ix_built_on_first_access(self):
+        table = CatalogTable.from_dict(_table(1, 'Orders', [('Created_At', 'TIMESTAMP_LIKE', True)]))
+        self.assertIsNone(table._field_ix)
+
+        self.assertEqual(list(table.field_ix), ['created_at'])
+        self.assertIs(table.field_ix, table.field_ix)
+        with self.assertRaises(TypeError):
+            table.field_ix['x'] = None
+
+    def test_mapping_interface(self):
+        schema = CatalogSchema.from_dicts('PUBLIC', [
+            _table(1, 'Orders', [('Created_At', 'TIMESTAMP_LIKE', True)])])
+
+        self.assertEqual(list(schema), ['orders'])
+        self.assertIn('ORDERS', schema)
+        self.assertNotIn('missing', schema)
+        self.assertIsNone(schema.get('missing'))
+        self.assertIs(schema['Orders'], schema.get_table('orders'))
+        self.assertEqual(schema['orders']['id'], 1)
+        self.assertEqual(schema['orders']['datasetName'], 'Orders')
+        field = schema['orders']['fields']['created_at']
+        self.assertEqual((field['fieldName'], field['type'], field['metricTimeField']),
+                         ('Created_At', 'TIMESTAMP_LIKE', True))
+        self.assertEqual(dict(field)['canBeMetricTime'], True)
+        with self.assertRaises(KeyError):
+            schema['orders']['partitionField']
+
+    def test_fields_converted_on_first_access(self):
+        table = CatalogTable.from_dict(_table(1, 'Orders', [('id', 'NUMERIC', False)]))
+        self.assertIsInstance(table._fields, list)
+
+        self.assertEqual(table.get_field('ID').id, 100)
+        self.assertIsInstance(table._fields, tuple)
+        self.assertIs(table.fields, table.fields)
+
+    def test_types_interned(self):
+        a = CatalogTable.from_dict(json.loads(json.dumps(_table(1, 'a', [('x', 'STRING', False)]))))
+        b = CatalogTable.from_dict(json.loads(json.dumps(_table(2, 'b', [('y', 'STRING', False)]))))
+        self.assertIs(a.fields[0].type, b.fields[0].type)
+
+
+class TestGetAssetIx(TestCase):
+
+    @patch.object(catalog_requests, 'get_catalog_cache', return_value=None)
+    @patch.object(catalog_requests, 'get_hook')
+    def test_only_referenced_tables_kept(self, mock_get_hook, mock_cache):
+        body = json.dumps([_table(1, 'Orders', [('id', 'NUMERIC', False)]),
+                           _table(2, 'other', [('id', 'NUMERIC', False)])]).encode('utf-8')
+        mock_get_hook.return_value.run.return_value = Mock(iter_content=Mock(return_value=[body[:10], body[10:]]))
+        conf = [CreateMetricConfiguration(table_name='ORDERS', schema_name='Public', column_name='id',
+                                          metric_name='COUNT_NULL')]
+
+        ix = catalog_requests.get_asset_ix('bigeye', 1, conf)
+
+        self.assertEqual(list(ix), ['public'])
+        self.assertEqual(ix['public'].get_table('orders').id, 1)
+        self.assertEqual(len(ix['public']), 1)
+
+    @patch.object(catalog_requests, '_get_schema_catalog')
+    def test_schemas_fetched_concurrently_with_errors(self, mock_get_schema):
+        def get_schema(connection_id, warehouse_id, schema_name, table_names):
+            if schema_name == 'bad':
+                raise Exception('404:Not Found')
+            return CatalogSchema(schema_name, [])
+
+        mock_get_schema.side_effect = get_schema
+        conf = [CreateMetricConfiguration(table_name='t', schema_name=sn, column_name='id', metric_name='COUNT_NULL')
+                for sn in ['A', 'bad', 'c', 'A']]
+
+        ix = catalog_requests.get_asset_ix('bigeye', 1, conf, max_parallelism=3)
+
+        self.assertEqual(sorted(ix), ['a', 'c'])
+        self.assertEqual(list(ix.errors), ['bad'])
+        self.assertEqual(mock_get_schema.call_count, 3)
+
+    @patch.object(catalog_requests, '_get_schema_catalog')
+    def test_schema_spellings_fetched_once(self, mock_get_schema):
+        def get_schema(connection_id, warehouse_id, schema_name, table_names):
+            return CatalogSchema.from_dicts(schema_name, [_table(1, 'a', []), _table(2, 'b', [])][:len(table_names)])
+
+        mock_get_schema.side_effect = get_schema
+        conf = [CreateMetricConfiguration(table_name=tn, schema_name=sn, column_name='id', metric_name='COUNT_NULL')
+                for sn, tn in [('PUBLIC', 'a'), ('public', 'B')]]
+
+        ix = catalog_requests.get_asset_ix('bigeye', 1, conf)
+
+        mock_get_schema.assert_called_once_with('bigeye', 1, 'PUBLIC', {'a', 'b'})
+        self.assertEqual(list(ix), ['public'])
+        self.assertEqual(ix['public'].get_table('a').id, 1)
+        self.assertEqual(ix['public'].get_table('b').id, 2)
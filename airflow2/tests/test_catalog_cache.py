@@ -0,0 +1,73 @@
+import json
+import tempfile
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from bigeye_sdk.generated.com.torodata.models.generated import Table, TableList
+
+from bigeye_airflow.airflow_datawatch_client import AirflowDatawatchClient
+from bigeye_airflow.airflow_ext.catalog_cache import CatalogCache
+
+
+def _response(body, status_code=200, etag=None):
+    content = json.dumps(body).encode('utf-8') if body is not None else b''
+    return Mock(status_code=status_code, content=content, json=Mock(return_value=body),
+                headers={'ETag': etag} if etag else {})
+
+
+class TestCatalogCache(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = CatalogCache(self.dir.name, ttl_seconds=60)
+        self.key = CatalogCache.key('bigeye', 1, 'public')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_fresh_entry_served_without_request(self):
+        request = Mock(return_value=_response([{'id': 1}], etag='"v1"'))
+
+        self.assertEqual(self.cache.fetch_json(self.key, request), [{'id': 1}])
+        self.assertEqual(CatalogCache(self.dir.name).fetch_json(self.key, request), [{'id': 1}])
+        request.assert_called_once_with({})
+
+    def test_stale_entry_revalidated(self):
+        self.cache.put(self.key, b'[{"id": 1}]', etag='"v1"', last_modified='Mon, 01 Jan 2024 00:00:00 GMT')
+        self.cache.ttl_seconds = 0
+        request = Mock(return_value=_response(None, status_code=304))
+
+        self.assertEqual(self.cache.fetch_json(self.key, request), [{'id': 1}])
+        request.assert_called_once_with({'If-None-Match': '"v1"',
+                                         'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+
+        request.return_value = _response([{'id': 2}], etag='"v2"')
+        self.assertEqual(self.cache.fetch_json(self.key, request), [{'id': 2}])
+        self.assertEqual(self.cache.get(self.key).etag, '"v2"')
+
+    def test_least_recently_used_evicted(self):
+        self.cache.max_bytes = 10
+        self.cache.put('a', b'12345')
+        self.cache.put('b', b'12345')
+        self.cache.get('a')
+        self.cache.put('c', b'12345')
+
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+
+class TestClientGetTablesCached(TestCase):
+
+    def test_schema_listing_cached_and_filtered(self):
+        with tempfile.TemporaryDirectory() as d:
+            listing = TableList(tables=[Table(id=1, name='Orders'), Table(id=2, name='customers')]).to_dict()
+            client = AirflowDatawatchClient('test', catalog_cache=CatalogCache(d))
+            with patch.object(AirflowDatawatchClient, '_get_hook') as mock_get_hook:
+                mock_get_hook.return_value.run.return_value = _response(listing)
+
+                for name in ['orders', 'CUSTOMERS']:
+                    tables = client.get_tables(warehouse_id=[1], schema=['public'], table_name=[name]).tables
+                    self.assertEqual([t.name.lower() for t in tables], [name.lower()])
+
+                mock_get_hook.return_value.run.assert_called_once()
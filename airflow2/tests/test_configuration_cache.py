@@ -0,0 +1,57 @@
+from unittest import TestCase
+
+from airflow.exceptions import AirflowException
+
+from bigeye_airflow.airflow_ext.configuration_cache import ConfigurationCache, configuration_key
+
+
+def _configuration(column):
+    return {"schema_name": "s", "table_name": "t", "column_name": column,
+            "metric_template": {"metric_name": "COUNT_NULL"}}
+
+
+class TestConfigurationCache(TestCase):
+
+    def test_key_ignores_key_order(self):
+        self.assertEqual(configuration_key({'a': 1, 'b': {'c': 2, 'd': 3}}),
+                         configuration_key({'b': {'d': 3, 'c': 2}, 'a': 1}))
+        self.assertNotEqual(configuration_key(_configuration('c1')), configuration_key(_configuration('c2')))
+
+    def test_materialize_parses_once_per_configuration(self):
+        cache = ConfigurationCache()
+
+        first = cache.materialize([_configuration('c1'), _configuration('c2'), _configuration('c1')])
+        second = cache.materialize([_configuration('c2')])
+
+        self.assertEqual([s.column_name for s in first], ['c1', 'c2', 'c1'])
+        self.assertEqual(first[0].metric_template.metric_name, 'COUNT_NULL')
+        self.assertIs(first[0], first[2])
+        self.assertIs(second[0], first[1])
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.size), (2, 2, 2))
+
+    def test_invalid_configurations_listed(self):
+        cache = ConfigurationCache()
+        configuration = [_configuration('c1'), {"schema_name": "s", "table_name": "t", "column_name": "c2"},
+                         'not a dict']
+
+        for _ in range(2):
+            with self.assertRaises(AirflowException) as ctx:
+                cache.materialize(configuration)
+            self.assertIn('2 of 3', str(ctx.exception))
+            self.assertIn('1 s.t.c2: KeyError', str(ctx.exception))
+            self.assertIn('2 str: expected a dict', str(ctx.exception))
+
+        self.assertEqual(cache.stats().misses, 2)
+
+    def test_least_recently_used_evicted(self):
+        cache = ConfigurationCache(max_size=2)
+
+        cache.materialize([_configuration('c1'), _configuration('c2')])
+        cache.materialize([_configuration('c1'), _configuration('c3')])
+        cache.materialize([_configuration('c1')])
+
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.size), (2, 3, 2))
+        cache.invalidate()
+        self.assertEqual(cache.stats().size, 0)
@@ -0,0 +1,38 @@
+from unittest import TestCase
+from unittest.mock import patch, Mock
+
+from bigeye_airflow.airflow_ext.connection_cache import ConnectionCache
+
+
+class TestConnectionCache(TestCase):
+
+    def test_hit_within_ttl(self):
+        cache = ConnectionCache(ttl_seconds=60)
+        loader = Mock(return_value='conn')
+
+        self.assertEqual(cache.get('bigeye', loader), 'conn')
+        self.assertEqual(cache.get('bigeye', loader), 'conn')
+
+        loader.assert_called_once_with('bigeye')
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.size), (1, 1, 1))
+
+    def test_reload_after_ttl(self):
+        cache = ConnectionCache(ttl_seconds=10)
+        loader = Mock(side_effect=['old', 'new'])
+
+        with patch('bigeye_airflow.airflow_ext.connection_cache.time.monotonic', side_effect=[0, 0, 11, 11]):
+            self.assertEqual(cache.get('bigeye', loader), 'old')
+            self.assertEqual(cache.get('bigeye', loader), 'new')
+
+        self.assertEqual(cache.stats().misses, 2)
+
+    def test_invalidate(self):
+        cache = ConnectionCache(ttl_seconds=60)
+        loader = Mock(side_effect=['old', 'new'])
+
+        cache.get('bigeye', loader)
+        cache.invalidate('bigeye')
+
+        self.assertEqual(cache.get('bigeye', loader), 'new')
+        self.assertEqual(loader.call_count, 2)
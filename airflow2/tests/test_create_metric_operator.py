@@ -0,0 +1,119 @@
+import subprocess
+import sys
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from airflow.exceptions import AirflowException
+
+from bigeye_airflow.airflow_datawatch_client import AirflowDatawatchClient
+from bigeye_airflow.operators.create_metric_operator import CreateMetricOperator
+
+
+def _configuration(tables):
+    return [{"schema_name": "demo.public", "table_name": t, "column_name": f"col_{i}",
+             "metric_template": {"metric_name": "COUNT_NULL"}}
+            for i, t in enumerate(tables)]
+
+
+class TestCreateMetricOperator(TestCase):
+
+    def _operator(self, tables, **kwargs):
+        return CreateMetricOperator(task_id="create", connection_id="test", warehouse_id=1,
+                                    configuration=_configuration(tables), **kwargs)
+
+    @patch.object(AirflowDatawatchClient, 'upsert_metric_from_simple_template')
+    def test_parallel_results_in_input_order(self, mock_upsert):
+        def upsert(sumr, target_warehouse_id):
+            i = int(sumr.column_name.split('_')[1])
+            time.sleep(0.01 * (5 - i))
+            return i + 100
+
+        mock_upsert.side_effect = upsert
+
+        result = self._operator(['a', 'b', 'c', 'd', 'e'], max_parallelism=5).execute({})
+
+        self.assertEqual(result, [100, 101, 102, 103, 104])
+
+    @patch.object(AirflowDatawatchClient, 'upsert_metric_from_simple_template')
+    def test_errors_collected(self, mock_upsert):
+        attempted = []
+
+        def upsert(sumr, target_warehouse_id):
+            attempted.append(sumr.column_name)
+            if sumr.column_name in ('col_0', 'col_2'):
+                raise AirflowException('400:Bad Request')
+            return 1
+
+        mock_upsert.side_effect = upsert
+
+        with self.assertRaises(AirflowException) as ctx:
+            self._operator(['a', 'b', 'c'], max_parallelism=2).execute({})
+
+        self.assertEqual(sorted(attempted), ['col_0', 'col_1', 'col_2'])
+        self.assertIn('2 of 3', str(ctx.exception))
+        self.assertIn('demo.public.c.col_2', str(ctx.exception))
+
+    @patch.object(AirflowDatawatchClient, 'upsert_metric_from_simple_template')
+    def test_empty_configuration(self, mock_upsert):
+        for kwargs in [{}, {'max_parallelism': 4}, {'max_parallelism': 4, 'serialize_by_table': True}]:
+            self.assertEqual(self._operator([], **kwargs).execute({}), [])
+        mock_upsert.assert_not_called()
+
+    @patch.object(AirflowDatawatchClient, 'upsert_metric_from_simple_template', return_value=1)
+    def test_cache_stats_logged(self, mock_upsert):
+        with self.assertLogs(level='INFO') as logs:
+            self._operator(['a']).execute({})
+
+        self.assertTrue(any('Bigeye connection cache:' in m for m in logs.output))
+        self.assertTrue(any('Bigeye configuration cache:' in m for m in logs.output))
+
+    @patch.object(AirflowDatawatchClient, 'upsert_metric_from_simple_template')
+    def test_invalid_configuration_fails_at_execute(self, mock_upsert):
+        configuration = _configuration(['a', 'b']) + [{"schema_name": "demo.public", "table_name": "c"}]
+        operator = CreateMetricOperator(task_id="create", connection_id="test", warehouse_id=1,
+                                        configuration=configuration)
+        self.assertIs(operator.configuration, configuration)
+
+        with self.assertRaises(AirflowException) as ctx:
+            operator.execute({})
+
+        self.assertIn('1 of 3', str(ctx.exception))
+        self.assertIn('demo.public.c.?', str(ctx.exception))
+        mock_upsert.assert_not_called()
+
+    def test_import_leaves_out_the_sdk(self):
+        # In a fresh interpreter: this one has imported the SDK already.
+        code = ("import sys\n"
+                "from bigeye_airflow.operators.create_metric_operator import CreateMetricOperator\n"
+                "from bigeye_airflow.operators.run_metrics_operator import RunMetricsOperator\n"
+                "CreateMetricOperator(task_id='create', connection_id='test', warehouse_id=1,\n"
+                "                     configuration=[{'schema_name': 's'}])\n"
+                "print(sorted(m for m in sys.modules if m.split('.')[0] in ('bigeye_sdk', 'aiohttp')))\n")
+        out = subprocess.run([sys.executable, '-W', 'ignore', '-c', code], check=True, stdout=subprocess.PIPE,
+                             universal_newlines=True).stdout
+
+        self.assertEqual(out.strip().splitlines()[-1], '[]')
+
+    @patch.object(AirflowDatawatchClient, 'upsert_metric_from_simple_template')
+    def test_serialize_by_table(self, mock_upsert):
+        lock = threading.Lock()
+        in_flight = {}
+        overlapped = []
+
+        def upsert(sumr, target_warehouse_id):
+            with lock:
+                in_flight[sumr.table_name] = in_flight.get(sumr.table_name, 0) + 1
+                overlapped.append(in_flight[sumr.table_name] > 1)
+            time.sleep(0.01)
+            with lock:
+                in_flight[sumr.table_name] -= 1
+            return sumr.column_name
+
+        mock_upsert.side_effect = upsert
+
+        result = self._operator(['a', 'A', 'b', 'a', 'b'], max_parallelism=4, serialize_by_table=True).execute({})
+
+        self.assertEqual(result, ['col_0', 'col_1', 'col_2', 'col_3', 'col_4'])
+        self.assertFalse(any(overlapped))
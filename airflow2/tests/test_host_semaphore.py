@@ -0,0 +1,72 @@
+import multiprocessing
+import tempfile
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from bigeye_airflow.airflow_datawatch_client import AirflowDatawatchClient
+from bigeye_airflow.airflow_ext.host_semaphore import HostSemaphore
+from bigeye_airflow.airflow_ext.rate_limiter import AdaptiveRateLimiter
+
+
+def _hold_slot(directory, held, release):
+    s = HostSemaphore('bigeye/prod', 2, directory=directory)
+    handle = s.acquire()
+    held.set()
+    release.wait(5)
+    s.release(handle)
+
+
+class TestHostSemaphore(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_slots_shared_across_processes(self):
+        ctx = multiprocessing.get_context('spawn')
+        held, release = ctx.Event(), ctx.Event()
+        p = ctx.Process(target=_hold_slot, args=(self.dir.name, held, release))
+        p.start()
+        try:
+            self.assertTrue(held.wait(30))
+            s = HostSemaphore('bigeye/prod', 2, directory=self.dir.name, poll_interval=0.01)
+            handle = s.acquire(timeout=1)
+            with self.assertRaises(TimeoutError):
+                s.acquire(timeout=0.1)
+
+            release.set()
+            p.join(10)
+            s.release(s.acquire(timeout=1))
+            s.release(handle)
+        finally:
+            release.set()
+            p.join(10)
+
+    def test_slot_freed_when_process_dies(self):
+        ctx = multiprocessing.get_context('spawn')
+        held, release = ctx.Event(), ctx.Event()
+        p = ctx.Process(target=_hold_slot, args=(self.dir.name, held, release))
+        p.start()
+        self.assertTrue(held.wait(30))
+        p.kill()
+        p.join(10)
+
+        s = HostSemaphore('bigeye/prod', 1, directory=self.dir.name)
+        s.release(s.acquire(timeout=1))
+
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_client_requests_hold_a_slot(self, mock_get_hook):
+        semaphore = HostSemaphore('test', 1, directory=self.dir.name)
+
+        def run(**kwargs):
+            with self.assertRaises(TimeoutError):
+                semaphore.acquire(timeout=0)
+            return Mock(status_code=200, json=Mock(return_value={}))
+
+        mock_get_hook.return_value.run.side_effect = run
+        client = AirflowDatawatchClient('test', rate_limiter=AdaptiveRateLimiter(), host_semaphore=semaphore)
+
+        client._call_datawatch_impl(Mock(name='GET'), '/api/v1/tables')
+        semaphore.release(semaphore.acquire(timeout=0))
@@ -0,0 +1,27 @@
+import json
+from unittest import TestCase
+
+from bigeye_airflow.functions.json_functions import iter_json_array
+
+
+def _chunks(body: bytes, size: int):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+class TestIterJsonArray(TestCase):
+
+    def test_elements_split_across_chunks(self):
+        elements = [{"id": i, "datasetName": f"tåble_{i}", "fields": [{"fieldName": "ü", "nested": [1, 2]}]}
+                    for i in range(5)]
+        body = json.dumps(elements, ensure_ascii=False, indent=1).encode('utf-8')
+
+        for size in [1, 3, 7, 64, len(body)]:
+            self.assertEqual(list(iter_json_array(_chunks(body, size))), elements)
+
+    def test_empty_array(self):
+        self.assertEqual(list(iter_json_array([b' [ ', b'] '])), [])
+
+    def test_invalid_bodies(self):
+        for body in [b'{"tables": []}', b'[{"id": 1}, {"id":', b'[{"id": 1}']:
+            with self.assertRaises(ValueError):
+                list(iter_json_array(_chunks(body, 4)))
@@ -0,0 +1,101 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from bigeye_sdk.generated.com.torodata.models.generated import MetricConfiguration, MetricType, \
+    PredefinedMetric, PredefinedMetricName, MetricParameter, Table, TimeInterval, TimeIntervalType
+
+from bigeye_airflow.airflow_datawatch_client import AirflowDatawatchClient
+from bigeye_airflow.functions.metric_functions import MetricIndex, get_metric_configuration_identity, \
+    get_metric_fingerprint, metric_identity
+
+
+def _metric(metric_id, metric_name: PredefinedMetricName, column_name, group_bys=None, dataset_id=10):
+    return MetricConfiguration(id=metric_id,
+                               name=metric_name.name,
+                               dataset_id=dataset_id,
+                               metric_type=MetricType(predefined_metric=PredefinedMetric(metric_name=metric_name)),
+                               parameters=[MetricParameter(key='arg1', column_name=column_name)],
+                               group_bys=group_bys or [])
+
+
+class TestMetricIndex(TestCase):
+
+    def test_identity_lookup(self):
+        ix = MetricIndex([_metric(1, PredefinedMetricName.COUNT_NULL, 'Col_A'),
+                          _metric(2, PredefinedMetricName.COUNT_NULL, 'col_a'),
+                          _metric(3, PredefinedMetricName.COUNT_NULL, 'col_a', group_bys=['Region']),
+                          _metric(4, PredefinedMetricName.HOURS_SINCE_MAX_DATE, 'updated_at')],
+                         get_metric_configuration_identity)
+
+        self.assertEqual(ix.get(metric_identity('COUNT_NULL', 'COUNT_NULL', 'COL_A', [], [])).id, 1)
+        self.assertEqual(ix.get(metric_identity('COUNT_NULL', 'COUNT_NULL', 'col_a', ['REGION'], [])).id, 3)
+        self.assertEqual(ix.get(metric_identity('HOURS_SINCE_MAX_TIMESTAMP', 'HOURS_SINCE_MAX_DATE', 'updated_at', [], [])).id, 4)
+        self.assertIsNone(ix.get(metric_identity('COUNT_ROWS', 'COUNT_ROWS', 'col_a', [], [])))
+        self.assertEqual(len(ix), 3)
+
+
+class TestClientGetExistingMetric(TestCase):
+
+    @patch.object(AirflowDatawatchClient, 'search_metric_configuration')
+    def test_metrics_searched_once_per_table(self, mock_search):
+        mock_search.return_value = [_metric(1, PredefinedMetricName.COUNT_NULL, 'col_a')]
+        client = AirflowDatawatchClient('test')
+        table = Table(id=10)
+
+        for _ in range(3):
+            m = client.get_existing_metric(warehouse_id=1, table=table, column_name='COL_A', user_defined_name='COUNT_NULL',
+                                           metric_name='COUNT_NULL', group_by=[], filters=[])
+            self.assertEqual(m.id, 1)
+
+        self.assertIsNone(client.get_existing_metric(warehouse_id=1, table=table, column_name='col_b',
+                                                     user_defined_name='COUNT_NULL', metric_name='COUNT_NULL',
+                                                     group_by=[], filters=[]))
+        mock_search.assert_called_once_with(warehouse_ids=[1], table_ids=[10])
+
+    @patch.object(AirflowDatawatchClient, 'search_metric_configuration', return_value=[])
+    @patch.object(AirflowDatawatchClient, '_call_datawatch')
+    def test_upsert_updates_index(self, mock_call, mock_search):
+        mock_call.return_value = _metric(7, PredefinedMetricName.COUNT_NULL, 'col_a').to_dict()
+        client = AirflowDatawatchClient('test')
+        table = Table(id=10)
+
+        self.assertIsNone(client.get_existing_metric(warehouse_id=1, table=table, column_name='col_a',
+                                                     user_defined_name='COUNT_NULL', metric_name='COUNT_NULL',
+                                                     group_by=[], filters=[]))
+        client.upsert_metric(metric_configuration=_metric(0, PredefinedMetricName.COUNT_NULL, 'col_a'))
+
+        m = client.get_existing_metric(warehouse_id=1, table=table, column_name='col_a', user_defined_name='COUNT_NULL',
+                                       metric_name='COUNT_NULL', group_by=[], filters=[])
+        self.assertEqual(m.id, 7)
+
+    @patch.object(AirflowDatawatchClient, '_call_datawatch')
+    def test_unchanged_upsert_skipped(self, mock_call):
+        existing = _metric(7, PredefinedMetricName.COUNT_NULL, 'col_a')
+        existing.schedule_frequency = TimeInterval(interval_type=TimeIntervalType.HOURS_TIME_INTERVAL_TYPE,
+                                                   interval_value=2)
+        client = AirflowDatawatchClient('test')
+
+        with patch.object(AirflowDatawatchClient, 'search_metric_configuration', return_value=[existing]):
+            desired = client.get_existing_metric(warehouse_id=1, table=Table(id=10), column_name='col_a',
+                                                 user_defined_name='COUNT_NULL', metric_name='COUNT_NULL',
+                                                 group_by=[], filters=[])
+
+        self.assertEqual(client.upsert_metric(metric_configuration=desired).id, 7)
+        mock_call.assert_not_called()
+
+        desired.schedule_frequency = TimeInterval(interval_type=TimeIntervalType.HOURS_TIME_INTERVAL_TYPE,
+                                                  interval_value=4)
+        mock_call.return_value = desired.to_dict()
+        client.upsert_metric(metric_configuration=desired)
+        client.upsert_metric(metric_configuration=_metric(0, PredefinedMetricName.COUNT_ROWS, 'col_a'))
+
+        self.assertEqual(mock_call.call_count, 2)
+        self.assertEqual(dict(client.upsert_counts), {'created': 1, 'updated': 1, 'unchanged': 1})
+
+    def test_fingerprint_ignores_identity_and_order(self):
+        a = _metric(1, PredefinedMetricName.COUNT_NULL, 'col_a')
+        b = _metric(2, PredefinedMetricName.COUNT_NULL, 'col_b', dataset_id=11)
+        self.assertEqual(get_metric_fingerprint(a), get_metric_fingerprint(b))
+
+        b.lookback = TimeInterval(interval_type=TimeIntervalType.DAYS_TIME_INTERVAL_TYPE, interval_value=3)
+        self.assertNotEqual(get_metric_fingerprint(a), get_metric_fingerprint(b))
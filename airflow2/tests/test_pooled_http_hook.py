@@ -0,0 +1,111 @@
+import threading
+from unittest import TestCase
+from unittest.mock import patch, Mock
+
+import requests
+from airflow.models import Connection
+from airflow.providers.http.hooks.http import HttpHook
+
+from bigeye_airflow.airflow_ext.connection_cache import connection_cache
+from bigeye_airflow.airflow_ext.pooled_http_hook import PooledHttpHook, SessionPoolConfiguration, \
+    close_pooled_sessions
+
+connection = Connection(conn_id='test', conn_type='http', host='https://app.bigeye.com', login='user',
+                        password='password')
+
+
+@patch.object(HttpHook, 'get_connection', return_value=connection)
+class TestPooledHttpHook(TestCase):
+
+    def tearDown(self):
+        close_pooled_sessions()
+        connection_cache.invalidate()
+
+    def test_session_reused_across_hooks(self, mock_get_connection):
+        first = PooledHttpHook(http_conn_id='test', method='GET').get_conn()
+        second = PooledHttpHook(http_conn_id='test', method='POST').get_conn()
+
+        self.assertIs(first, second)
+        mock_get_connection.assert_called_once()
+
+    def test_base_url_restored_for_new_hook(self, mock_get_connection):
+        PooledHttpHook(http_conn_id='test', method='GET').get_conn()
+        hook = PooledHttpHook(http_conn_id='test', method='GET')
+        hook.get_conn()
+
+        self.assertEqual(hook.base_url, 'https://app.bigeye.com')
+
+    def test_adapter_uses_pool_conf(self, mock_get_connection):
+        conf = SessionPoolConfiguration(pool_connections=2, pool_maxsize=32)
+        session = PooledHttpHook(http_conn_id='test', method='GET', pool_conf=conf).get_conn()
+        adapter = session.get_adapter('https://app.bigeye.com/api/v1/metrics')
+
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertEqual(adapter._pool_maxsize, 32)
+
+    def test_session_refreshed_when_connection_reloaded(self, mock_get_connection):
+        first = PooledHttpHook(http_conn_id='test', method='GET').get_conn()
+        mock_get_connection.return_value = Connection(conn_id='test', conn_type='http',
+                                                      host='https://other.bigeye.com', login='user',
+                                                      password='rotated')
+        connection_cache.invalidate('test')
+        hook = PooledHttpHook(http_conn_id='test', method='GET')
+        second = hook.get_conn()
+
+        self.assertIs(first, second)
+        self.assertEqual(hook.base_url, 'https://other.bigeye.com')
+        with patch.object(PooledHttpHook, 'run_and_check', return_value=Mock(status_code=200)) as mock_run:
+            hook.run('api/v1/metrics')
+        self.assertEqual(mock_run.call_args[0][1].headers['Authorization'],
+                         requests.auth._basic_auth_str('user', 'rotated'))
+
+    def test_close_pooled_sessions(self, mock_get_connection):
+        first = PooledHttpHook(http_conn_id='test', method='GET').get_conn()
+        close_pooled_sessions('test')
+        second = PooledHttpHook(http_conn_id='test', method='GET').get_conn()
+
+        self.assertIsNot(first, second)
+
+    def test_run_applies_default_timeout(self, mock_get_connection):
+        conf = SessionPoolConfiguration(connect_timeout=1.0, read_timeout=2.0)
+        hook = PooledHttpHook(http_conn_id='test', method='GET', pool_conf=conf)
+
+        with patch.object(PooledHttpHook, 'run_and_check', return_value=Mock(status_code=200)) as mock_run:
+            hook.run('api/v1/metrics')
+
+        session, prepped_request, extra_options = mock_run.call_args[0]
+        self.assertEqual(prepped_request.url, 'https://app.bigeye.com/api/v1/metrics')
+        self.assertEqual(extra_options['timeout'], (1.0, 2.0))
+
+    def test_connection_headers_sent_per_request(self, mock_get_connection):
+        mock_get_connection.return_value = Connection(conn_id='test', conn_type='http', host='https://app.bigeye.com',
+                                                      extra='{"X-Tenant": "acme"}')
+        hook = PooledHttpHook(http_conn_id='test', method='GET')
+
+        with patch.object(PooledHttpHook, 'run_and_check', return_value=Mock(status_code=200)) as mock_run:
+            hook.run('api/v1/metrics', headers={'Accept': 'application/json'})
+
+        session, prepped_request, _ = mock_run.call_args[0]
+        self.assertEqual(prepped_request.headers['X-Tenant'], 'acme')
+        self.assertEqual(prepped_request.headers['Accept'], 'application/json')
+        self.assertNotIn('X-Tenant', session.headers)
+        self.assertIsNone(session.auth)
+
+    def test_slow_connection_does_not_block_others(self, mock_get_connection):
+        released = threading.Event()
+        get_conn = HttpHook.get_conn
+
+        def slow_get_conn(hook, headers=None):
+            if hook.http_conn_id == 'slow':
+                released.wait(5)
+            return get_conn(hook, headers)
+
+        with patch.object(HttpHook, 'get_conn', slow_get_conn):
+            slow = threading.Thread(target=PooledHttpHook(http_conn_id='slow', method='GET').get_conn)
+            slow.start()
+            try:
+                PooledHttpHook(http_conn_id='test', method='GET').get_conn()
+                self.assertTrue(slow.is_alive())
+            finally:
+                released.set()
+                slow.join()
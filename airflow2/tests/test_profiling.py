@@ -0,0 +1,105 @@
+import glob
+import os
+import pstats
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest.mock import patch
+
+from bigeye_airflow.airflow_datawatch_client import AirflowDatawatchClient
+from bigeye_airflow.airflow_ext import profiling
+from bigeye_airflow.airflow_ext.profiling import profiled
+from bigeye_airflow.operators.create_metric_operator import CreateMetricOperator
+from bigeye_airflow.operators.run_metrics_operator import RunMetricsOperator
+
+
+def _busy_on_a_pool_thread(seconds: float = 0.2):
+    def spin():
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            sum(range(100))
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(spin).result()
+
+
+class TestProfiled(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _artifacts(self, suffix):
+        return glob.glob(os.path.join(self.tmp.name, f'*.{suffix}'))
+
+    def test_disabled_by_default(self):
+        with profiled('dag.task', output_dir=self.tmp.name):
+            _busy_on_a_pool_thread(0.01)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_cprofile_includes_pool_threads(self):
+        with self.assertLogs(level='INFO') as logs:
+            with profiled('dag.task', 'cprofile', self.tmp.name):
+                _busy_on_a_pool_thread()
+
+        [path] = self._artifacts('pstats')
+        functions = {f[2] for f in pstats.Stats(path).stats}
+        self.assertIn('spin', functions)
+        self.assertEqual(len(self._artifacts('tracemalloc')), 1)
+        self.assertTrue(any('Profiled dag.task' in m and 'Peak traced memory' in m for m in logs.output))
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_sampling_writes_collapsed_stacks(self):
+        with profiled('dag.task', 'sampling', self.tmp.name):
+            _busy_on_a_pool_thread()
+
+        [path] = self._artifacts('collapsed')
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(any('spin (test_profiling.py' in line for line in lines))
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+
+    def test_enabled_through_airflow_config(self):
+        settings = {('bigeye', 'profiler'): 'sampling', ('bigeye', 'profile_dir'): self.tmp.name}
+        with patch.object(profiling.conf, 'get', side_effect=lambda section, key, fallback=None:
+                          settings.get((section, key), fallback)):
+            with profiled('dag.task'):
+                _busy_on_a_pool_thread(0.05)
+        self.assertEqual(len(self._artifacts('collapsed')), 1)
+
+    def test_exceptions_still_write_the_profile(self):
+        with self.assertRaises(ValueError):
+            with profiled('dag.task', 'cprofile', self.tmp.name):
+                raise ValueError('boom')
+        self.assertEqual(len(self._artifacts('pstats')), 1)
+
+    def test_unknown_profiler_is_ignored(self):
+        with self.assertLogs(level='WARNING'):
+            with profiled('dag.task', 'perf', self.tmp.name):
+                pass
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+
+class TestOperatorProfiling(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    @patch.object(AirflowDatawatchClient, 'upsert_metric_from_simple_template', return_value=7)
+    def test_create_metric_operator(self, mock_upsert):
+        operator = CreateMetricOperator(task_id='create', connection_id='test', warehouse_id=1,
+                                        configuration=[{"schema_name": "s", "table_name": "t", "column_name": "c",
+                                                        "metric_template": {"metric_name": "COUNT_NULL"}}],
+                                        profiler='cprofile', profile_dir=self.tmp.name)
+        self.assertEqual(operator.execute({}), [7])
+        self.assertEqual(len(glob.glob(os.path.join(self.tmp.name, '*create*.pstats'))), 1)
+
+    @patch.object(RunMetricsOperator, '_run_metrics', return_value={'success': [], 'failure': []})
+    def test_run_metrics_operator(self, mock_run):
+        operator = RunMetricsOperator(task_id='run', connection_id='test', metric_ids=[1],
+                                      profiler='sampling', profile_dir=self.tmp.name)
+        operator.execute({})
+        self.assertEqual(len(glob.glob(os.path.join(self.tmp.name, '*run*.collapsed'))), 1)
@@ -0,0 +1,77 @@
+import threading
+import time
+from email.utils import formatdate
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from airflow.exceptions import AirflowException
+
+from bigeye_airflow.airflow_datawatch_client import AirflowDatawatchClient
+from bigeye_airflow.airflow_ext.rate_limiter import AdaptiveRateLimiter, parse_retry_after
+
+
+def _response(status_code, retry_after=None):
+    response = Mock(status_code=status_code, headers={'Retry-After': retry_after} if retry_after else {})
+    response.json.return_value = {'ok': True}
+    return response
+
+
+class TestAdaptiveRateLimiter(TestCase):
+
+    def test_additive_increase_multiplicative_decrease(self):
+        limiter = AdaptiveRateLimiter(initial_limit=4, max_limit=5)
+
+        tokens = [limiter.acquire() for _ in range(4)]
+        limiter.release(tokens[0], throttled=True)
+        self.assertEqual(limiter.limit, 2)
+        # Requests sent before the decrease don't shrink the window again.
+        limiter.release(tokens[1], throttled=True)
+        self.assertEqual(limiter.limit, 2)
+
+        for t in tokens[2:]:
+            limiter.release(t)
+        for _ in range(20):
+            limiter.release(limiter.acquire())
+        self.assertEqual(limiter.limit, 5)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_acquire_blocks_at_limit_and_during_retry_after(self):
+        limiter = AdaptiveRateLimiter(initial_limit=1)
+        token = limiter.acquire()
+        acquired = threading.Event()
+        threading.Thread(target=lambda: (limiter.acquire(), acquired.set())).start()
+
+        self.assertFalse(acquired.wait(0.05))
+        start = time.monotonic()
+        limiter.release(token, throttled=True, retry_after=0.2)
+        self.assertTrue(acquired.wait(2))
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertAlmostEqual(parse_retry_after(formatdate(time.time() + 60, usegmt=True)), 60, delta=2)
+
+
+class TestClientThrottling(TestCase):
+
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_throttled_requests_retried(self, mock_get_hook):
+        mock_get_hook.return_value.run.side_effect = [_response(429, '0'), _response(503, '0'), _response(200)]
+        client = AirflowDatawatchClient('test', rate_limiter=AdaptiveRateLimiter(initial_limit=8))
+
+        self.assertEqual(client._call_datawatch_impl(Mock(name='GET'), '/api/v1/tables'), {'ok': True})
+        self.assertEqual(mock_get_hook.return_value.run.call_count, 3)
+        # Halved by each sequential throttle, then grown by the success.
+        self.assertEqual(client.rate_limiter.limit, 2.5)
+
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_raises_when_throttle_retries_exhausted(self, mock_get_hook):
+        mock_get_hook.return_value.run.return_value = _response(429, '0')
+        mock_get_hook.return_value.check_response.side_effect = AirflowException('429:Too Many Requests')
+        client = AirflowDatawatchClient('test', rate_limiter=AdaptiveRateLimiter(), throttle_retries=2)
+
+        with self.assertRaises(AirflowException):
+            client._call_datawatch_impl(Mock(name='GET'), '/api/v1/tables')
+        self.assertEqual(mock_get_hook.return_value.run.call_count, 3)
@@ -0,0 +1,82 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from bigeye_sdk.client.datawatch_client import Method
+
+from bigeye_airflow.airflow_datawatch_client import AirflowDatawatchClient
+from bigeye_airflow.airflow_ext import request_stats
+from bigeye_airflow.airflow_ext.circuit_breaker import CircuitBreaker
+from bigeye_airflow.airflow_ext.rate_limiter import AdaptiveRateLimiter
+from bigeye_airflow.airflow_ext.request_stats import RequestStats, endpoint_name
+from bigeye_airflow.airflow_ext.retry_policy import RetryPolicy
+
+
+class TestRequestStats(TestCase):
+
+    def test_endpoint_name(self):
+        self.assertEqual(endpoint_name('/api/v1/metrics?warehouseIds=1&tableIds=2'), 'api_v1_metrics')
+        self.assertEqual(endpoint_name('/api/v1/metrics/42'), 'api_v1_metrics_id')
+        self.assertEqual(endpoint_name('/dataset/tables/1/my.schema'), 'dataset_tables_id_my_schema')
+
+    @patch.object(request_stats, 'Stats')
+    def test_tagged_stats(self, mock_stats):
+        stats = RequestStats('bigeye', operator='create_metrics')
+        stats.tags_supported = True
+
+        stats.record('GET', '/api/v1/metrics/42', 502, 1.5, bytes_in=7, retries=2)
+
+        tags = {'endpoint': 'api_v1_metrics_id', 'method': 'GET', 'conn_id': 'bigeye', 'operator': 'create_metrics'}
+        self.assertEqual(mock_stats.timing.call_args.kwargs['tags'], tags)
+        mock_stats.incr.assert_any_call('bigeye.request.status', tags={**tags, 'status': '502'})
+        mock_stats.incr.assert_any_call('bigeye.request.bytes_in', 7, tags=tags)
+        mock_stats.incr.assert_any_call('bigeye.request.retries', 2, tags=tags)
+
+    @patch.object(request_stats, 'Stats')
+    def test_untagged_stats_name_the_endpoint(self, mock_stats):
+        stats = RequestStats('bigeye')
+        stats.tags_supported = False
+
+        stats.record('POST', '/api/v1/metrics', None, 0.5, bytes_out=3)
+
+        self.assertEqual(mock_stats.timing.call_args.args[0], 'bigeye.request.api_v1_metrics.post.duration')
+        mock_stats.incr.assert_any_call('bigeye.request.api_v1_metrics.post.status.error')
+        mock_stats.incr.assert_any_call('bigeye.request.api_v1_metrics.post.bytes_out', 3)
+
+    @patch.object(request_stats, 'Stats')
+    def test_stats_errors_are_swallowed(self, mock_stats):
+        mock_stats.timing.side_effect = ValueError('invalid stat name')
+        stats = RequestStats('bigeye')
+        stats.record('GET', '/api/v1/tables', 200, 0.1)
+        self.assertEqual(stats.count, 1)
+
+    def test_slowest_requests_kept(self):
+        stats = RequestStats('bigeye', slow_request_count=2)
+        for i, seconds in enumerate([0.1, 0.5, 0.2, 0.9]):
+            stats.record('GET', f'/api/v1/metrics/{i}', 200, seconds)
+
+        self.assertEqual([r.url for r in stats.slowest], ['/api/v1/metrics/3', '/api/v1/metrics/1'])
+        self.assertEqual(stats.count, 4)
+        self.assertAlmostEqual(stats.seconds, 1.7)
+        with self.assertLogs(level='INFO') as logs:
+            stats.log_summary()
+        self.assertIn('/api/v1/metrics/3', logs.output[0])
+
+
+class TestClientRequestStats(TestCase):
+
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_client_records_each_request_once_with_its_retries(self, mock_get_hook):
+        mock_get_hook.return_value.run.side_effect = [
+            Mock(status_code=502, headers={}),
+            Mock(status_code=200, headers={'Content-Length': '12'}, json=Mock(return_value={'ok': True}))]
+        stats = RequestStats('test')
+        client = AirflowDatawatchClient('test', rate_limiter=AdaptiveRateLimiter(), circuit_breaker=CircuitBreaker(),
+                                        host_semaphore=None, request_stats=stats,
+                                        retry_policies={'catalog': RetryPolicy(base_delay=0)})
+
+        client._call_datawatch(Method.GET, '/api/v1/tables?warehouseId=1')
+
+        self.assertEqual(stats.count, 1)
+        self.assertEqual(stats.retries, 1)
+        self.assertEqual(stats.bytes_in, 12)
+        self.assertEqual(stats.slowest[0].status, 200)
@@ -0,0 +1,246 @@
+import time
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+import requests
+from airflow.exceptions import AirflowException
+from bigeye_sdk.client.datawatch_client import Method
+from bigeye_sdk.generated.com.torodata.models.generated import MetricConfiguration, MetricParameter, MetricType, \
+    PredefinedMetric, PredefinedMetricName
+
+from bigeye_airflow.airflow_datawatch_client import AirflowDatawatchClient
+from bigeye_airflow.airflow_ext.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from bigeye_airflow.airflow_ext.rate_limiter import AdaptiveRateLimiter
+from bigeye_airflow.airflow_ext.retry_policy import RetryPolicy, endpoint_class, get_retry_policy
+
+
+def _response(status_code):
+    response = Mock(status_code=status_code, headers={})
+    response.json.return_value = {'ok': True}
+    return response
+
+
+def _metric(metric_id=0) -> MetricConfiguration:
+    return MetricConfiguration(id=metric_id, warehouse_id=1, dataset_id=2,
+                               metric_type=MetricType(predefined_metric=PredefinedMetric(
+                                   metric_name=PredefinedMetricName.COUNT_NULL)),
+                               parameters=[MetricParameter(key='arg1', column_name='c')])
+
+
+def _json_response(status_code, body):
+    response = _response(status_code)
+    response.json.return_value = body
+    return response
+
+
+def _check_response(response):
+    if response.status_code >= 400:
+        raise AirflowException(f'{response.status_code}:Error')
+
+
+def _client(**kwargs) -> AirflowDatawatchClient:
+    kwargs.setdefault('retry_policies', {'default': RetryPolicy(max_retries=2, base_delay=0),
+                                         'catalog': RetryPolicy(max_retries=2, base_delay=0),
+                                         'metric': RetryPolicy(max_retries=2, base_delay=0)})
+    kwargs.setdefault('circuit_breaker', CircuitBreaker(failure_threshold=10))
+    return AirflowDatawatchClient('test', rate_limiter=AdaptiveRateLimiter(), host_semaphore=None, **kwargs)
+
+
+class TestRetryPolicy(TestCase):
+
+    def test_endpoint_class(self):
+        self.assertEqual(endpoint_class('/dataset/tables/1/public'), 'catalog')
+        self.assertEqual(endpoint_class('/api/v1/tables?warehouseId=1'), 'catalog')
+        self.assertEqual(endpoint_class('/api/v1/metrics/run/batch'), 'metric_run')
+        self.assertEqual(endpoint_class('/api/v1/metrics/info'), 'metric')
+        self.assertEqual(endpoint_class('/api/v1/collections'), 'default')
+
+    def test_only_idempotent_requests_have_a_policy(self):
+        self.assertIsNotNone(get_retry_policy(Method.GET, '/api/v1/metrics?tableIds=1'))
+        self.assertIsNotNone(get_retry_policy(Method.POST, '/api/v1/metrics/info'))
+        self.assertIsNone(get_retry_policy(Method.POST, '/api/v1/metrics'))
+        self.assertIsNone(get_retry_policy(Method.POST, '/api/v1/metrics/backfill'))
+
+    def test_metric_updates_have_a_policy(self):
+        self.assertIsNotNone(get_retry_policy(Method.POST, '/api/v1/metrics', body='{"id": 5, "name": "m"}'))
+        self.assertIsNone(get_retry_policy(Method.POST, '/api/v1/metrics', body='{"name": "m"}'))
+        self.assertIsNone(get_retry_policy(Method.POST, '/api/v1/metrics/run/batch', body='{"id": 5}'))
+
+    def test_policies_override_defaults(self):
+        policy = RetryPolicy(max_retries=9)
+        self.assertIs(get_retry_policy(Method.GET, '/api/v1/tables', {'catalog': policy}), policy)
+
+    def test_delay_is_jittered_and_capped(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=4.0)
+        delays = [policy.delay(10) for _ in range(200)]
+        self.assertTrue(all(0 <= d <= 4.0 for d in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+
+class TestCircuitBreaker(TestCase):
+
+    @patch('bigeye_airflow.airflow_ext.circuit_breaker.time.monotonic')
+    def test_opens_probes_and_closes(self, mock_monotonic):
+        mock_monotonic.return_value = 0.0
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        mock_monotonic.return_value = 10.0
+        breaker.before_call()
+        self.assertEqual(breaker.state, HALF_OPEN)
+        # Only one probe at a time.
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+
+        mock_monotonic.return_value = 20.0
+        breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.before_call()
+
+    def test_success_resets_failure_count(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
+
+
+class TestClientRetries(TestCase):
+
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_idempotent_request_retried_after_transient_errors(self, mock_get_hook):
+        mock_get_hook.return_value.run.side_effect = [
+            _response(502), requests.exceptions.ConnectionError('reset'), _response(200)]
+        client = _client()
+
+        self.assertEqual(client._call_datawatch_impl(Method.GET, '/api/v1/tables'), {'ok': True})
+        self.assertEqual(mock_get_hook.return_value.run.call_count, 3)
+        self.assertEqual(client.circuit_breaker.state, CLOSED)
+
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_non_idempotent_request_not_retried(self, mock_get_hook):
+        mock_get_hook.return_value.run.return_value = _response(502)
+        mock_get_hook.return_value.check_response.side_effect = AirflowException('502:Bad Gateway')
+        client = _client()
+
+        with self.assertRaises(AirflowException):
+            client._call_datawatch_impl(Method.POST, '/api/v1/metrics', '{}')
+        self.assertEqual(mock_get_hook.return_value.run.call_count, 1)
+
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_client_errors_not_retried(self, mock_get_hook):
+        mock_get_hook.return_value.run.return_value = _response(404)
+        mock_get_hook.return_value.check_response.side_effect = AirflowException('404:Not Found')
+        client = _client()
+
+        with self.assertRaises(AirflowException):
+            client._call_datawatch_impl(Method.GET, '/api/v1/metrics/1')
+        self.assertEqual(mock_get_hook.return_value.run.call_count, 1)
+
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_connection_error_raised_when_retries_exhausted(self, mock_get_hook):
+        mock_get_hook.return_value.run.side_effect = requests.exceptions.ConnectionError('refused')
+        client = _client()
+
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client._call_datawatch_impl(Method.GET, '/api/v1/tables')
+        self.assertEqual(mock_get_hook.return_value.run.call_count, 3)
+
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_open_breaker_fails_fast(self, mock_get_hook):
+        mock_get_hook.return_value.run.side_effect = requests.exceptions.ConnectionError('refused')
+        client = _client(circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+
+        with self.assertRaises(CircuitOpenError):
+            client._call_datawatch_impl(Method.GET, '/api/v1/tables')
+        self.assertEqual(mock_get_hook.return_value.run.call_count, 2)
+
+        with self.assertRaises(CircuitOpenError):
+            client._call_datawatch_impl(Method.GET, '/api/v1/metrics/1')
+        self.assertEqual(mock_get_hook.return_value.run.call_count, 2)
+
+    @patch('bigeye_airflow.airflow_ext.circuit_breaker.time.monotonic')
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_probe_failing_with_other_errors_reopens_breaker(self, mock_get_hook, mock_monotonic):
+        mock_monotonic.return_value = 0.0
+        mock_get_hook.return_value.run.side_effect = [requests.exceptions.ConnectionError('refused'),
+                                                      requests.exceptions.ChunkedEncodingError('truncated'),
+                                                      _response(200)]
+        client = _client(circuit_breaker=CircuitBreaker(failure_threshold=1, reset_timeout=10),
+                         retry_policies={'catalog': RetryPolicy(max_retries=0)})
+
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client._call_datawatch_impl(Method.GET, '/api/v1/tables')
+        self.assertEqual(client.circuit_breaker.state, OPEN)
+
+        mock_monotonic.return_value = 10.0
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            client._call_datawatch_impl(Method.GET, '/api/v1/tables')
+        self.assertEqual(client.circuit_breaker.state, OPEN)
+
+        mock_monotonic.return_value = 20.0
+        self.assertEqual(client._call_datawatch_impl(Method.GET, '/api/v1/tables'), {'ok': True})
+        self.assertEqual(client.circuit_breaker.state, CLOSED)
+
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_submitted_run_left_to_server(self, mock_get_hook):
+        mock_get_hook.return_value.run.side_effect = [requests.exceptions.ReadTimeout('slow'), _response(200)]
+        client = _client(circuit_breaker=CircuitBreaker(failure_threshold=1))
+
+        submitted_at = client.submit_metric_batch(metric_ids=[1, 2, 3], chunk_size=2, submit_timeout=1.0)
+
+        self.assertLessEqual(submitted_at, time.time())
+        self.assertEqual([c.kwargs['extra_options']['timeout'] for c in mock_get_hook.return_value.run.call_args_list],
+                         [(10.0, 1.0), (10.0, 1.0)])
+        self.assertEqual(client.circuit_breaker.state, CLOSED)
+
+
+class TestMetricUpsertRetries(TestCase):
+
+    def _hook(self, mock_get_hook, responses):
+        mock_get_hook.return_value.run.side_effect = responses
+        mock_get_hook.return_value.check_response.side_effect = _check_response
+        return mock_get_hook.return_value.run
+
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_update_retried_after_transient_error(self, mock_get_hook):
+        run = self._hook(mock_get_hook, [_response(502), _json_response(200, _metric(5).to_dict())])
+
+        self.assertEqual(_client().upsert_metric(metric_configuration=_metric(5)).id, 5)
+        self.assertEqual(run.call_count, 2)
+
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_create_retried_when_it_did_not_take_effect(self, mock_get_hook):
+        run = self._hook(mock_get_hook, [_response(502), _json_response(200, []),
+                                         _json_response(200, _metric(7).to_dict())])
+        client = _client()
+
+        self.assertEqual(client.upsert_metric(metric_configuration=_metric()).id, 7)
+        self.assertEqual([c.kwargs['endpoint'].split('?')[0] for c in run.call_args_list],
+                         ['/api/v1/metrics', '/api/v1/metrics', '/api/v1/metrics'])
+        self.assertEqual(client.upsert_counts['created'], 1)
+
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_failed_create_that_took_effect_not_repeated(self, mock_get_hook):
+        run = self._hook(mock_get_hook, [_response(502), _json_response(200, [_metric(7).to_dict()])])
+
+        self.assertEqual(_client().upsert_metric(metric_configuration=_metric()).id, 7)
+        self.assertEqual(run.call_count, 2)
+        self.assertIsNone(run.call_args.kwargs['data'])
+
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_create_not_retried_after_client_error(self, mock_get_hook):
+        run = self._hook(mock_get_hook, [_response(400)])
+
+        with self.assertRaises(AirflowException):
+            _client().upsert_metric(metric_configuration=_metric())
+        self.assertEqual(run.call_count, 1)
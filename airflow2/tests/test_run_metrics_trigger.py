@@ -0,0 +1,136 @@
+from datetime import timedelta
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from airflow.exceptions import AirflowException, TaskDeferred
+from airflow.models import Connection
+from bigeye_sdk.generated.com.torodata.models.generated import MetricConfiguration, MetricInfo, MetricRunStatus
+
+from bigeye_airflow.airflow_ext.pooled_http_hook import PooledHttpHook
+from bigeye_airflow.operators.run_metrics_operator import RunMetricsOperator
+from bigeye_airflow.triggers.run_metrics_trigger import RunMetricsTrigger
+
+
+class TestRunMetricsTrigger(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.info_requests = []
+        self.run_requests = 0
+
+        async def run_batch(request):
+            self.run_requests += 1
+            return web.json_response({})
+
+        async def metric_info(request):
+            body = await request.json()
+            self.info_requests.append(body['metricIds'])
+            # Metric 1 has run since the submission.  Metric 2 reports a run from before it until its second poll,
+            # metric 3 until its third, and then is still running.
+            runs = {1: (2000, 'METRIC_RUN_STATUS_OK'),
+                    2: (2000, 'METRIC_RUN_STATUS_UPPERBOUND_CRITICAL') if len(self.info_requests) > 1
+                    else (500, 'METRIC_RUN_STATUS_OK'),
+                    3: (2000, 'METRIC_RUN_STATUS_UNKNOWN') if len(self.info_requests) > 2
+                    else (500, 'METRIC_RUN_STATUS_OK')}
+            return web.json_response({'metrics': [{'metricConfiguration': {'id': i}, 'status': runs[i][1],
+                                                   'latestMetricRuns': [{'runAtEpochSeconds': runs[i][0],
+                                                                         'status': runs[i][1]}]}
+                                                  for i in body['metricIds']]})
+
+        app = web.Application()
+        app.router.add_post('/api/v1/metrics/run/batch', run_batch)
+        app.router.add_post('/api/v1/metrics/info', metric_info)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+        connection = Connection(conn_id='test', conn_type='http', host=f'http://127.0.0.1:{self.server.port}',
+                                login='user', password='password')
+        self.patcher = patch.object(PooledHttpHook, 'get_connection', return_value=connection)
+        self.patcher.start()
+
+    async def asyncTearDown(self):
+        self.patcher.stop()
+        await self.server.close()
+
+    def test_serialize(self):
+        trigger = RunMetricsTrigger(connection_id='test', metric_ids=[1, 2], submitted_at=1000.5, timeout=60,
+                                    poll_interval=5)
+        classpath, kwargs = trigger.serialize()
+
+        self.assertEqual(classpath, 'bigeye_airflow.triggers.run_metrics_trigger.RunMetricsTrigger')
+        self.assertEqual(RunMetricsTrigger(**kwargs).serialize(), (classpath, kwargs))
+
+    async def test_polls_pending_metrics(self):
+        trigger = RunMetricsTrigger(connection_id='test', metric_ids=[1, 2], submitted_at=1000, timeout=60,
+                                    poll_interval=0)
+        events = [e async for e in trigger.run()]
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].payload['status'], 'success')
+        statuses = {mi['metricConfiguration']['id']: mi['status'] for mi in events[0].payload['metric_infos']}
+        self.assertEqual(statuses, {1: 'METRIC_RUN_STATUS_OK', 2: 'METRIC_RUN_STATUS_UPPERBOUND_CRITICAL'})
+        self.assertEqual(self.info_requests, [[1, 2], [2]])
+        self.assertEqual(self.run_requests, 0)
+
+    async def test_timeout_reports_unsettled_metrics(self):
+        trigger = RunMetricsTrigger(connection_id='test', metric_ids=[1, 3], submitted_at=1000, timeout=0.2,
+                                    poll_interval=0.05, chunk_size=1)
+        events = [e async for e in trigger.run()]
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].payload['status'], 'timeout')
+        self.assertEqual(events[0].payload['pending_metric_ids'], [3])
+        statuses = {mi['metricConfiguration']['id']: mi['status'] for mi in events[0].payload['metric_infos']}
+        self.assertEqual(statuses, {1: 'METRIC_RUN_STATUS_OK', 3: 'METRIC_RUN_STATUS_UNKNOWN'})
+        self.assertEqual(self.info_requests[:2], [[1], [3]])
+        self.assertTrue(all(r == [3] for r in self.info_requests[2:]))
+
+
+def _metric_info(metric_id, status):
+    return MetricInfo(metric_configuration=MetricConfiguration(id=metric_id), status=status)
+
+
+class TestDeferrableRunMetricsOperator(TestCase):
+
+    def _operator(self, **kwargs):
+        return RunMetricsOperator(task_id='run', connection_id='test', metric_ids=[1, 2], deferrable=True,
+                                  **kwargs)
+
+    @patch.object(RunMetricsOperator, '_run_metric_batch')
+    @patch.object(RunMetricsOperator, '_submit_metric_batch', return_value=1000.0)
+    def test_submits_then_defers(self, mock_submit, mock_run):
+        with self.assertRaises(TaskDeferred) as ctx:
+            self._operator(deferral_timeout=timedelta(minutes=30)).execute({})
+
+        mock_submit.assert_called_once_with([1, 2])
+        mock_run.assert_not_called()
+        self.assertEqual(ctx.exception.trigger.metric_ids, [1, 2])
+        self.assertEqual(ctx.exception.trigger.submitted_at, 1000.0)
+        self.assertEqual(ctx.exception.trigger.timeout, 30 * 60 - 60)
+        self.assertEqual(ctx.exception.timeout, timedelta(minutes=30))
+
+    def test_execute_complete(self):
+        event = {'status': 'success', 'metric_infos': [
+            _metric_info(1, MetricRunStatus.METRIC_RUN_STATUS_OK).to_dict(),
+            _metric_info(2, MetricRunStatus.METRIC_RUN_STATUS_UPPERBOUND_CRITICAL).to_dict()]}
+
+        result = self._operator().execute_complete({}, event)
+
+        self.assertEqual((len(result['success']), len(result['failure'])), (1, 1))
+
+    def test_timeout_event_raises(self):
+        event = {'status': 'timeout', 'message': '1 of 2 metrics had not settled after 60s.',
+                 'pending_metric_ids': [2], 'metric_infos': []}
+
+        with self.assertRaises(AirflowException) as ctx:
+            self._operator().execute_complete({}, event)
+        self.assertIn('[2]', str(ctx.exception))
+
+    def test_trigger_timeout(self):
+        self.assertEqual(self._operator()._trigger_timeout(), 6 * 60 * 60 - 60)
+        self.assertEqual(self._operator(deferral_timeout=timedelta(seconds=100))._trigger_timeout(), 90)
+
+    def test_use_async_and_deferrable_rejected(self):
+        with self.assertRaises(AirflowException):
+            self._operator(use_async=True)
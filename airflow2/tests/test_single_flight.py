@@ -0,0 +1,90 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from bigeye_sdk.client.datawatch_client import Method
+
+from bigeye_airflow.airflow_datawatch_client import AirflowDatawatchClient
+from bigeye_airflow.airflow_ext.circuit_breaker import CircuitBreaker
+from bigeye_airflow.airflow_ext.rate_limiter import AdaptiveRateLimiter
+from bigeye_airflow.airflow_ext.single_flight import SingleFlight
+
+
+class TestSingleFlight(TestCase):
+
+    def test_concurrent_calls_share_one_result(self):
+        group = SingleFlight()
+        release = threading.Event()
+        fn = Mock(side_effect=lambda: release.wait(2) and {'tables': []})
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            futures = [executor.submit(group.do, 'key', fn) for _ in range(5)]
+            # Give the followers time to join the leader's call.
+            time.sleep(0.1)
+            release.set()
+            results = [f.result() for f in futures]
+
+        fn.assert_called_once()
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertEqual(group.in_flight, 0)
+
+    def test_followers_receive_the_leaders_exception(self):
+        group = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def leader():
+            calls.append(1)
+            started.set()
+            release.wait(2)
+            raise ValueError('boom')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(group.do, 'key', leader)
+            started.wait(2)
+            second = executor.submit(group.do, 'key', leader)
+            release.set()
+            self.assertIsInstance(first.exception(), ValueError)
+            self.assertIsInstance(second.exception(), ValueError)
+        self.assertEqual(len(calls), 1)
+
+    def test_sequential_calls_are_not_cached(self):
+        group = SingleFlight()
+        fn = Mock(side_effect=[1, 2])
+        self.assertEqual(group.do('key', fn), 1)
+        self.assertEqual(group.do('key', fn), 2)
+
+
+class TestClientSingleFlight(TestCase):
+
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_concurrent_identical_gets_send_one_request(self, mock_get_hook):
+        started = threading.Event()
+        release = threading.Event()
+
+        def run(**kwargs):
+            started.set()
+            release.wait(2)
+            return Mock(status_code=200, headers={}, json=Mock(return_value={'metrics': []}))
+
+        mock_get_hook.return_value.run.side_effect = run
+        clients = [AirflowDatawatchClient('test_single_flight', rate_limiter=AdaptiveRateLimiter(),
+                                          circuit_breaker=CircuitBreaker(), host_semaphore=None) for _ in range(2)]
+
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            first = executor.submit(clients[0]._call_datawatch, Method.GET, '/api/v1/metrics?tableIds=1')
+            started.wait(2)
+            others = [executor.submit(c._call_datawatch, Method.GET, '/api/v1/metrics?tableIds=1')
+                      for c in clients for _ in range(2)]
+            posts = executor.submit(clients[1]._call_datawatch, Method.POST, '/api/v1/metrics/info', '{}')
+            time.sleep(0.1)
+            release.set()
+            results = [first.result()] + [f.result() for f in others]
+            posts.result()
+
+        self.assertTrue(all(r is results[0] for r in results))
+        # One GET shared by every caller, plus the POST, which is never shared.
+        self.assertEqual(mock_get_hook.return_value.run.call_count, 2)
@@ -0,0 +1,94 @@
+import threading
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from bigeye_sdk.client.datawatch_client import Method
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from bigeye_airflow.airflow_datawatch_client import AirflowDatawatchClient
+from bigeye_airflow.airflow_ext import tracing
+from bigeye_airflow.airflow_ext.circuit_breaker import CircuitBreaker
+from bigeye_airflow.airflow_ext.rate_limiter import AdaptiveRateLimiter
+from bigeye_airflow.airflow_ext.tracing import NOOP_SPAN, propagate, set_attributes, span
+
+
+class TestTracing(TestCase):
+
+    def setUp(self):
+        self.exporter = InMemorySpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(self.exporter))
+        patcher = patch.object(trace, 'get_tracer', side_effect=lambda name, *args, **kwargs: provider.get_tracer(name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _spans(self):
+        return {s.name: s for s in self.exporter.get_finished_spans()}
+
+    def test_nested_spans_with_attributes(self):
+        with span('bigeye.create_metrics', warehouse_id=1, schema=None):
+            with span('bigeye.table_resolution', table=['orders']) as s:
+                set_attributes(s, table_count=1)
+
+        spans = self._spans()
+        parent, child = spans['bigeye.create_metrics'], spans['bigeye.table_resolution']
+        self.assertEqual(child.parent.span_id, parent.context.span_id)
+        self.assertEqual(dict(parent.attributes), {'bigeye.warehouse_id': 1})
+        self.assertEqual(child.attributes['bigeye.table'], ('orders',))
+        self.assertEqual(child.attributes['bigeye.table_count'], 1)
+
+    def test_propagate_to_pool_threads(self):
+        def run_chunk():
+            with span('bigeye.chunk'):
+                pass
+
+        with span('bigeye.batch_run'):
+            # New threads start with an empty context.
+            thread = threading.Thread(target=propagate(run_chunk))
+            thread.start()
+            thread.join()
+
+        spans = self._spans()
+        self.assertEqual(spans['bigeye.chunk'].parent.span_id, spans['bigeye.batch_run'].context.span_id)
+
+    def test_exceptions_recorded(self):
+        with self.assertRaises(ValueError):
+            with span('bigeye.upsert_metric'):
+                raise ValueError('boom')
+
+        s = self._spans()['bigeye.upsert_metric']
+        self.assertFalse(s.status.is_ok)
+        self.assertEqual(s.events[0].name, 'exception')
+
+    @patch.object(AirflowDatawatchClient, '_get_hook')
+    def test_http_calls_are_child_spans(self, mock_get_hook):
+        mock_get_hook.return_value.run.return_value = Mock(status_code=200, headers={'Content-Length': '2'},
+                                                           json=Mock(return_value={'metrics': []}))
+        client = AirflowDatawatchClient('test', rate_limiter=AdaptiveRateLimiter(), circuit_breaker=CircuitBreaker(),
+                                        host_semaphore=None)
+
+        with span('bigeye.metric_search'):
+            client._call_datawatch(Method.POST, '/api/v1/metrics/info', '{"metricIds": [1]}')
+
+        spans = self._spans()
+        http = spans['bigeye.http POST']
+        self.assertEqual(http.parent.span_id, spans['bigeye.metric_search'].context.span_id)
+        self.assertEqual(http.attributes['bigeye.endpoint'], 'api_v1_metrics_info')
+        self.assertEqual(http.attributes['bigeye.status_code'], 200)
+        self.assertEqual(http.attributes['bigeye.bytes_out'], 18)
+        self.assertEqual(http.attributes['bigeye.bytes_in'], 2)
+
+
+class TestTracingDisabled(TestCase):
+
+    @patch.object(tracing, 'otel_context', None)
+    @patch.object(tracing, 'trace', None)
+    def test_noop_without_opentelemetry(self):
+        fn = Mock()
+        with span('bigeye.create_metrics', warehouse_id=1) as s:
+            self.assertIs(s, NOOP_SPAN)
+            set_attributes(s, metric_count=1)
+        self.assertIs(propagate(fn), fn)